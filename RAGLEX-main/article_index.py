@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+法条精确查找索引：入库时记录 (规范化法律名称, 条文号) -> 条文切片
+条文号支持中文数字与阿拉伯数字（第一千零七十九条 / 第1079条 / 1079），"之一"等后缀单独编号
+索引保存在向量库目录下（LAW_ARTICLE_INDEX_PATH），查询时常驻内存，文件被其他进程更新后自动重新加载
+
+直接运行本文件可从 law_documents 集合全量重建索引
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from config import config
+
+CHINESE_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+                  "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000, "万": 10000}
+
+ARTICLE_NUMBER_PATTERN = re.compile(
+    r"^第?(?P<number>[零〇一二三四五六七八九十百千万两\d]+)条?(?:之(?P<suffix>[一二三四五六七八九十\d]+))?$"
+)
+ARTICLE_PREFIX_PATTERN = re.compile(r"^\s*(第[零〇一二三四五六七八九十百千万\d]+条(?:之[一二三四五六七八九十]+)?)")
+LAW_NAME_STRIP_PATTERN = re.compile(r"[《》\s]")
+LAW_NAME_PREFIX = "中华人民共和国"
+
+_lock = threading.Lock()
+_state = {
+    "mtime": None,
+    "sources": {},  # source -> [条文记录, ...]，持久化内容
+    "by_article": {},  # (法律名称, 条文号) -> 条文记录
+    "by_law": {},  # 法律名称 -> [条文记录, ...]
+    "by_id": {},  # 条文ID -> 条文记录
+    "defer_depth": 0,  # >0 时处于批量入库中，更新只写内存，退出时统一保存
+    "dirty": False,  # 内存中有尚未写入文件的更新
+}
+
+
+def chinese_to_int(text: str) -> Optional[int]:
+    """中文或阿拉伯数字转整数，无法解析时返回 None"""
+    if text.isdigit():
+        return int(text)
+    total, section, number = 0, 0, 0
+    for char in text:
+        if char in CHINESE_DIGITS:
+            number = CHINESE_DIGITS[char]
+        elif char in CHINESE_UNITS:
+            unit = CHINESE_UNITS[char]
+            if unit == 10000:
+                total += (section + number) * unit
+                section = 0
+            else:
+                # "十条" 省略了前面的 "一"
+                section += (number or 1) * unit
+            number = 0
+        else:
+            return None
+    total += section + number
+    # "万" 等单独的单位没有数值，视为无法解析
+    return total or None
+
+
+def normalize_article_number(article: str) -> Optional[str]:
+    """条文号规范化：第一千零七十九条 -> 1079，第十八条之一 -> 18-1"""
+    match = ARTICLE_NUMBER_PATTERN.match(str(article).strip())
+    if not match:
+        return None
+    number = chinese_to_int(match.group("number"))
+    if number is None:
+        return None
+    if match.group("suffix"):
+        suffix = chinese_to_int(match.group("suffix"))
+        return f"{number}-{suffix}" if suffix is not None else None
+    return str(number)
+
+
+def normalize_law_name(name: str) -> str:
+    """去掉书名号、空白与"中华人民共和国"前缀，使《民法典》与中华人民共和国民法典指向同一部法律"""
+    name = LAW_NAME_STRIP_PATTERN.sub("", name or "")
+    if name.startswith(LAW_NAME_PREFIX) and len(name) > len(LAW_NAME_PREFIX):
+        name = name[len(LAW_NAME_PREFIX):]
+    return name
+
+
+def _law_name_of(metadata: dict) -> str:
+    name = metadata.get("book") or metadata.get("title") or ""
+    if not name and metadata.get("source"):
+        name = Path(metadata["source"]).stem
+    return name.strip("《》 ")
+
+
+def make_article_id(source: str, law_name: str, article_key: str) -> str:
+    """条文ID：由来源文件、规范化法律名称与条文号派生，与切分方式无关，同一条文每次入库都得到相同ID"""
+    key = f"{source}|{normalize_law_name(law_name)}|{article_key}"
+    return f"law-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _article_number_of(doc) -> Optional[str]:
+    """取切片的条文号：优先元数据，其次正文开头的 第X条"""
+    article = (doc.metadata or {}).get("article")
+    if not article:
+        match = ARTICLE_PREFIX_PATTERN.match(doc.page_content)
+        article = match.group(1) if match else None
+    return article
+
+
+def article_id_of(doc) -> str:
+    """
+    检索结果切片对应的条文ID，与索引记录的ID一致，可直接用于按ID查询
+    切片不以条文号开头（条文被切分后的后续片段）时按正文哈希生成
+    """
+    metadata = doc.metadata or {}
+    article = _article_number_of(doc)
+    article_key = normalize_article_number(article) if article else None
+    if article_key:
+        return make_article_id(metadata.get("source", ""), _law_name_of(metadata), article_key)
+    return f"law-{hashlib.sha1(doc.page_content.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _build_records(docs: List) -> List[dict]:
+    """同一条文被切成多段时按顺序合并为一条记录"""
+    records = {}
+    for doc in sorted(docs, key=lambda d: d.metadata.get("chunk_seq_id", 0)):
+        metadata = doc.metadata or {}
+        article = _article_number_of(doc)
+        article_key = normalize_article_number(article) if article else None
+        if not article_key:
+            continue
+
+        law_name = _law_name_of(metadata)
+        record_key = (normalize_law_name(law_name), article_key)
+        if record_key in records:
+            records[record_key]["content"] += "\n" + doc.page_content
+            continue
+        records[record_key] = {
+            "id": make_article_id(metadata.get("source", ""), law_name, article_key),
+            "law_name": law_name,
+            "article": article,
+            "article_key": article_key,
+            "chapter": metadata.get("chapter"),
+            "section": metadata.get("section"),
+            "source": metadata.get("source", ""),
+            "content": doc.page_content,
+        }
+    return list(records.values())
+
+
+def _rebuild_lookups() -> None:
+    by_article, by_law, by_id = {}, defaultdict(list), {}
+    for source, records in _state["sources"].items():
+        for record in records:
+            # 旧版本索引文件中的ID按切片序号生成，加载时统一改为当前规则
+            record["id"] = make_article_id(source, record["law_name"], record["article_key"])
+            law_key = normalize_law_name(record["law_name"])
+            by_article.setdefault((law_key, record["article_key"]), record)
+            by_law[law_key].append(record)
+            by_id[record["id"]] = record
+    _state["by_article"], _state["by_law"], _state["by_id"] = by_article, dict(by_law), by_id
+
+
+def _load_if_changed() -> None:
+    path = config.LAW_ARTICLE_INDEX_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    # 批量入库期间内存中有未保存的更新，不能被文件内容覆盖
+    if mtime == _state["mtime"] or _state["dirty"]:
+        return
+    with _lock:
+        if mtime == _state["mtime"] or _state["dirty"]:
+            return
+        sources = {}
+        if mtime is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    sources = json.load(f).get("sources", {})
+            except (OSError, ValueError) as e:
+                print(f"法条索引读取失败: {e}")
+        _state["sources"] = sources
+        _state["mtime"] = mtime
+        _rebuild_lookups()
+
+
+def _save() -> None:
+    path = config.LAW_ARTICLE_INDEX_PATH
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"sources": _state["sources"]}, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+    _state["mtime"] = os.path.getmtime(path)
+    _state["dirty"] = False
+
+
+def _group_by_source(docs: Iterable) -> dict:
+    docs_by_source = defaultdict(list)
+    for doc in docs:
+        docs_by_source[doc.metadata.get("source", "")].append(doc)
+    return docs_by_source
+
+
+def _replace_sources(docs_by_source: dict) -> int:
+    """按 source 整体替换内存中的条文记录（调用方持有 _lock），返回写入的条文数"""
+    written = 0
+    for source, source_docs in docs_by_source.items():
+        records = _build_records(source_docs)
+        _state["sources"][source] = records
+        written += len(records)
+    return written
+
+
+def update_article_index(docs: Iterable) -> int:
+    """
+    入库时更新索引：按 source 整体替换该文件的条文记录
+    在 deferred_article_index_save() 中调用时推迟到退出时统一保存
+
+    Returns:
+        写入的条文数
+    """
+    docs_by_source = _group_by_source(docs)
+    if not docs_by_source:
+        return 0
+
+    _load_if_changed()
+    with _lock:
+        written = _replace_sources(docs_by_source)
+        if _state["defer_depth"]:
+            _state["dirty"] = True
+        else:
+            _rebuild_lookups()
+            _save()
+    return written
+
+
+@contextmanager
+def deferred_article_index_save():
+    """
+    批量入库时使用：期间 update_article_index 只更新内存中的条文记录，
+    退出时统一重建查找表并写一次索引文件，避免每个批次都全量重写索引
+    """
+    _load_if_changed()
+    with _lock:
+        _state["defer_depth"] += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _state["defer_depth"] -= 1
+            if not _state["defer_depth"] and _state["dirty"]:
+                _rebuild_lookups()
+                _save()
+
+
+def remove_article_sources(sources: Iterable[str]) -> None:
+    _load_if_changed()
+    with _lock:
+        removed = [source for source in sources if _state["sources"].pop(source, None) is not None]
+        if removed:
+            _rebuild_lookups()
+            _save()
+
+
+def clear_article_index() -> None:
+    with _lock:
+        _state["sources"] = {}
+        _rebuild_lookups()
+        _save()
+
+
+def is_article_index_ready() -> bool:
+    _load_if_changed()
+    return bool(_state["by_id"])
+
+
+def lookup_article(law_name: str, article_number: str) -> Optional[dict]:
+    """按法律名称与条文号精确查找，条文号可为 1079 / 一千零七十九 / 第1079条 / 第十八条之一"""
+    article_key = normalize_article_number(article_number)
+    if not article_key:
+        return None
+    _load_if_changed()
+    return _state["by_article"].get((normalize_law_name(law_name), article_key))
+
+
+def get_articles_by_law(law_name: str, limit: int = None) -> List[dict]:
+    _load_if_changed()
+    records = _state["by_law"].get(normalize_law_name(law_name), [])
+    return records[:limit] if limit else list(records)
+
+
+def get_article_by_id(article_id: str) -> Optional[dict]:
+    _load_if_changed()
+    return _state["by_id"].get(article_id)
+
+
+def rebuild_article_index(batch_size: int = 1000) -> int:
+    """从 law_documents 集合全量重建索引（升级后或索引文件丢失时使用）"""
+    from langchain.docstore.document import Document
+    from utils import get_law_vectorstore
+
+    collection = get_law_vectorstore()._collection
+    total = collection.count()
+    docs = []
+    for offset in range(0, total, batch_size):
+        batch = collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+        docs.extend(
+            Document(page_content=content, metadata=metadata or {})
+            for content, metadata in zip(batch["documents"], batch["metadatas"])
+            if content
+        )
+
+    # 直接以重建结果覆盖索引文件，不经过 _load_if_changed，避免旧文件中已不存在的来源被重新加载
+    with _lock:
+        _state["sources"] = {}
+        written = _replace_sources(_group_by_source(docs))
+        _rebuild_lookups()
+        _save()
+    return written
+
+
+if __name__ == "__main__":
+    count = rebuild_article_index()
+    print(f"🎉 法条索引重建完成，共 {count} 条，保存于 {config.LAW_ARTICLE_INDEX_PATH}")
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+法律条文切分器基准测试
+在完整法律条文语料上对比 MdSplitter 与 StatuteSplitter 的切分速度和块边界质量
+
+用法: python benchmark_splitter.py [--repeat 3] [--path ./law_docs/法律条文]
+"""
+
+import argparse
+import re
+import statistics
+import time
+from typing import Dict, List
+
+from langchain.docstore.document import Document
+
+from config import config
+from loader import load_documents_from_files
+from splitter import MdSplitter, StatuteSplitter
+from sync_manifest import _scan_directory
+
+ARTICLE_START_PATTERN = re.compile(r'^第[零〇一二三四五六七八九十百千万\d]+条(?:之[一二三四五六七八九十]+)?[ \t　]')
+ARTICLE_ANY_PATTERN = re.compile(r'(?:^|\n)第[零〇一二三四五六七八九十百千万\d]+条(?:之[一二三四五六七八九十]+)?[ \t　]')
+
+
+def load_corpus(path: str) -> List[Document]:
+    """加载全部法律条文文件（不切分）"""
+    files = _scan_directory(path, config.DOC_TYPE_LAW, exclude_case_dirs=True)
+    entries = [
+        {"source": source, "doc_type": doc_type, "file_id": file_id}
+        for file_id, (source, doc_type) in enumerate(files.items(), start=1)
+    ]
+    return load_documents_from_files(entries)
+
+
+def evaluate_boundaries(chunks: List[Document], total_articles: int) -> Dict[str, float]:
+    """
+    块边界质量指标
+
+    - 以条文开头的块占比：越高说明块从条文起点开始
+    - 含多条条文的块占比：越低说明不同条文没有被混在一个块里
+    - 被切断的条文占比：条文出现在多个块中的比例（无法完整召回）
+    """
+    lengths = [len(chunk.page_content) for chunk in chunks]
+    starts_at_article = sum(1 for chunk in chunks if ARTICLE_START_PATTERN.match(chunk.page_content))
+    multi_article = sum(1 for chunk in chunks if len(ARTICLE_ANY_PATTERN.findall(chunk.page_content)) > 1)
+    continuation = len(chunks) - starts_at_article
+
+    return {
+        "块数": len(chunks),
+        "平均长度": round(statistics.mean(lengths), 1) if lengths else 0,
+        "最大长度": max(lengths) if lengths else 0,
+        "以条文开头的块占比": round(starts_at_article / len(chunks), 4) if chunks else 0,
+        "含多条条文的块占比": round(multi_article / len(chunks), 4) if chunks else 0,
+        "被切断的条文占比(估计)": round(min(continuation, total_articles) / total_articles, 4) if total_articles else 0,
+    }
+
+
+def benchmark(splitter, docs: List[Document], repeat: int) -> Dict[str, float]:
+    timings = []
+    chunks = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = splitter.split_documents(docs)
+        timings.append(time.perf_counter() - start)
+
+    total_articles = sum(len(ARTICLE_ANY_PATTERN.findall(doc.page_content)) for doc in docs)
+    result = {"耗时(秒, 最优)": round(min(timings), 3), "耗时(秒, 平均)": round(statistics.mean(timings), 3)}
+    result.update(evaluate_boundaries(chunks, total_articles))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="法律条文切分器基准测试")
+    parser.add_argument("--path", default=config.LAW_BOOK_PATH, help="法律条文目录")
+    parser.add_argument("--repeat", type=int, default=3, help="每个切分器重复次数")
+    args = parser.parse_args()
+
+    docs = load_corpus(args.path)
+    total_chars = sum(len(doc.page_content) for doc in docs)
+    print(f"语料: {len(docs)} 个文件，共 {total_chars} 字符")
+
+    splitters = {
+        "MdSplitter": MdSplitter(chunk_size=config.LAW_BOOK_CHUNK_SIZE, chunk_overlap=config.LAW_BOOK_CHUNK_OVERLAP),
+        "StatuteSplitter": StatuteSplitter(max_chunk_size=config.STATUTE_MAX_ARTICLE_CHARS),
+    }
+
+    results = {name: benchmark(splitter, docs, args.repeat) for name, splitter in splitters.items()}
+
+    print("\n=== 切分器对比 ===")
+    metrics = list(next(iter(results.values())).keys())
+    print(f"{'指标':<24}" + "".join(f"{name:>20}" for name in results))
+    for metric in metrics:
+        print(f"{metric:<24}" + "".join(f"{results[name][metric]:>20}" for name in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+案例关键部分模块：入库时从案例切片中提取 基本案情/裁判理由/裁判要旨/法律条文，
+按切片内容哈希保存到 SQLite（case_key_sections 表），检索、重排序和构建 Prompt 时直接读取短文本，
+不再在每次查询时用正则解析全文
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List
+
+from config import config
+
+# 关键部分标题，顺序即输出顺序
+KEY_SECTION_HEADINGS = ("基本案情", "裁判理由", "裁判要旨", "法律条文")
+KEY_SECTION_PATTERNS = [
+    (heading, re.compile(rf'## {heading}\s*([\s\S]*?)(?=##|$)'))
+    for heading in KEY_SECTION_HEADINGS
+]
+
+# 已替换为关键部分的文档在元数据中带此标记，后续环节不再重复提取
+KEY_SECTIONS_FLAG = "key_sections_only"
+
+SQLITE_MAX_VARIABLES = 900
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def extract_case_key_sections(case_content: str) -> str:
+    """
+    从案例文档中提取四个关键部分：基本案情、裁判理由、裁判要旨、法律条文
+
+    Args:
+        case_content: 案例文档的完整内容
+
+    Returns:
+        提取的关键部分内容；一个都没有时返回原文
+    """
+    sections = []
+    for heading, pattern in KEY_SECTION_PATTERNS:
+        match = pattern.search(case_content)
+        if match:
+            sections.append(f"## {heading}\n{match.group(1).strip()}")
+    return "\n\n".join(sections) if sections else case_content
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    global _schema_ready
+    conn = sqlite3.connect(config.CASE_SECTIONS_DB_PATH)
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS case_key_sections (
+                        content_hash TEXT PRIMARY KEY,
+                        file_id INTEGER,
+                        key_sections TEXT NOT NULL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS ix_case_key_sections_file_id ON case_key_sections (file_id)')
+                conn.commit()
+                _schema_ready = True
+    return conn
+
+
+def store_case_sections(docs: Iterable) -> int:
+    """
+    入库时提取并保存案例切片的关键部分
+
+    Args:
+        docs: 案例切片文档
+
+    Returns:
+        写入的记录数
+    """
+    rows = {}
+    for doc in docs:
+        content = doc.page_content
+        if content:
+            rows[content_hash(content)] = (doc.metadata.get("file_id"), extract_case_key_sections(content))
+    if not rows:
+        return 0
+
+    conn = _connect()
+    try:
+        conn.executemany(
+            'INSERT OR REPLACE INTO case_key_sections (content_hash, file_id, key_sections) VALUES (?, ?, ?)',
+            [(digest, file_id, key_sections) for digest, (file_id, key_sections) in rows.items()]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def load_case_sections(contents: List[str]) -> Dict[str, str]:
+    """按切片内容批量查询关键部分，返回 {内容哈希: 关键部分}"""
+    digests = list({content_hash(content) for content in contents if content})
+    found = {}
+    if not digests:
+        return found
+
+    conn = _connect()
+    try:
+        for start in range(0, len(digests), SQLITE_MAX_VARIABLES):
+            batch = digests[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(batch))
+            cursor = conn.execute(
+                f'SELECT content_hash, key_sections FROM case_key_sections WHERE content_hash IN ({placeholders})',
+                batch
+            )
+            found.update(cursor.fetchall())
+    finally:
+        conn.close()
+    return found
+
+
+def apply_case_sections(docs: List) -> List:
+    """
+    将案例切片替换为入库时保存的关键部分；没有记录的（入库早于本功能）现场提取
+
+    Returns:
+        新的文档列表，元数据带 KEY_SECTIONS_FLAG 标记
+    """
+    from langchain.docstore.document import Document
+
+    if not docs:
+        return []
+    try:
+        stored = load_case_sections([doc.page_content for doc in docs])
+    except sqlite3.Error as e:
+        print(f"读取案例关键部分失败，改为现场提取: {e}")
+        stored = {}
+
+    result = []
+    for doc in docs:
+        if doc.metadata.get(KEY_SECTIONS_FLAG):
+            result.append(doc)
+            continue
+        key_sections = stored.get(content_hash(doc.page_content))
+        if key_sections is None:
+            key_sections = extract_case_key_sections(doc.page_content)
+        result.append(Document(page_content=key_sections, metadata={**doc.metadata, KEY_SECTIONS_FLAG: True}))
+    return result
+
+
+def delete_case_sections(file_ids: List[int]) -> int:
+    if not file_ids:
+        return 0
+    conn = _connect()
+    try:
+        placeholders = ",".join("?" * len(file_ids))
+        cursor = conn.execute(f'DELETE FROM case_key_sections WHERE file_id IN ({placeholders})', list(file_ids))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def clear_case_sections() -> None:
+    conn = _connect()
+    try:
+        conn.execute('DELETE FROM case_key_sections')
+        conn.commit()
+    finally:
+        conn.close()
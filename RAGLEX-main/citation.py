@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+引用来源模块：根据检索到的切片元数据按模板生成回答末尾的"引用来源"部分
+格式与 SOURCE_SUMMARY_PROMPT 约定的一致，不再额外调用一次LLM
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from config import config
+
+# 入库时从案例 Markdown 中提取并写入切片元数据的字段：元数据键 -> Markdown 二级标题
+CASE_CITATION_FIELDS = {
+    "court": "法院",
+    "judgment_date": "判决日期",
+    "case_number": "案例编号",
+}
+
+MISSING_VALUES = {"", "未提供", "无", "null", "None"}
+
+ARTICLE_PATTERN = re.compile(r"^\s*(第[零〇一二三四五六七八九十百千万\d]+条(?:之[一二三四五六七八九十]+)?)\s*")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[。！？；])")
+
+
+def _extract_section(content: str, heading: str) -> str:
+    match = re.search(rf"##\s*{heading}\s*([\s\S]*?)(?=\n#|$)", content)
+    if not match:
+        return ""
+    value = match.group(1).strip()
+    return "" if value in MISSING_VALUES else value
+
+
+def extract_case_citation_metadata(content: str) -> Dict[str, str]:
+    """从结构化案例 Markdown 中提取法院、判决日期、案例编号，缺失的字段不返回"""
+    metadata = {}
+    for key, heading in CASE_CITATION_FIELDS.items():
+        value = _extract_section(content, heading)
+        if value:
+            metadata[key] = value.splitlines()[0].strip()
+    return metadata
+
+
+def fill_case_citation_metadata(docs: Iterable) -> None:
+    """为缺少引用字段的案例切片补齐元数据（加载阶段已按全文提取的不会被覆盖）"""
+    for doc in docs:
+        for key, value in extract_case_citation_metadata(doc.page_content).items():
+            doc.metadata.setdefault(key, value)
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    sentences = [sentence for sentence in SENTENCE_END_PATTERN.split(text.strip()) if sentence.strip()]
+    return _truncate(sentences[0], max_chars) if sentences else ""
+
+
+def _law_name(metadata: dict) -> str:
+    name = metadata.get("book") or metadata.get("title") or ""
+    if not name and metadata.get("source"):
+        name = Path(metadata["source"]).stem
+    return name.strip("《》 ") or "未知法律"
+
+
+def _format_law_citation(doc) -> tuple:
+    """返回 (去重键, 引用行)"""
+    metadata = doc.metadata or {}
+    law_name = _law_name(metadata)
+    content = doc.page_content.strip()
+    article = metadata.get("article", "")
+    match = ARTICLE_PATTERN.match(content)
+    if match:
+        article = article or match.group(1)
+        content = content[match.end():]
+
+    content = _truncate(content, config.SOURCE_SUMMARY_LAW_MAX_CHARS)
+    if article:
+        return (law_name, article), f"- 《{law_name}》{article}规定：{content}"
+    return (law_name, content), f"- 《{law_name}》：{content}"
+
+
+def _format_case_citation(doc) -> tuple:
+    metadata = doc.metadata or {}
+    title = (metadata.get("title") or "未知案例").strip("《》 ")
+    content = doc.page_content
+
+    details = [metadata.get(key) or _extract_section(content, heading).split("\n")[0].strip()
+               for key, heading in CASE_CITATION_FIELDS.items()]
+    details = [detail for detail in details if detail and detail not in MISSING_VALUES]
+
+    # 以裁判要旨的首句概括案例，切片中没有要旨时退回基本案情
+    summary = ""
+    for heading in ("裁判要旨", "基本案情"):
+        section = _extract_section(content, heading)
+        if section:
+            summary = _first_sentence(section, config.SOURCE_SUMMARY_CASE_MAX_CHARS)
+            break
+
+    line = f"  - 《{title}》"
+    if details:
+        line += f"（{'，'.join(details)}）"
+    if summary:
+        line += f"：{summary}"
+    return metadata.get("file_id") or title, line
+
+
+def build_source_summary(context_docs: List) -> str:
+    """
+    按模板生成引用来源
+
+    Args:
+        context_docs: 用于生成回答的文档（法律条文与案例）
+
+    Returns:
+        以 `---` 开头的引用来源文本；没有文档时返回空字符串
+    """
+    law_lines, case_lines = [], []
+    seen_laws, seen_cases = set(), set()
+    for doc in context_docs or []:
+        doc_type = (doc.metadata or {}).get("doc_type", "")
+        if doc_type == config.DOC_TYPE_LAW:
+            key, line = _format_law_citation(doc)
+            if key not in seen_laws:
+                seen_laws.add(key)
+                law_lines.append(line)
+        elif "case" in doc_type:
+            key, line = _format_case_citation(doc)
+            if key not in seen_cases:
+                seen_cases.add(key)
+                case_lines.append(line)
+
+    if not law_lines and not case_lines:
+        return ""
+
+    parts = ["---"]
+    if law_lines:
+        parts.append("**法律条文依据：**")
+        parts.extend(law_lines)
+    if case_lines:
+        if law_lines:
+            parts.append("")
+        parts.append("**案例依据：**")
+        parts.extend(case_lines)
+    return "\n".join(parts)
@@ -11,6 +11,8 @@ class Config:
     LAW_BOOK_CHUNK_OVERLAP = 20
     LAW_VS_COLLECTION_NAME = "law"
     LAW_VS_SEARCH_K = 2
+    LAW_SPLITTER = "statute"  # "statute" 按条切分；"md" 使用原 MdSplitter
+    STATUTE_MAX_ARTICLE_CHARS = 1000  # 单条条文超过该长度时按句子继续切分
 
     # 案例文档配置
     CASE_DOCS_PATH = "./law_docs/案例"  # 保持兼容性，但实际会使用下面的路径
@@ -27,6 +29,38 @@ class Config:
     LAW_DOCUMENTS_COLLECTION = "law_documents"
     CASE_DOCUMENTS_COLLECTION = "case_documents"
     SEPARATED_SEARCH_K = 5
+    MULTI_QUERY_MAX_QUERIES = 4  # 多查询检索最多使用的查询数（原问题+改写）
+    MULTI_QUERY_RRF_K = 60  # 倒数排名融合常数，越大各查询排名的差异影响越小
+
+    # 推测检索：请求到达时即以原问题（加上一轮用户提问）开始检索，与问题补全、意图识别的LLM调用并行
+    SPECULATIVE_RETRIEVAL = False  # 默认关闭
+    SPECULATIVE_SIMILARITY_THRESHOLD = 0.9  # 补全后问题与推测查询的向量相似度不低于该值时采用推测结果
+    SPECULATIVE_RETRIEVAL_WORKERS = 4  # 推测检索线程数
+
+    # 引用来源配置
+    SOURCE_SUMMARY_MODE = "template"  # "template" 按切片元数据模板生成；"llm" 额外调用一次LLM总结
+    SOURCE_SUMMARY_LAW_MAX_CHARS = 200  # 模板模式下每条法律条文引用的最大字符数
+    SOURCE_SUMMARY_CASE_MAX_CHARS = 120  # 模板模式下每个案例概括的最大字符数
+
+    # 回答生成上下文打包配置
+    CONTEXT_TOKEN_BUDGET = 6000  # 检索文档与联网结果合计的token上限
+    CONTEXT_WEB_TOKEN_BUDGET = 1500  # 有联网结果时为其预留的token数
+    CONTEXT_MIN_CHUNK_TOKENS = 100  # 剩余预算低于该值时不再截断放入文档
+    CONTEXT_NEAR_DUPLICATE_THRESHOLD = 0.9  # 字符5-gram Jaccard 相似度不低于该值视为重复
+    CONTEXT_TOKENIZER_ENCODING = "cl100k_base"  # tiktoken 编码
+    
+    # 案例关键部分（入库时预先提取）保存的 SQLite 数据库，与文件权限表共用
+    CASE_SECTIONS_DB_PATH = "knowledge_files.db"
+    
+    # 法条精确查找索引（法律名称 + 条文号 -> 条文），入库时更新
+    LAW_ARTICLE_INDEX_PATH = "./chroma_db/law_article_index.json"
+    
+    # 增量同步清单（记录已入库文件的指纹和稳定的 file_id）
+    SYNC_MANIFEST_PATH = "./chroma_db/sync_manifest.json"
+    
+    # 批量加载与切分配置
+    LOAD_WORKERS = 4  # 加载/切分进程数
+    LOAD_BATCH_SIZE = 500  # 流式产出时每批的文档块数
     
     # 文档类型定义
     DOC_TYPE_LAW = "law"
@@ -36,6 +70,26 @@ class Config:
     # 系统用户ID
     SYSTEM_OWNER_ID = "system"
 
+    # 上传文件文本抽取配置
+    EXTRACT_WORKERS = 2  # 抽取进程数
+    EXTRACT_TIMEOUT = 120  # 单个文件抽取超时（秒）
+    EXTRACT_CACHE_DIR = "./.cache/extracted_text"  # 按内容哈希缓存抽取结果
+
+    # 案例LLM结构化配置
+    STRUCTURE_MODE = "map_reduce"  # "map_reduce" 分段并发抽取后合并；"single" 截断后单次调用
+    STRUCTURE_SINGLE_PASS_CHARS = 8000  # 不超过该长度的文本仍走单次调用
+    STRUCTURE_SEGMENT_CHARS = 6000  # 分段抽取时单个片段的最大字符数
+    STRUCTURE_MAX_CONCURRENCY = 4  # 同一文件并发调用LLM的上限
+    STRUCTURE_CACHE_DIR = "./.cache/structured_cases"  # 按文本哈希缓存结构化结果
+
+    # 出站HTTP客户端配置（服务启动时创建，生命周期内共享连接池）
+    HTTP_MAX_CONNECTIONS = 20  # 连接总数上限，超出时排队等待空闲连接
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = 10  # 保持 keep-alive 的空闲连接数
+    HTTP_KEEPALIVE_EXPIRY = 30  # 空闲连接保留时长（秒）
+    HTTP_CONNECT_TIMEOUT = 5  # 建立连接超时（秒）
+    HTTP_READ_TIMEOUT = 30  # 单次读取超时（秒），流式下载按块计时而非整个文件
+    DOWNLOAD_CHUNK_SIZE = 256 * 1024  # 流式下载写盘的块大小（字节）
+
     WEB_VS_COLLECTION_NAME = "web"
     WEB_VS_SEARCH_K = 2
 
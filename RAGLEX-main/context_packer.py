@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上下文打包模块：在生成回答前对检索文档去重、裁剪，并按重排序得分填充到 token 预算内
+避免 top_k 较大时把所有切片与联网结果原样拼进 Prompt
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from config import config
+from case_sections import KEY_SECTIONS_FLAG, extract_case_key_sections
+
+SHINGLE_SIZE = 5
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """tiktoken 编码器只加载一次；未安装时返回 None，按字符数估算"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(config.CONTEXT_TOKENIZER_ENCODING)
+    except Exception as e:
+        print(f"tiktoken 不可用，按字符数估算token: {e}")
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """统计文本token数，同一切片在不同请求间命中缓存"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def _normalize(text: str) -> str:
+    return WHITESPACE_PATTERN.sub("", text)
+
+
+def _shingles(text: str) -> frozenset:
+    if len(text) <= SHINGLE_SIZE:
+        return frozenset([text])
+    return frozenset(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+
+def _is_near_duplicate(shingles: frozenset, kept_shingles: List[frozenset]) -> bool:
+    threshold = config.CONTEXT_NEAR_DUPLICATE_THRESHOLD
+    for other in kept_shingles:
+        # 长度相差过大时 Jaccard 不可能达到阈值，跳过计算
+        smaller, larger = sorted((len(shingles), len(other)))
+        if not larger or smaller / larger < threshold:
+            continue
+        if len(shingles & other) / len(shingles | other) >= threshold:
+            return True
+    return False
+
+
+def _trim_case(doc) -> str:
+    # 检索阶段已换成入库时保存的关键部分的，直接使用
+    if doc.metadata.get(KEY_SECTIONS_FLAG):
+        return doc.page_content
+    return extract_case_key_sections(doc.page_content)
+
+
+def pack_context_docs(context_docs: List, web_content: str = "", token_budget: int = None) -> Tuple[List, str, Dict[str, Any]]:
+    """
+    去重、裁剪并按得分打包上下文
+
+    Args:
+        context_docs: 检索到的文档（法律条文与案例）
+        web_content: 联网搜索结果
+        token_budget: 上下文token预算，默认 config.CONTEXT_TOKEN_BUDGET
+
+    Returns:
+        (被放入上下文的原始文档列表, 打包后的上下文文本, 统计信息)
+        原始文档保持未裁剪的内容与元数据，供生成引用来源使用；裁剪后的文本只进入上下文
+    """
+    token_budget = token_budget or config.CONTEXT_TOKEN_BUDGET
+    context_docs = context_docs or []
+    tokens_before = sum(count_tokens(doc.page_content) for doc in context_docs) + count_tokens(web_content)
+
+    # 按重排序得分降序（无得分的保持原有顺序排在后面），重复内容保留得分最高的一份
+    ordered = sorted(
+        enumerate(context_docs),
+        key=lambda item: (-item[1].metadata.get("rerank_score", float("-inf")), item[0])
+    )
+
+    seen_hashes = set()
+    kept_shingles: List[frozenset] = []
+    candidates = []
+    duplicates_removed = 0
+    for _, doc in ordered:
+        content = _trim_case(doc) if "case" in doc.metadata.get("doc_type", "") else doc.page_content
+        content = content.strip()
+        normalized = _normalize(content)
+        if not normalized:
+            continue
+        content_hash = hashlib.md5(normalized.encode("utf-8")).hexdigest()
+        if content_hash in seen_hashes:
+            duplicates_removed += 1
+            continue
+        shingles = _shingles(normalized)
+        if _is_near_duplicate(shingles, kept_shingles):
+            duplicates_removed += 1
+            continue
+        seen_hashes.add(content_hash)
+        kept_shingles.append(shingles)
+        candidates.append((doc, content))
+
+    # 有联网结果时为其预留一部分预算，文档未用完的预算也留给联网结果
+    web_reserve = min(config.CONTEXT_WEB_TOKEN_BUDGET, count_tokens(web_content)) if web_content else 0
+    remaining = max(0, token_budget - web_reserve)
+    packed_docs, packed_contents = [], []
+    for doc, content in candidates:
+        tokens = count_tokens(content)
+        if tokens > remaining:
+            if remaining < config.CONTEXT_MIN_CHUNK_TOKENS:
+                break
+            content = truncate_to_tokens(content, remaining)
+            tokens = count_tokens(content)
+        packed_docs.append(doc)
+        packed_contents.append(content)
+        remaining -= tokens
+        if remaining <= 0:
+            break
+
+    context = "\n\n".join(packed_contents)
+    if web_content:
+        web_budget = remaining + web_reserve
+        packed_web = truncate_to_tokens(web_content, web_budget)
+        if packed_web:
+            context += "\n\n网络搜索结果:\n" + packed_web
+
+    tokens_after = count_tokens(context)
+    stats = {
+        "input_docs": len(context_docs),
+        "packed_docs": len(packed_docs),
+        "duplicates_removed": duplicates_removed,
+        "token_budget": token_budget,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": max(0, tokens_before - tokens_after),
+    }
+    return packed_docs, context, stats
@@ -9,6 +9,9 @@ from config import config
 from utils import get_vectorstore
 from retriever import get_multi_query_law_retiever
 from utils import get_model_openai
+from article_index import (
+    lookup_article, get_articles_by_law, get_article_by_id, is_article_index_ready, article_id_of
+)
 
 # 创建路由
 router = APIRouter(prefix="/laws", tags=["法规查询"])
@@ -70,7 +73,7 @@ def extract_law_info(doc) -> LawArticle:
     article_number = article_match.group(1) if article_match else None
     
     return LawArticle(
-        id=metadata.get("id", f"law-{hash(content) % 10000}"),
+        id=article_id_of(doc),
         title=metadata.get("title", f"{law_name}第{article_number}条" if article_number else law_name),
         content=content,
         law_name=law_name,
@@ -81,6 +84,19 @@ def extract_law_info(doc) -> LawArticle:
         source=metadata.get("source", "中华人民共和国法律库")
     )
 
+def article_record_to_law_article(record: Dict[str, Any]) -> LawArticle:
+    """法条索引记录转换为API响应格式"""
+    return LawArticle(
+        id=record["id"],
+        title=f"{record['law_name']}{record['article']}",
+        content=record["content"],
+        law_name=record["law_name"],
+        chapter=record.get("chapter"),
+        section=record.get("section"),
+        article_number=record["article_key"],
+        source=record.get("source") or "中华人民共和国法律库"
+    )
+
 # 路由定义
 @router.get("/categories", response_model=List[LawCategory])
 async def get_law_categories():
@@ -126,19 +142,12 @@ async def search_laws(
 async def get_law_by_id(law_id: str):
     """根据ID获取特定法律条文"""
     try:
-        # 这里应该从数据库或向量存储中获取特定ID的法律条文
-        # 示例实现 - 实际应用中需要替换为真实的数据获取逻辑
-        law_vs = get_vectorstore(config.LAW_VS_COLLECTION_NAME)
-        
-        # 这里假设我们可以通过元数据过滤来获取特定ID的文档
-        # 实际实现可能需要根据向量存储的API进行调整
-        filter_dict = {"id": law_id}
-        docs = law_vs.similarity_search("", k=1, filter=filter_dict)
-        
-        if not docs:
+        # 从法条索引中按ID直接获取，不再做向量检索
+        record = get_article_by_id(law_id)
+        if record is None:
             raise HTTPException(status_code=404, detail=f"未找到ID为{law_id}的法律条文")
         
-        return extract_law_info(docs[0])
+        return article_record_to_law_article(record)
     except HTTPException:
         raise
     except Exception as e:
@@ -151,15 +160,8 @@ async def get_laws_by_name(
 ):
     """根据法律名称获取所有相关条文"""
     try:
-        # 获取向量存储
-        law_vs = get_vectorstore(config.LAW_VS_COLLECTION_NAME)
-        
-        # 这里假设我们可以通过元数据过滤来获取特定法律名称的文档
-        # 实际实现可能需要根据向量存储的API进行调整
-        filter_dict = {"source": {"$eq": law_name}}
-        docs = law_vs.similarity_search("", k=limit, filter=filter_dict)
-        
-        results = [extract_law_info(doc) for doc in docs]
+        # 从法条索引中按条文顺序读取
+        results = [article_record_to_law_article(record) for record in get_articles_by_law(law_name, limit)]
         
         return LawSearchResult(
             total=len(results),
@@ -176,7 +178,14 @@ async def get_specific_article(
 ):
     """获取特定法律的特定条文"""
     try:
-        # 获取向量存储
+        # 法条索引精确查找（法律名称可带或不带"中华人民共和国"，条文号支持中文/阿拉伯数字）
+        record = lookup_article(law_name, article_number)
+        if record is not None:
+            return article_record_to_law_article(record)
+        if is_article_index_ready():
+            raise HTTPException(status_code=404, detail=f"未找到{law_name}第{article_number}条")
+        
+        # 索引尚未建立（需运行 python article_index.py）时退回向量检索
         law_vs = get_vectorstore(config.LAW_VS_COLLECTION_NAME)
         
         # 构建查询
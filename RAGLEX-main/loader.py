@@ -1,9 +1,12 @@
 # coding: utf-8
-from typing import Any, List
+from typing import Any, Dict, Iterator, List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.document_loaders import TextLoader, DirectoryLoader
 from langchain.docstore.document import Document
 from config import config
-import os
+from citation import extract_case_citation_metadata
+import multiprocessing
 
 class LawLoader(DirectoryLoader):
     """Load law books."""
@@ -94,6 +97,7 @@ class CaseLoader(DirectoryLoader):
         for source, source_docs in docs_by_source.items():
             # 提取标题
             title = self._extract_title_from_content(source_docs[0].page_content if source_docs else "")
+            citation_metadata = extract_case_citation_metadata("".join(doc.page_content for doc in source_docs))
             
             for chunk_seq_id, doc in enumerate(source_docs):
                 # 使用新的简化元数据结构
@@ -102,7 +106,8 @@ class CaseLoader(DirectoryLoader):
                     "source": source,
                     "doc_type": "case",
                     "title": title,
-                    "chunk_seq_id": chunk_seq_id
+                    "chunk_seq_id": chunk_seq_id,
+                    **citation_metadata
                 }
                 processed_docs.append(doc)
             
@@ -121,6 +126,101 @@ class CaseLoader(DirectoryLoader):
                 return line[:50] + ('...' if len(line) > 50 else '')
         return "未知标题"
 
+def extract_title_from_content(content: str) -> str:
+    """从文档内容中提取标题"""
+    lines = content.strip().split('\n')
+    for line in lines:
+        line = line.strip()
+        if line.startswith('# '):
+            return line[2:].strip()
+        elif line and not line.startswith('#'):
+            return line[:50] + ('...' if len(line) > 50 else '')
+    return "未知标题"
+
+def load_documents_from_files(file_entries: List[Dict[str, Any]]) -> List[Document]:
+    """按文件列表加载文档，file_id 由调用方指定（增量同步时来自同步清单，保证稳定）
+    
+    Args:
+        file_entries: [{"source": 文件路径, "file_id": 文件ID, "doc_type": 文档类型}, ...]
+    
+    Returns:
+        带有标准元数据的文档列表
+    """
+    docs = []
+    for entry in file_entries:
+        source = entry["source"]
+        source_docs = TextLoader(source, encoding="utf-8").load()
+        title = extract_title_from_content(source_docs[0].page_content if source_docs else "")
+        # 案例在切分前按全文提取法院、判决日期、案例编号，切分后每个块都带上
+        citation_metadata = {}
+        if entry["doc_type"] != config.DOC_TYPE_LAW:
+            citation_metadata = extract_case_citation_metadata("".join(doc.page_content for doc in source_docs))
+        
+        for chunk_seq_id, doc in enumerate(source_docs):
+            doc.metadata = {
+                "file_id": entry["file_id"],
+                "source": source,
+                "doc_type": entry["doc_type"],
+                "title": title,
+                "chunk_seq_id": chunk_seq_id,
+                **citation_metadata
+            }
+            docs.append(doc)
+    return docs
+
+def _load_and_split_file(entry: Dict[str, Any], collection_name: str) -> List[Document]:
+    """进程池工作函数：加载单个文件并切分，元数据与 load_documents_from_files 一致"""
+    from splitter import get_splitter_for_collection
+    
+    docs = load_documents_from_files([entry])
+    return get_splitter_for_collection(collection_name).split_documents(docs)
+
+def iter_split_document_batches(file_entries: List[Dict[str, Any]], collection_name: str,
+                                batch_size: int = None, max_workers: int = None) -> Iterator[List[Document]]:
+    """多进程加载并切分文件，按批次流式产出文档块
+    
+    结果严格按 file_entries 的顺序产出，同一文件的块不会被拆到两个批次中；
+    同时在途的文件数有上限，索引端消费较慢时加载端会自动等待。
+    
+    Args:
+        file_entries: [{"source": 文件路径, "file_id": 文件ID, "doc_type": 文档类型}, ...]
+        collection_name: 目标集合，决定使用的分割器
+        batch_size: 每批至少包含的块数，默认 config.LOAD_BATCH_SIZE
+        max_workers: 进程数，默认 config.LOAD_WORKERS
+    
+    Returns:
+        文档块批次的生成器
+    """
+    batch_size = batch_size or config.LOAD_BATCH_SIZE
+    max_workers = max_workers or config.LOAD_WORKERS
+    if not file_entries:
+        return
+    
+    # 使用 spawn，避免在已加载 CUDA / 模型的父进程中 fork
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque()
+        entries = iter(file_entries)
+        max_pending = max_workers * 4
+        batch = []
+        
+        for entry in entries:
+            pending.append(executor.submit(_load_and_split_file, entry, collection_name))
+            if len(pending) < max_pending:
+                continue
+            batch.extend(pending.popleft().result())
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        
+        while pending:
+            batch.extend(pending.popleft().result())
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        
+        if batch:
+            yield batch
+
 def load_law_documents_only() -> List[Document]:
     """加载法律条文文档（不包括案例）"""
     loader = SeparatedLawLoader(config.LAW_BOOK_PATH)
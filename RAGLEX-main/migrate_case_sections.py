@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为已入库的案例切片补建关键部分记录（case_key_sections 表）
+新入库的案例会在写入向量库时自动提取，本脚本只需在升级后运行一次
+"""
+
+from case_sections import store_case_sections
+from utils import get_case_vectorstore
+
+BATCH_SIZE = 500
+
+
+class _Chunk:
+    def __init__(self, page_content: str, metadata: dict):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+
+def run_migration():
+    collection = get_case_vectorstore()._collection
+    total = collection.count()
+    print(f"📚 案例切片总数: {total}")
+
+    stored = 0
+    for offset in range(0, total, BATCH_SIZE):
+        batch = collection.get(limit=BATCH_SIZE, offset=offset, include=["documents", "metadatas"])
+        chunks = [
+            _Chunk(content, metadata)
+            for content, metadata in zip(batch["documents"], batch["metadatas"])
+            if content
+        ]
+        stored += store_case_sections(chunks)
+        print(f"  - 已处理 {min(offset + BATCH_SIZE, total)}/{total}")
+
+    print(f"\n🎉 案例关键部分补建完成，共写入 {stored} 条记录")
+
+
+if __name__ == "__main__":
+    run_migration()
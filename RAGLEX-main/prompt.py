@@ -239,6 +239,23 @@ TRANSFORM_AND_STRUCTURE_PROMPT_TEMPLATE = """你是一位资深的法律文书
 {format_instructions}
 """
 
+SEGMENT_STRUCTURE_PROMPT_TEMPLATE = """你是一位资深的法律文书专家和书记员。
+下面是一份较长法律案例文本的第 {segment_index}/{segment_total} 个片段，该片段属于原文的【{section}】部分。
+你的任务是**仅根据本片段内容**抽取并归纳案例字段，输出JSON对象，其他片段会由系统单独处理并合并。
+
+【核心指令】
+- **只看本片段**：不要臆测片段之外的内容，本片段未涉及的字段设为 `null`（列表字段设为空列表）。
+- **归纳与重写**：对于"基本案情"、"裁判理由"、"裁判要旨"，用自己的语言归纳本片段中的相关内容，不要直接复制原文。
+- **精确提取**：`标题`、`案例编号`、`法院`、`判决日期`、`法律条文` 需从片段中精确提取。
+
+【原始案例片段】
+{text}
+
+【输出要求】
+你必须严格按照下面定义的JSON格式输出，不要有任何额外的解释或文本。
+{format_instructions}
+"""
+
 # 注意：这里需要导入IdealCaseStructure
 # from receive_data import IdealCaseStructure  # 移除循环导入
 
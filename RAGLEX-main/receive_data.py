@@ -8,6 +8,10 @@ import sqlite3
 from datetime import datetime
 import uuid
 import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote
 from pathlib import Path
 import aiofiles
 from fastapi import FastAPI, HTTPException, BackgroundTasks
@@ -15,8 +19,12 @@ from fastapi.responses import JSONResponse
 from chain import get_law_chain_intent, get_law_chain
 from config import config
 from callback import OutCallbackHandler
-from schemas import KnowledgeUploadData, CaseStructure, IdealCaseStructure
+from schemas import KnowledgeUploadData, CaseStructure, IdealCaseStructure, PartialCaseStructure
 import permission_manager
+from text_extractor import extract_text_async, extract_text_from_path
+from citation import build_source_summary
+from context_packer import pack_context_docs
+from case_sections import delete_case_sections
 from permission_manager import get_user_private_files, get_public_files
 from utils import (
     get_vectorstore, get_model_openai, get_memory, 
@@ -25,13 +33,55 @@ from utils import (
     search_law_documents, search_case_documents,
     search_case_documents_with_user_filter,
     rerank_existing_documents, get_model,
-    add_single_file_to_vectorstore
+    add_single_file_to_vectorstore, query_similarity
 )
 from prompt import (
     PRE_QUESTION_PROMPT, CHECK_INTENT_PROMPT, 
     LAW_PROMPT_HISTORY, FRIENDLY_REJECTION_PROMPT,
     MULTI_QUERY_PROMPT_TEMPLATE
 )
+# 联网搜索结果缓存：与 Flask 端 utils/web_search 相同，按规范化查询缓存 WEB_SEARCH_CACHE_TTL_SECONDS 秒
+WEB_SEARCH_CACHE_MAX_ENTRIES = 512
+_web_search_cache = OrderedDict()
+_web_search_cache_lock = threading.Lock()
+
+
+def get_web_search_cache_ttl() -> int:
+    try:
+        return max(0, int(os.environ.get("WEB_SEARCH_CACHE_TTL_SECONDS", "600")))
+    except ValueError:
+        return 600
+
+
+def _web_search_cache_key(query: str, num_results: int):
+    return re.sub(r"\s+", " ", query or "").strip().lower(), num_results
+
+
+def _get_cached_web_search(query: str, num_results: int) -> Optional[str]:
+    key = _web_search_cache_key(query, num_results)
+    with _web_search_cache_lock:
+        entry = _web_search_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _web_search_cache[key]
+            return None
+        _web_search_cache.move_to_end(key)
+        return entry[1]
+
+
+def _put_cached_web_search(query: str, num_results: int, content: str) -> None:
+    ttl = get_web_search_cache_ttl()
+    if not ttl:
+        return
+    key = _web_search_cache_key(query, num_results)
+    with _web_search_cache_lock:
+        _web_search_cache[key] = (time.monotonic() + ttl, content)
+        _web_search_cache.move_to_end(key)
+        while len(_web_search_cache) > WEB_SEARCH_CACHE_MAX_ENTRIES:
+            _web_search_cache.popitem(last=False)
+
+
 # 网络搜索功能实现
 def search_web_serper(query: str, num_results: int = 3) -> str:
     """
@@ -53,6 +103,11 @@ def search_web_serper(query: str, num_results: int = 3) -> str:
         if not serper_api_key:
             print("警告: 未找到SERPER_API_KEY环境变量")
             return "网络搜索不可用：缺少API密钥"
+
+        cached = _get_cached_web_search(query, num_results)
+        if cached is not None:
+            print(f"联网搜索命中缓存: {query}")
+            return cached
         
         # Serper API配置
         url = "https://google.serper.dev/search"
@@ -88,8 +143,10 @@ def search_web_serper(query: str, num_results: int = 3) -> str:
                 results.append(formatted_result)
         
         if results:
-            # 用双换行符连接多个结果
-            return "\n\n".join(results)
+            # 用双换行符连接多个结果，只缓存成功的结果
+            web_content = "\n\n".join(results)
+            _put_cached_web_search(query, num_results, web_content)
+            return web_content
         else:
             return "未找到相关搜索结果"
             
@@ -113,11 +170,52 @@ from dotenv import load_dotenv
 from pathlib import Path
 import logging
 import numpy as np
-import aiohttp
 import aiofiles
+import asyncio
+import hashlib
+import json
 import os
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# 服务生命周期内共享的异步HTTP客户端，复用 keep-alive 连接，避免每个请求重新握手
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(config.HTTP_READ_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT)
+    )
 
-app = FastAPI(title="知识库上传接收服务")
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享客户端；未经 lifespan 启动（如脚本直接调用）时按需创建"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _http_client
+    _http_client = _build_http_client()
+    print(f"[DEBUG] HTTP客户端已创建: 最大连接数 {config.HTTP_MAX_CONNECTIONS}, keep-alive {config.HTTP_MAX_KEEPALIVE_CONNECTIONS}")
+    try:
+        yield
+    finally:
+        client, _http_client = _http_client, None
+        if client is not None:
+            await client.aclose()
+        print("[DEBUG] HTTP客户端已关闭")
+
+
+app = FastAPI(title="知识库上传接收服务", lifespan=lifespan)
 
 # 加载环境变量
 load_dotenv()
@@ -223,43 +321,15 @@ def format_data_to_markdown(data: dict) -> str:
     return markdown_content
 
 def extract_text_from_file(file_path: str) -> str:
-    """从文件中提取文本内容"""
+    """从文件中提取文本内容（同步版本，异步流程请使用 extract_text_async）"""
     try:
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        if file_ext == '.pdf':
-            try:
-                import pypdf
-                with open(file_path, 'rb') as file:
-                    reader = pypdf.PdfReader(file)
-                    text = ""
-                    for page in reader.pages:
-                        text += page.extract_text() + "\n"
-                    return text
-            except ImportError:
-                logger.error("pypdf库未安装，无法处理PDF文件")
-                return ""
-        
-        elif file_ext == '.docx':
-            try:
-                import docx
-                doc = docx.Document(file_path)
-                text = ""
-                for paragraph in doc.paragraphs:
-                    text += paragraph.text + "\n"
-                return text
-            except ImportError:
-                logger.error("python-docx库未安装，无法处理DOCX文件")
-                return ""
-        
-        elif file_ext in ['.txt', '.md']:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        
-        else:
-            logger.warning(f"不支持的文件格式: {file_ext}")
-            return ""
-            
+        return extract_text_from_path(file_path)
+    except ImportError as e:
+        logger.error(f"文档解析库未安装: {str(e)}")
+        return ""
+    except ValueError as e:
+        logger.warning(str(e))
+        return ""
     except Exception as e:
         logger.error(f"文本提取失败: {str(e)}")
         return ""
@@ -356,6 +426,237 @@ def structure_content_with_llm(raw_text: str) -> dict:
             裁判理由="解析失败", 裁判要旨="解析失败", 法律条文=[]
         ).model_dump()
 
+# ---------------- 长文书分段并发结构化 ----------------
+
+# 裁判文书中常见的段落标题及其对应的叙述性字段
+CASE_SECTION_PATTERN = re.compile(
+    r'^[ \t]*[【\[（(]?[ \t]*(基本案情|案件事实|经审理查明|裁判理由|本院认为|裁判要旨|裁判结果)',
+    re.MULTILINE
+)
+CASE_SECTION_FIELD_MAP = {
+    '基本案情': '基本案情',
+    '案件事实': '基本案情',
+    '经审理查明': '基本案情',
+    '裁判理由': '裁判理由',
+    '本院认为': '裁判理由',
+    '裁判要旨': '裁判要旨',
+}
+CASE_NARRATIVE_FIELDS = ['基本案情', '裁判理由', '裁判要旨']
+CASE_SCALAR_FIELDS = ['标题', '案例类型', '案例编号', '法院', '判决日期']
+CASE_LIST_FIELDS = ['关键词', '法律条文']
+
+
+def _split_text_by_size(text: str, max_chars: int) -> List[str]:
+    """按段落将文本切成不超过 max_chars 的片段，超长段落硬切"""
+    pieces = []
+    current = []
+    current_length = 0
+
+    for paragraph in text.split('\n'):
+        if current and current_length + len(paragraph) + 1 > max_chars:
+            pieces.append('\n'.join(current))
+            current = []
+            current_length = 0
+        while len(paragraph) > max_chars:
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        current.append(paragraph)
+        current_length += len(paragraph) + 1
+
+    if current:
+        pieces.append('\n'.join(current))
+    return [piece for piece in pieces if piece.strip()]
+
+
+def split_case_sections(raw_text: str, max_chars: int = None) -> List[tuple]:
+    """
+    按基本案情/裁判理由/裁判要旨等自然段落切分案例文本，过长的段落再按长度切分
+
+    Args:
+        raw_text: 原始案例文本
+        max_chars: 单个片段的最大字符数
+
+    Returns:
+        [(段落名称, 片段文本), ...]，保持原文顺序；首个标题之前的内容记为"首部"
+    """
+    max_chars = max_chars or config.STRUCTURE_SEGMENT_CHARS
+    matches = list(CASE_SECTION_PATTERN.finditer(raw_text))
+
+    sections = []
+    if not matches or matches[0].start() > 0:
+        end = matches[0].start() if matches else len(raw_text)
+        sections.append(('首部' if matches else '全文', raw_text[:end]))
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(raw_text)
+        sections.append((match.group(1), raw_text[match.start():end]))
+
+    segments = []
+    for section_name, section_text in sections:
+        for piece in _split_text_by_size(section_text, max_chars):
+            segments.append((section_name, piece))
+    return segments
+
+
+def merge_partial_structures(partials: List[tuple]) -> dict:
+    """
+    确定性地合并各片段的抽取结果
+
+    规则：
+    - 叙述性字段：优先按原文顺序拼接来自对应段落的结果；原文无对应段落时取第一个非空值
+    - 标量字段：取原文顺序中第一个非空值
+    - 列表字段：按出现顺序去重合并
+
+    Args:
+        partials: [(段落名称, PartialCaseStructure 字典), ...]，按原文顺序排列
+
+    Returns:
+        符合 IdealCaseStructure 的字典
+    """
+    merged = {}
+
+    for field in CASE_NARRATIVE_FIELDS:
+        values = [
+            (data.get(field) or '').strip()
+            for section, data in partials
+            if CASE_SECTION_FIELD_MAP.get(section) == field
+        ]
+        values = [value for value in values if value]
+        if not values:
+            values = [(data.get(field) or '').strip() for _, data in partials]
+            values = [value for value in values if value][:1]
+        merged[field] = '\n\n'.join(values) if values else '未提供'
+
+    for field in CASE_SCALAR_FIELDS:
+        merged[field] = next(
+            ((data.get(field) or '').strip() for _, data in partials if (data.get(field) or '').strip()),
+            None
+        )
+    merged['标题'] = merged['标题'] or 'untitled'
+    merged['案例类型'] = merged['案例类型'] or '未知'
+
+    for field in CASE_LIST_FIELDS:
+        seen = set()
+        values = []
+        for _, data in partials:
+            for item in data.get(field) or []:
+                item = str(item).strip()
+                if item and item not in seen:
+                    seen.add(item)
+                    values.append(item)
+        merged[field] = values
+
+    return IdealCaseStructure(**merged).model_dump()
+
+
+def _get_structure_cache_path(raw_text: str) -> str:
+    content_hash = hashlib.sha256(raw_text.encode('utf-8')).hexdigest()
+    os.makedirs(config.STRUCTURE_CACHE_DIR, exist_ok=True)
+    return os.path.join(config.STRUCTURE_CACHE_DIR, f"{content_hash}.json")
+
+
+def _load_cached_structure(cache_path: str) -> Optional[dict]:
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _store_cached_structure(cache_path: str, structured_data: dict):
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(structured_data, f, ensure_ascii=False)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"结构化结果缓存写入失败: {str(e)}")
+
+
+async def _structure_segment(model, segment: tuple, segment_index: int, segment_total: int,
+                             semaphore: asyncio.Semaphore) -> Optional[dict]:
+    """对单个片段调用LLM抽取字段，失败时返回 None"""
+    from prompt import SEGMENT_STRUCTURE_PROMPT_TEMPLATE
+
+    section_name, segment_text = segment
+    parser = PydanticOutputParser(pydantic_object=PartialCaseStructure)
+    prompt_template = PromptTemplate(
+        template=SEGMENT_STRUCTURE_PROMPT_TEMPLATE,
+        input_variables=["text", "section", "segment_index", "segment_total"],
+        partial_variables={"format_instructions": parser.get_format_instructions()}
+    )
+    formatted_prompt = prompt_template.format(
+        text=segment_text,
+        section=section_name,
+        segment_index=segment_index,
+        segment_total=segment_total
+    )
+
+    async with semaphore:
+        try:
+            raw_response = await model.ainvoke(formatted_prompt)
+            cleaned_content = clean_llm_json_output(raw_response.content)
+            result = parser.parse(cleaned_content).model_dump()
+            print(f"[DEBUG] 片段 {segment_index}/{segment_total}（{section_name}）结构化完成")
+            return result
+        except Exception as e:
+            logger.error(f"片段 {segment_index}/{segment_total}（{section_name}）结构化失败: {str(e)}")
+            return None
+
+
+async def structure_content_with_llm_async(raw_text: str) -> dict:
+    """
+    异步结构化案例文本：短文本单次调用，长文本按自然段落分段并发抽取后合并
+
+    结果按文本内容哈希缓存，同一文件重复上传时不再调用LLM。
+
+    Args:
+        raw_text: 原始案例文本
+
+    Returns:
+        符合 IdealCaseStructure 的字典
+    """
+    cache_path = _get_structure_cache_path(raw_text)
+    cached = _load_cached_structure(cache_path)
+    if cached is not None:
+        print(f"[INFO] 结构化结果命中缓存: {os.path.basename(cache_path)}")
+        return cached
+
+    if config.STRUCTURE_MODE != "map_reduce" or len(raw_text) <= config.STRUCTURE_SINGLE_PASS_CHARS:
+        loop = asyncio.get_running_loop()
+        structured_data = await loop.run_in_executor(None, structure_content_with_llm, raw_text)
+        if structured_data.get('标题') != "文档解析失败":
+            _store_cached_structure(cache_path, structured_data)
+        return structured_data
+
+    segments = split_case_sections(raw_text)
+    print(f"[INFO] 启动分段结构化: 文本长度 {len(raw_text)}，片段数 {len(segments)}")
+
+    model = get_model_openai()
+    semaphore = asyncio.Semaphore(config.STRUCTURE_MAX_CONCURRENCY)
+    results = await asyncio.gather(*[
+        _structure_segment(model, segment, index, len(segments), semaphore)
+        for index, segment in enumerate(segments, start=1)
+    ])
+
+    partials = [
+        (segment[0], result)
+        for segment, result in zip(segments, results)
+        if result is not None
+    ]
+    if not partials:
+        logger.error("分段结构化全部失败")
+        return IdealCaseStructure(
+            标题="文档解析失败", 关键词=[], 案例类型="未知", 基本案情="解析失败",
+            裁判理由="解析失败", 裁判要旨="解析失败", 法律条文=[]
+        ).model_dump()
+
+    structured_data = merge_partial_structures(partials)
+    if len(partials) == len(segments):
+        _store_cached_structure(cache_path, structured_data)
+    return structured_data
+
 def format_ideal_case_to_markdown(data: dict) -> str:
     """将新的、理想格式的结构化数据格式化为Markdown"""
     
@@ -539,7 +840,7 @@ async def process_new_knowledge(data: KnowledgeUploadData):
             raise Exception("文件下载失败：本地路径无效")
         
         print(f"[DEBUG] 步骤1: 开始提取文本内容")
-        raw_text = extract_text_from_file(temp_path)
+        raw_text = await extract_text_async(temp_path)
         print(f"[DEBUG] 步骤1: 提取的文本长度: {len(raw_text) if raw_text else 0}")
         if not raw_text.strip():
             print(f"[ERROR] 步骤1: 文本提取失败或文件为空")
@@ -547,7 +848,7 @@ async def process_new_knowledge(data: KnowledgeUploadData):
         
         # 步骤2：调用LLM进行内容结构化
         print(f"[DEBUG] 步骤2: 开始LLM结构化处理")
-        structured_data = structure_content_with_llm(raw_text)
+        structured_data = await structure_content_with_llm_async(raw_text)
         print(f"[DEBUG] 步骤2: LLM结构化完成，标题: {structured_data.get('标题', 'N/A')}")
         
         # 步骤3：确定元数据和存档路径
@@ -766,6 +1067,7 @@ async def new_intelligent_cancel(data: KnowledgeUploadData):
             # c. 删除向量索引
             vectorstore = get_case_vectorstore()
             vectorstore.delete(where={'file_id': file_id})
+            delete_case_sections([file_id])
             print(f"向量数据库索引已删除: file_id={file_id}")
             
             await send_upload_success_notification(data)
@@ -841,6 +1143,14 @@ class CompleteQASystem:
         
         # 初始化BM25索引
         self.bm25_index = self._create_bm25_index()
+        
+        # 推测检索线程池与命中统计
+        self._speculative_executor = ThreadPoolExecutor(
+            max_workers=config.SPECULATIVE_RETRIEVAL_WORKERS,
+            thread_name_prefix="speculative-retrieval"
+        )
+        self._speculative_stats = {"started": 0, "hit": 0, "miss": 0, "discarded": 0, "failed": 0, "saved_seconds": 0.0}
+        self._speculative_stats_lock = threading.Lock()
     
     def _create_bm25_index(self) -> BM25Okapi:
         """创建BM25索引"""
@@ -862,6 +1172,82 @@ class CompleteQASystem:
             print(f"BM25索引创建失败: {e}")
             return None
     
+    def _record_speculative(self, outcome: str, saved_seconds: float = 0.0):
+        with self._speculative_stats_lock:
+            self._speculative_stats[outcome] += 1
+            self._speculative_stats["saved_seconds"] += saved_seconds
+    
+    def get_speculative_stats(self) -> Dict[str, Any]:
+        """推测检索命中统计：命中率 = 命中 / (命中 + 未命中)，非法律意图丢弃的不计入"""
+        with self._speculative_stats_lock:
+            stats = dict(self._speculative_stats)
+        judged = stats["hit"] + stats["miss"]
+        stats["hit_rate"] = round(stats["hit"] / judged, 4) if judged else None
+        stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+        stats["enabled"] = config.SPECULATIVE_RETRIEVAL
+        stats["similarity_threshold"] = config.SPECULATIVE_SIMILARITY_THRESHOLD
+        return stats
+    
+    def _build_speculative_query(self, question: str, chat_history: List = None) -> str:
+        """推测查询：上一轮用户提问 + 原问题，近似问题补全的结果"""
+        last_user_turn = ""
+        for msg in reversed(chat_history or []):
+            if msg.get('role') == 'user' and msg.get('content', '').strip():
+                last_user_turn = msg['content'].strip()
+                break
+        if last_user_turn and last_user_turn != question.strip():
+            return f"{last_user_turn}\n{question}"
+        return question
+    
+    def _timed_knowledge_retrieval(self, multi_queries: List[str], mode: str, user_id: str, top_k: int):
+        started_at = time.time()
+        docs = self.step4_knowledge_retrieval(multi_queries, mode, user_id, top_k)
+        return docs, time.time() - started_at
+    
+    def _start_speculative_retrieval(self, question: str, chat_history: List, mode: str, user_id: str, top_k: int):
+        """在问题补全前提交推测检索，返回 (推测查询, future, 开始时间)；未启用时返回 None"""
+        if not config.SPECULATIVE_RETRIEVAL or mode == "none_knowledge":
+            return None
+        speculative_query = self._build_speculative_query(question, chat_history)
+        future = self._speculative_executor.submit(
+            self._timed_knowledge_retrieval, [speculative_query], mode, user_id, top_k
+        )
+        self._record_speculative("started")
+        print(f"⚡ 已启动推测检索: {speculative_query[:100]}")
+        return speculative_query, future, time.time()
+    
+    def _resolve_speculative_retrieval(self, speculative, completed_question: str, results: Dict[str, Any]) -> Optional[List[Document]]:
+        """补全后问题与推测查询足够相近时返回推测检索结果，否则返回 None 由调用方重新检索"""
+        speculative_query, future, started_at = speculative
+        try:
+            similarity = query_similarity(speculative_query, completed_question)
+        except Exception as e:
+            print(f"推测检索相似度计算失败: {e}")
+            similarity = 0.0
+        hit = similarity >= config.SPECULATIVE_SIMILARITY_THRESHOLD
+        results["speculative_retrieval"] = {"hit": hit, "similarity": round(similarity, 4)}
+        print(f"⚡ 推测查询与补全问题相似度: {similarity:.4f} (阈值 {config.SPECULATIVE_SIMILARITY_THRESHOLD})")
+        
+        if not hit:
+            future.cancel()
+            self._record_speculative("miss")
+            print("⚡ 推测检索未命中，丢弃结果并重新检索")
+            return None
+        
+        try:
+            # 与LLM调用重叠的检索耗时即为节省的时间
+            overlap_seconds = time.time() - started_at
+            docs, retrieval_seconds = future.result()
+            saved_seconds = min(overlap_seconds, retrieval_seconds)
+        except Exception as e:
+            self._record_speculative("failed")
+            print(f"⚡ 推测检索失败，重新检索: {e}")
+            return None
+        self._record_speculative("hit", saved_seconds)
+        results["speculative_retrieval"]["saved_seconds"] = round(saved_seconds, 3)
+        print(f"⚡ 推测检索命中，复用 {len(docs)} 篇文档")
+        return docs
+    
     def step1_question_completion(self, question: str, chat_history: str = "") -> str:
         """步骤1: 问题补全"""
         try:
@@ -925,6 +1311,7 @@ class CompleteQASystem:
             if not main_query:
                 print("警告：没有有效的查询语句，跳过检索。")
                 return []
+            print(f"🔀 多查询融合召回: {len(multi_queries)} 条查询批量向量化，RRF融合去重后统一重排序")
 
             print(f"🎯 开始精确检索 (模式: {mode})，目标数量: 法律条文{top_k}篇 + 案例{top_k}篇")
             
@@ -934,7 +1321,8 @@ class CompleteQASystem:
                 question=main_query,
                 k=top_k,
                 use_rerank=True,
-                rerank_top_k=top_k
+                rerank_top_k=top_k,
+                queries=multi_queries
             )
             print(f"✅ 检索到 {len(law_docs)} 篇相关法律条文")
 
@@ -948,6 +1336,7 @@ class CompleteQASystem:
                 if public_file_ids:
                     case_docs = self._search_case_documents_by_file_ids(
                         question=main_query, 
+                        queries=multi_queries,
                         file_ids=public_file_ids, 
                         k=top_k
                     )
@@ -964,6 +1353,7 @@ class CompleteQASystem:
                         if private_file_ids:
                             case_docs = self._search_case_documents_by_file_ids(
                                 question=main_query, 
+                                queries=multi_queries,
                                 file_ids=private_file_ids, 
                                 k=top_k
                             )
@@ -997,6 +1387,7 @@ class CompleteQASystem:
                             # 检索更多文档然后重排序
                             case_docs = self._search_case_documents_by_file_ids(
                                 question=main_query, 
+                                queries=multi_queries,
                                 file_ids=all_accessible_file_ids, 
                                 k=top_k * 3  # 检索3倍数量
                             )
@@ -1016,6 +1407,7 @@ class CompleteQASystem:
                         if public_file_ids:
                             case_docs = self._search_case_documents_by_file_ids(
                                 question=main_query, 
+                                queries=multi_queries,
                                 file_ids=public_file_ids, 
                                 k=top_k
                             )
@@ -1026,6 +1418,7 @@ class CompleteQASystem:
                     if public_file_ids:
                         case_docs = self._search_case_documents_by_file_ids(
                             question=main_query, 
+                            queries=multi_queries,
                             file_ids=public_file_ids, 
                             k=top_k
                         )
@@ -1036,6 +1429,7 @@ class CompleteQASystem:
                 if public_file_ids:
                     case_docs = self._search_case_documents_by_file_ids(
                         question=main_query, 
+                        queries=multi_queries,
                         file_ids=public_file_ids, 
                         k=top_k
                     )
@@ -1053,8 +1447,8 @@ class CompleteQASystem:
             traceback.print_exc()
             return []
     
-    def _search_case_documents_by_file_ids(self, question: str, file_ids: List[int], k: int) -> List[Document]:
-        """根据文件ID列表检索案例文档的内部辅助函数"""
+    def _search_case_documents_by_file_ids(self, question: str, file_ids: List[int], k: int, queries: List[str] = None) -> List[Document]:
+        """根据文件ID列表检索案例文档的内部辅助函数；提供queries时按多查询融合召回"""
         try:
             if not file_ids:
                 return []
@@ -1066,7 +1460,8 @@ class CompleteQASystem:
                 question=question, 
                 k=k * 2,  # 检索更多然后过滤
                 use_rerank=True, 
-                rerank_top_k=k
+                rerank_top_k=k,
+                queries=queries
             )
             
             # 过滤出指定文件ID的文档
@@ -1155,6 +1550,16 @@ class CompleteQASystem:
         return urls
     
     def _create_source_summary(self, context_docs: List[Document]) -> str:
+        """生成来源摘要：默认按元数据模板生成，SOURCE_SUMMARY_MODE 为 llm 时使用LLM总结"""
+        if not context_docs:
+            return ""
+        if config.SOURCE_SUMMARY_MODE == "llm":
+            return self._create_llm_source_summary(context_docs)
+        summary = build_source_summary(context_docs)
+        print(f"📊 模板生成来源摘要: {len(context_docs)} 篇文档，{len(summary)} 字符")
+        return summary
+    
+    def _create_llm_source_summary(self, context_docs: List[Document]) -> str:
         """使用LLM根据上下文文档生成来源摘要"""
         if not context_docs:
             return ""
@@ -1234,6 +1639,7 @@ class CompleteQASystem:
         """步骤7: 最终回答生成 - 现在返回一个包含主回答和来源摘要的字典。"""
         final_answer = ""
         source_summary = ""
+        context_packing = None
 
         try:
             if intent == "law":
@@ -1243,13 +1649,13 @@ class CompleteQASystem:
                 out_callback = OutCallbackHandler()
                 law_chain = get_law_chain(config, out_callback)
                 
-                # 准备上下文
-                context = ""
-                if context_docs:
-                    context = "\n\n".join([doc.page_content for doc in context_docs])
-                
-                if web_content:
-                    context += "\n\n网络搜索结果:\n" + web_content
+                # 准备上下文：去重、裁剪后按重排序得分填充到token预算内
+                # 返回的是被选中的原始文档（未裁剪），引用来源仍从完整内容与元数据生成
+                context_docs, context, context_packing = pack_context_docs(context_docs, web_content)
+                print(f"📦 上下文打包: {context_packing['input_docs']} 篇 -> {context_packing['packed_docs']} 篇，"
+                      f"去重 {context_packing['duplicates_removed']} 篇，"
+                      f"token {context_packing['tokens_before']} -> {context_packing['tokens_after']} "
+                      f"(节省 {context_packing['tokens_saved']})")
                 
                 # 准备输入
                 chain_input = {
@@ -1295,7 +1701,8 @@ class CompleteQASystem:
         # --- 返回包含两部分的字典 ---
         return {
             "main_answer": final_answer,
-            "source_summary": source_summary
+            "source_summary": source_summary,
+            "context_packing": context_packing
         }
     
     def complete_qa_process(self, question: str, user_id: str = None, chat_history: List = None, 
@@ -1330,6 +1737,9 @@ class CompleteQASystem:
             print(f"对话上下文长度: {len(chat_history)} 条消息，用户消息: {len(user_messages)} 条")
             print(f"用于问题补全的历史: {chat_history_str[:200]}..." if len(chat_history_str) > 200 else f"用于问题补全的历史: {chat_history_str}")
         
+        # 推测检索：与下面的问题补全、意图识别并行
+        speculative = self._start_speculative_retrieval(question, chat_history, mode, user_id, top_k)
+        
         # 第三步：问题预处理与意图识别
         print("\n📝 第三步：问题预处理与意图识别")
         
@@ -1351,20 +1761,28 @@ class CompleteQASystem:
         if intent == "law":
             print("✅ 意图为法律问题，执行完整法律问答流程")
             
-            # 步骤3: 多查询生成
-            print("\n🔍 生成多查询...")
-            multi_queries = self.step3_multi_query_generation(completed_question)
-            results["multi_queries"] = multi_queries
-            print(f"生成查询数量: {len(multi_queries)}")
-            for i, query in enumerate(multi_queries, 1):
-                print(f"  查询{i}: {query}")
-            
-            # 【全新、简化的步骤4】
-            print(f"\n📚 执行知识库检索与排序 (模式: {mode})...")
-            # 直接调用新的step4，它会完成所有检索和排序，并返回最终的文档列表
-            reranked_docs = self.step4_knowledge_retrieval(
-                multi_queries, mode, user_id, top_k
-            )
+            # 推测检索命中时直接复用，跳过多查询生成与检索
+            reranked_docs = None
+            if speculative:
+                reranked_docs = self._resolve_speculative_retrieval(speculative, completed_question, results)
+            
+            if reranked_docs is not None:
+                results["multi_queries"] = [speculative[0]]
+            else:
+                # 步骤3: 多查询生成
+                print("\n🔍 生成多查询...")
+                multi_queries = self.step3_multi_query_generation(completed_question)
+                results["multi_queries"] = multi_queries
+                print(f"生成查询数量: {len(multi_queries)}")
+                for i, query in enumerate(multi_queries, 1):
+                    print(f"  查询{i}: {query}")
+                
+                # 【全新、简化的步骤4】
+                print(f"\n📚 执行知识库检索与排序 (模式: {mode})...")
+                # 直接调用新的step4，它会完成所有检索和排序，并返回最终的文档列表
+                reranked_docs = self.step4_knowledge_retrieval(
+                    multi_queries, mode, user_id, top_k
+                )
             results["retrieved_docs_count"] = len(reranked_docs)  # 更新日志key
             print(f"最终用于生成回答的文档数量: {len(reranked_docs)}")
             
@@ -1391,6 +1809,8 @@ class CompleteQASystem:
             # 【新组装逻辑】拼接主回答和来源摘要
             main_answer = final_result_dict.get("main_answer", "")
             source_summary = final_result_dict.get("source_summary", "")
+            if final_result_dict.get("context_packing"):
+                results["context_packing"] = final_result_dict["context_packing"]
             
             final_answer_with_summary = main_answer
             # 如果来源摘要不为空，则添加
@@ -1405,6 +1825,10 @@ class CompleteQASystem:
             print("ℹ️ 意图为非法律问题，执行简化流程")
             
             # 分支A：意图为"other"(非法律问题)
+            if speculative:
+                speculative[1].cancel()
+                self._record_speculative("discarded")
+                results["speculative_retrieval"] = {"hit": False, "discarded": True}
             results["multi_queries"] = []
             results["retrieved_docs_count"] = 0
             results["reranked_docs_count"] = 0
@@ -1459,67 +1883,72 @@ async def download_file_from_minio(file_path: str, save_path: str = None, user_i
     """
     try:
         print(f"[DEBUG] MinIO下载: 开始下载文件: {file_path}")
-        async with aiohttp.ClientSession() as session:
-            payload = {"minio_path": file_path}
-            print(f"[DEBUG] MinIO下载: 请求载荷: {payload}")
-            print(f"[DEBUG] MinIO下载: 请求URL: http://192.168.240.1:5000/api/file-download/download")
-            async with session.post(
-                "http://192.168.240.1:5000/api/file-download/download",
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                print(f"[DEBUG] MinIO下载: 响应状态码: {response.status}")
-                if response.status == 200:
-                    print(f"[DEBUG] MinIO下载: 开始读取文件内容")
-                    # 获取文件内容
-                    file_content = await response.read()
-                    print(f"[DEBUG] MinIO下载: 文件内容大小: {len(file_content)} bytes")
-                    
-                    # 获取文件名
-                    filename = None
-                    content_disposition = response.headers.get('Content-Disposition', '')
-                    print(f"[DEBUG] MinIO下载: Content-Disposition: {content_disposition}")
-                    if 'filename=' in content_disposition:
-                        filename = content_disposition.split('filename=')[1].strip('"')
-                    else:
-                        filename = os.path.basename(file_path)
-                    print(f"[DEBUG] MinIO下载: 解析的文件名: {filename}")
-                    
-                    # 确定保存路径
-                    if save_path is None:
-                        save_path = generate_save_path(filename, user_id, category)
-                    print(f"[DEBUG] MinIO下载: 保存路径: {save_path}")
-                    
-                    # 确保目录存在
-                    save_dir = os.path.dirname(save_path)
-                    print(f"[DEBUG] MinIO下载: 创建目录: {save_dir}")
-                    Path(save_dir).mkdir(parents=True, exist_ok=True)
-                    
-                    # 保存文件到指定路径
-                    print(f"[DEBUG] MinIO下载: 开始写入文件")
-                    async with aiofiles.open(save_path, 'wb') as f:
-                        await f.write(file_content)
-                    print(f"[DEBUG] MinIO下载: 文件写入完成")
-                    
-                    logger.info(f"文件下载成功: {save_path}")
-                    
-                    return {
-                        "success": True,
-                        "local_path": save_path,
-                        "filename": filename,
-                        "size": len(file_content),
-                        "content_type": response.headers.get('Content-Type')
-                    }
+        client = get_http_client()
+        payload = {"minio_path": file_path}
+        print(f"[DEBUG] MinIO下载: 请求载荷: {payload}")
+        print(f"[DEBUG] MinIO下载: 请求URL: http://192.168.240.1:5000/api/file-download/download")
+        async with client.stream(
+            "POST",
+            "http://192.168.240.1:5000/api/file-download/download",
+            json=payload
+        ) as response:
+            print(f"[DEBUG] MinIO下载: 响应状态码: {response.status_code}")
+            if response.status_code == 200:
+                # 获取文件名（优先解析 RFC 5987 的 filename*，中文文件名只在其中）
+                filename = None
+                content_disposition = response.headers.get('Content-Disposition', '')
+                print(f"[DEBUG] MinIO下载: Content-Disposition: {content_disposition}")
+                if "filename*=UTF-8''" in content_disposition:
+                    filename = unquote(content_disposition.split("filename*=UTF-8''")[1].split(';')[0].strip())
+                elif 'filename=' in content_disposition:
+                    filename = content_disposition.split('filename=')[1].split(';')[0].strip().strip('"')
                 else:
-                    error_text = await response.text()
-                    error_msg = f"文件下载失败: HTTP {response.status}"
-                    print(f"[DEBUG] MinIO下载: 下载失败 - 状态码: {response.status}")
-                    print(f"[DEBUG] MinIO下载: 错误响应内容: {error_text}")
-                    logger.error(error_msg)
-                    return {
-                        "success": False,
-                        "error": error_msg
-                    }
+                    filename = os.path.basename(file_path)
+                print(f"[DEBUG] MinIO下载: 解析的文件名: {filename}")
+                
+                # 确定保存路径
+                if save_path is None:
+                    save_path = generate_save_path(filename, user_id, category)
+                print(f"[DEBUG] MinIO下载: 保存路径: {save_path}")
+                
+                # 确保目录存在
+                save_dir = os.path.dirname(save_path)
+                print(f"[DEBUG] MinIO下载: 创建目录: {save_dir}")
+                Path(save_dir).mkdir(parents=True, exist_ok=True)
+                
+                # 边接收边写盘，内存中只保留一个块；中途失败时删除不完整的文件
+                print(f"[DEBUG] MinIO下载: 开始写入文件")
+                file_size = 0
+                try:
+                    async with aiofiles.open(save_path, 'wb') as f:
+                        async for chunk in response.aiter_bytes(config.DOWNLOAD_CHUNK_SIZE):
+                            await f.write(chunk)
+                            file_size += len(chunk)
+                except Exception:
+                    if os.path.exists(save_path):
+                        os.remove(save_path)
+                    raise
+                print(f"[DEBUG] MinIO下载: 文件写入完成，大小: {file_size} bytes")
+                
+                logger.info(f"文件下载成功: {save_path}")
+                
+                return {
+                    "success": True,
+                    "local_path": save_path,
+                    "filename": filename,
+                    "size": file_size,
+                    "content_type": response.headers.get('Content-Type')
+                }
+            else:
+                error_text = (await response.aread()).decode('utf-8', errors='replace')
+                error_msg = f"文件下载失败: HTTP {response.status_code}"
+                print(f"[DEBUG] MinIO下载: 下载失败 - 状态码: {response.status_code}")
+                print(f"[DEBUG] MinIO下载: 错误响应内容: {error_text}")
+                logger.error(error_msg)
+                return {
+                    "success": False,
+                    "error": error_msg
+                }
     except Exception as e:
         error_msg = f"MinIO文件下载异常: {str(e)}"
         print(f"[DEBUG] MinIO下载: 发生异常: {error_msg}")
@@ -1605,8 +2034,9 @@ async def chat(data:ChatPara):
                 # 从本机获取对话上下文
             local_api_base="http://192.168.240.1:5000"    
             context_url = f"{local_api_base}/api/conversations/{data.conversation_id}/context" 
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(context_url)
+            # 只取最近 recent_messages_count 轮（每轮一问一答）
+            context_params = {'limit': data.recent_messages_count * 2} if data.recent_messages_count > 0 else None
+            response = await get_http_client().get(context_url, params=context_params, timeout=10.0)
                     
             if response.status_code == 200:
                 conversation_context = response.json()
@@ -1684,6 +2114,8 @@ async def chat(data:ChatPara):
             print(f"  - 案例文档: {qa_results.get('case_docs_count', 0)} 个")
             print(f"重排序后文档数: {qa_results.get('reranked_docs_count', 0)}")
             print(f"网络搜索内容长度: {qa_results.get('web_content_length', 0)}")
+            if qa_results.get('speculative_retrieval'):
+                print(f"推测检索: {qa_results['speculative_retrieval']}")
             print(f"最终回答长度: {len(qa_results.get('final_answer', ''))}")
             
             return {
@@ -1885,5 +2317,10 @@ async def receive_knowledge_upload(data: KnowledgeUploadData, background_tasks:
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/speculative-retrieval/stats")
+async def speculative_retrieval_stats():
+    """推测检索命中率统计（进程启动以来累计）"""
+    return {"status": "success", "data": qa_system.get_speculative_stats()}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=10086)
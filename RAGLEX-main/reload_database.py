@@ -8,92 +8,230 @@
 import os
 import sys
 from typing import List, Dict
-from langchain.docstore.document import Document
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import config
-from loader import load_all_documents_separated, load_law_documents_only, load_case_documents_only
+from collections import defaultdict
+from article_index import deferred_article_index_save
+from loader import iter_split_document_batches
 from utils import (
     clear_all_separated_vectorstores, 
-    index_all_documents_separated,
     clear_law_vectorstore,
     clear_case_vectorstore,
     index_law_documents,
-    index_case_documents
+    index_case_documents,
+    index_documents_incremental,
+    delete_documents_by_source
 )
-from splitter import MdSplitter
+from sync_manifest import SyncManifest, scan_source_files, COLLECTION_BY_DOC_TYPE
 
-def reload_all_databases(clear_existing: bool = True) -> Dict[str, Dict]:
+COLLECTION_DISPLAY_NAMES = {
+    config.LAW_DOCUMENTS_COLLECTION: "法律条文",
+    config.CASE_DOCUMENTS_COLLECTION: "案例",
+}
+
+def build_file_entries(items: List[Dict], manifest: SyncManifest) -> Dict[str, List[Dict]]:
     """
-    重新加载所有数据库（法律条文和案例）
+    为待加载文件分配稳定的 file_id，并按目标集合分组
     
     Args:
-        clear_existing: 是否清除现有数据库，默认为True
+        items: [{"source": 文件路径, "doc_type": 文档类型, ...}, ...]
+        manifest: 同步清单，已有文件沿用清单中的 file_id
     
     Returns:
-        索引结果统计
+        {集合名称: [{"source", "doc_type", "file_id", ...}, ...]}
+    """
+    entries = defaultdict(list)
+    for item in items:
+        collection_name = COLLECTION_BY_DOC_TYPE[item["doc_type"]]
+        file_id = manifest.get_file_id(item["source"])
+        if file_id is None:
+            file_id = manifest.allocate_file_id(collection_name)
+        entries[collection_name].append({**item, "file_id": file_id})
+    return entries
+
+def stream_index_collection(collection_name: str, entries: List[Dict], index_fn) -> Dict:
+    """
+    多进程加载切分文件，并边产出边索引，索引端无需等待全部文件加载完成
+    
+    Args:
+        collection_name: 目标集合
+        entries: build_file_entries 产出的文件列表
+        index_fn: 索引函数，签名为 index_fn(docs, show_progress=...)
+    
+    Returns:
+        索引结果统计（额外包含 num_chunks）
+    """
+    info = defaultdict(int)
+    display_name = COLLECTION_DISPLAY_NAMES.get(collection_name, collection_name)
+    
+    # 法条索引在全部批次完成后只写一次
+    with deferred_article_index_save():
+        for batch in iter_split_document_batches(entries, collection_name):
+            result = index_fn(batch, show_progress=False)
+            for key, value in result.items():
+                info[key] += value
+            info["num_chunks"] += len(batch)
+            print(f"{display_name}: 已索引 {info['num_chunks']} 个块")
+    
+    return dict(info)
+
+def sync_databases(scope: str = "all", show_progress: bool = True) -> Dict[str, Dict]:
+    """
+    增量同步向量数据库：只嵌入新增或变更的文件，删除已移除文件的向量
+    
+    通过同步清单比较 mtime、大小和内容哈希，file_id 持久化在清单中保持稳定。
+    
+    Args:
+        scope: "all"、"law" 或 "case"
+        show_progress: 是否显示进度条
+    
+    Returns:
+        各集合的同步结果统计
     """
     print("=" * 50)
-    print("开始重新加载所有数据库")
+    print(f"开始增量同步数据库 (范围: {scope})")
     print("=" * 50)
     
+    manifest = SyncManifest()
+    collections = []
+    if scope in ("all", "law"):
+        collections.append(config.LAW_DOCUMENTS_COLLECTION)
+    if scope in ("all", "case"):
+        collections.append(config.CASE_DOCUMENTS_COLLECTION)
+    
+    scanned = scan_source_files(scope)
+    changes = manifest.detect_changes(scanned, collections)
+    print(f"扫描文件: {len(scanned)} 个，新增 {len(changes['added'])}，变更 {len(changes['changed'])}，"
+          f"删除 {len(changes['removed'])}，未变化 {len(changes['unchanged'])}")
+    
+    entries_by_collection = build_file_entries(changes["added"] + changes["changed"], manifest)
+    
+    results = {}
+    for collection_name in collections:
+        stats = {"num_added": 0, "num_updated": 0, "num_skipped": 0, "num_deleted": 0, "files_removed": 0}
+        
+        # 1. 删除已移除文件的向量
+        removed = [source for source in changes["removed"]
+                   if manifest.files[source]["collection"] == collection_name]
+        if removed:
+            stats["num_deleted"] += delete_documents_by_source(removed, collection_name)
+            stats["files_removed"] = len(removed)
+            for source in removed:
+                manifest.remove(source)
+        
+        # 2. 流式加载、分割并增量索引新增/变更文件
+        entries = entries_by_collection.get(collection_name, [])
+        if entries:
+            try:
+                result = stream_index_collection(
+                    collection_name, entries,
+                    lambda docs, show_progress: index_documents_incremental(docs, collection_name, show_progress)
+                )
+                for key, value in result.items():
+                    stats[key] = stats.get(key, 0) + value
+                for entry in entries:
+                    manifest.record(entry["source"], entry["doc_type"], entry["file_id"], entry["sha256"])
+            except Exception as e:
+                print(f"同步 {collection_name} 时出错: {e}")
+        
+        manifest.save()
+        results[collection_name] = stats
+    
+    print("\n=== 同步结果统计 ===")
+    for db_name, stats in results.items():
+        print(f"\n{db_name}:")
+        for key, value in stats.items():
+            print(f"  {key}: {value}")
+    return results
+
+def _reload_collections(collections: List[str], clear_existing: bool) -> Dict[str, Dict]:
+    """
+    全量重新加载指定集合：清除（可选）后流式加载、分割并索引全部文件
+    
+    Args:
+        collections: 需要重新加载的集合
+        clear_existing: 是否清除现有数据库
+    
+    Returns:
+        各集合的索引结果统计
+    """
+    index_functions = {
+        config.LAW_DOCUMENTS_COLLECTION: index_law_documents,
+        config.CASE_DOCUMENTS_COLLECTION: index_case_documents,
+    }
+    clear_functions = {
+        config.LAW_DOCUMENTS_COLLECTION: clear_law_vectorstore,
+        config.CASE_DOCUMENTS_COLLECTION: clear_case_vectorstore,
+    }
+    
     # 1. 清除现有数据库（如果需要）
     if clear_existing:
         print("\n1. 清除现有向量数据库...")
-        clear_all_separated_vectorstores()
+        if len(collections) == len(clear_functions):
+            clear_all_separated_vectorstores()
+        else:
+            for collection_name in collections:
+                clear_functions[collection_name]()
         print("现有数据库已清除")
     
-    # 2. 加载文档
-    print("\n2. 从新路径加载文档...")
-    print(f"法律条文路径: {config.LAW_BOOK_PATH}")
-    print(f"私有案例路径: {config.PRIVATE_CASE_DOCS_PATH}")
-    print(f"共有案例路径: {config.PUBLIC_CASE_DOCS_PATH}")
+    # 2. 扫描文件
+    print("\n2. 扫描文档目录...")
+    if config.LAW_DOCUMENTS_COLLECTION in collections:
+        print(f"法律条文路径: {config.LAW_BOOK_PATH}")
+    if config.CASE_DOCUMENTS_COLLECTION in collections:
+        print(f"私有案例路径: {config.PRIVATE_CASE_DOCS_PATH}")
+        print(f"共有案例路径: {config.PUBLIC_CASE_DOCS_PATH}")
     
+    scope = "all" if len(collections) == len(clear_functions) else (
+        "law" if collections[0] == config.LAW_DOCUMENTS_COLLECTION else "case")
     try:
-        law_docs, case_docs = load_all_documents_separated()
-        print(f"成功加载法律条文文档: {len(law_docs)} 个")
-        print(f"成功加载案例文档: {len(case_docs)} 个")
+        manifest = SyncManifest()
+        scanned = scan_source_files(scope)
+        items = [{"source": source, "doc_type": doc_type, "sha256": None} for source, doc_type in scanned.items()]
+        entries_by_collection = build_file_entries(items, manifest)
+        for collection_name in collections:
+            print(f"{COLLECTION_DISPLAY_NAMES[collection_name]}文件: {len(entries_by_collection.get(collection_name, []))} 个")
     except Exception as e:
-        print(f"加载文档时出错: {e}")
+        print(f"扫描文档时出错: {e}")
         return {}
     
-    # 3. 分割文档
-    print("\n3. 分割文档...")
+    # 3. 流式加载、分割并索引到向量数据库
+    print("\n3. 加载、分割并索引到向量数据库...")
+    results = {}
     try:
-        law_splitter = MdSplitter(chunk_size=config.LAW_BOOK_CHUNK_SIZE, chunk_overlap=config.LAW_BOOK_CHUNK_OVERLAP)
-        case_splitter = MdSplitter(chunk_size=config.CASE_CHUNK_SIZE, chunk_overlap=config.CASE_CHUNK_OVERLAP)
-        
-        law_chunks = law_splitter.split_documents(law_docs)
-        case_chunks = case_splitter.split_documents(case_docs)
-        print(f"法律条文分割后: {len(law_chunks)} 个块")
-        print(f"案例文档分割后: {len(case_chunks)} 个块")
-    except Exception as e:
-        print(f"分割文档时出错: {e}")
-        return {}
-    
-    # 4. 索引到向量数据库
-    print("\n4. 索引到向量数据库...")
-    try:
-        results = index_all_documents_separated(law_chunks, case_chunks, show_progress=True)
+        for collection_name in collections:
+            entries = entries_by_collection.get(collection_name, [])
+            results[collection_name] = stream_index_collection(
+                collection_name, entries, index_functions[collection_name]
+            )
+            
+            # 刷新同步清单，使后续增量同步从当前状态开始
+            for source in [source for source, entry in manifest.files.items()
+                           if entry.get("collection") == collection_name and source not in scanned]:
+                manifest.remove(source)
+            for entry in entries:
+                manifest.record(entry["source"], entry["doc_type"], entry["file_id"])
+            manifest.save()
         print("\n索引完成！")
-        
-        # 显示结果统计
-        print("\n=== 索引结果统计 ===")
-        for db_name, stats in results.items():
-            print(f"\n{db_name}:")
-            for key, value in stats.items():
-                print(f"  {key}: {value}")
-        
-        return results
     except Exception as e:
         print(f"索引文档时出错: {e}")
-        return {}
+        return results
+    
+    # 显示结果统计
+    print("\n=== 索引结果统计 ===")
+    for db_name, stats in results.items():
+        print(f"\n{db_name}:")
+        for key, value in stats.items():
+            print(f"  {key}: {value}")
+    
+    return results
 
-def reload_law_database_only(clear_existing: bool = True) -> Dict:
+def reload_all_databases(clear_existing: bool = True) -> Dict[str, Dict]:
     """
-    仅重新加载法律条文数据库
+    重新加载所有数据库（法律条文和案例）
     
     Args:
         clear_existing: 是否清除现有数据库，默认为True
@@ -102,50 +240,29 @@ def reload_law_database_only(clear_existing: bool = True) -> Dict:
         索引结果统计
     """
     print("=" * 50)
-    print("重新加载法律条文数据库")
+    print("开始重新加载所有数据库")
     print("=" * 50)
     
-    # 1. 清除现有法律条文数据库
-    if clear_existing:
-        print("\n1. 清除现有法律条文向量数据库...")
-        clear_law_vectorstore()
-    
-    # 2. 加载法律条文文档
-    print("\n2. 加载法律条文文档...")
-    print(f"法律条文路径: {config.LAW_BOOK_PATH}")
+    return _reload_collections(
+        [config.LAW_DOCUMENTS_COLLECTION, config.CASE_DOCUMENTS_COLLECTION], clear_existing
+    )
+
+def reload_law_database_only(clear_existing: bool = True) -> Dict:
+    """
+    仅重新加载法律条文数据库
     
-    try:
-        law_docs = load_law_documents_only()
-        print(f"成功加载法律条文文档: {len(law_docs)} 个")
-    except Exception as e:
-        print(f"加载法律条文文档时出错: {e}")
-        return {}
+    Args:
+        clear_existing: 是否清除现有数据库，默认为True
     
-    # 3. 分割文档
-    print("\n3. 分割法律条文文档...")
-    try:
-        law_splitter = MdSplitter(chunk_size=config.LAW_BOOK_CHUNK_SIZE, chunk_overlap=config.LAW_BOOK_CHUNK_OVERLAP)
-        law_chunks = law_splitter.split_documents(law_docs)
-        print(f"法律条文分割后: {len(law_chunks)} 个块")
-    except Exception as e:
-        print(f"分割法律条文文档时出错: {e}")
-        return {}
+    Returns:
+        索引结果统计
+    """
+    print("=" * 50)
+    print("重新加载法律条文数据库")
+    print("=" * 50)
     
-    # 4. 索引到向量数据库
-    print("\n4. 索引法律条文到向量数据库...")
-    try:
-        result = index_law_documents(law_chunks, show_progress=True)
-        print("\n法律条文索引完成！")
-        
-        # 显示结果统计
-        print("\n=== 法律条文索引结果统计 ===")
-        for key, value in result.items():
-            print(f"  {key}: {value}")
-        
-        return result
-    except Exception as e:
-        print(f"索引法律条文时出错: {e}")
-        return {}
+    results = _reload_collections([config.LAW_DOCUMENTS_COLLECTION], clear_existing)
+    return results.get(config.LAW_DOCUMENTS_COLLECTION, {})
 
 def reload_case_database_only(clear_existing: bool = True) -> Dict:
     """
@@ -161,48 +278,8 @@ def reload_case_database_only(clear_existing: bool = True) -> Dict:
     print("重新加载案例数据库")
     print("=" * 50)
     
-    # 1. 清除现有案例数据库
-    if clear_existing:
-        print("\n1. 清除现有案例向量数据库...")
-        clear_case_vectorstore()
-    
-    # 2. 加载案例文档
-    print("\n2. 加载案例文档...")
-    print(f"私有案例路径: {config.PRIVATE_CASE_DOCS_PATH}")
-    print(f"共有案例路径: {config.PUBLIC_CASE_DOCS_PATH}")
-    
-    try:
-        case_docs = load_case_documents_only()
-        print(f"成功加载案例文档: {len(case_docs)} 个")
-    except Exception as e:
-        print(f"加载案例文档时出错: {e}")
-        return {}
-    
-    # 3. 分割文档
-    print("\n3. 分割案例文档...")
-    try:
-        case_splitter = MdSplitter(chunk_size=config.CASE_CHUNK_SIZE, chunk_overlap=config.CASE_CHUNK_OVERLAP)
-        case_chunks = case_splitter.split_documents(case_docs)
-        print(f"案例文档分割后: {len(case_chunks)} 个块")
-    except Exception as e:
-        print(f"分割案例文档时出错: {e}")
-        return {}
-    
-    # 4. 索引到向量数据库
-    print("\n4. 索引案例到向量数据库...")
-    try:
-        result = index_case_documents(case_chunks, show_progress=True)
-        print("\n案例索引完成！")
-        
-        # 显示结果统计
-        print("\n=== 案例索引结果统计 ===")
-        for key, value in result.items():
-            print(f"  {key}: {value}")
-        
-        return result
-    except Exception as e:
-        print(f"索引案例时出错: {e}")
-        return {}
+    results = _reload_collections([config.CASE_DOCUMENTS_COLLECTION], clear_existing)
+    return results.get(config.CASE_DOCUMENTS_COLLECTION, {})
 
 def check_file_paths() -> bool:
     """
@@ -252,11 +329,12 @@ def main():
     print("1. 重新加载所有数据库（法律条文 + 案例）")
     print("2. 仅重新加载法律条文数据库")
     print("3. 仅重新加载案例数据库")
-    print("4. 退出")
+    print("4. 增量同步（仅处理新增、变更和删除的文件）")
+    print("5. 退出")
     
     while True:
         try:
-            choice = input("\n请输入选择 (1-4): ").strip()
+            choice = input("\n请输入选择 (1-5): ").strip()
             
             if choice == "1":
                 reload_all_databases()
@@ -268,10 +346,13 @@ def main():
                 reload_case_database_only()
                 break
             elif choice == "4":
+                sync_databases()
+                break
+            elif choice == "5":
                 print("退出程序")
                 break
             else:
-                print("无效选择，请输入1-4")
+                print("无效选择，请输入1-5")
         except KeyboardInterrupt:
             print("\n\n程序被用户中断")
             break
@@ -37,4 +37,19 @@ class IdealCaseStructure(BaseModel):
     裁判要旨: str = Field(..., description="从案件中提炼出的、具有指导意义的核心观点或原则的总结段落。")
     法律条文: List[str] = Field(..., description="案件中明确引用或适用的法律条文列表，格式为 '《法律名称》第XX条'")
     法院: Optional[str] = Field(None, description="审理该案件的法院名称，例如：'江苏省昆山市人民法院'。如果原文没有，则为null")
-    判决日期: Optional[str] = Field(None, description="法院做出判决或裁定的日期，例如：'2022年2月23日'。如果原文没有，则为null")
\ No newline at end of file
+    判决日期: Optional[str] = Field(None, description="法院做出判决或裁定的日期，例如：'2022年2月23日'。如果原文没有，则为null")
+
+class PartialCaseStructure(BaseModel):
+    """
+    长文书分段结构化时单个片段的抽取结果，所有字段均可缺失，由合并步骤汇总为 IdealCaseStructure。
+    """
+    标题: Optional[str] = Field(None, description="片段中出现的案件标题，没有则为null")
+    关键词: List[str] = Field(default_factory=list, description="片段体现的案件关键词列表")
+    案例类型: Optional[str] = Field(None, description="案件分类，无法从片段判断则为null")
+    案例编号: Optional[str] = Field(None, description="片段中出现的官方案件编号，没有则为null")
+    基本案情: Optional[str] = Field(None, description="片段中与案件事实经过相关内容的归纳，没有则为null")
+    裁判理由: Optional[str] = Field(None, description="片段中法院说理部分的归纳，没有则为null")
+    裁判要旨: Optional[str] = Field(None, description="片段中可提炼的裁判要旨，没有则为null")
+    法律条文: List[str] = Field(default_factory=list, description="片段中引用的法律条文列表，格式为 '《法律名称》第XX条'")
+    法院: Optional[str] = Field(None, description="片段中出现的法院名称，没有则为null")
+    判决日期: Optional[str] = Field(None, description="片段中出现的判决或裁定日期，没有则为null")
@@ -2,7 +2,11 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.text_splitter import MarkdownHeaderTextSplitter
 from langchain.docstore.document import Document
-from typing import Any, Iterable, List
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import re
+
+from config import config
 
 
 class MdSplitter(RecursiveCharacterTextSplitter):
@@ -33,3 +37,121 @@ class MdSplitter(RecursiveCharacterTextSplitter):
                     md_doc.metadata | doc.metadata | {"book": md_doc.metadata.get("header1")})
 
         return self.create_documents(texts, metadatas=metadatas)
+
+
+
+# 一次匹配 Markdown 标题行或条文起始（"第X条 "），单次扫描全文
+STATUTE_PATTERN = re.compile(
+    r'^(?:(?P<hashes>#{1,4})[ \t]+(?P<header>[^\n]*)'
+    r'|(?P<article>第(?P<number>[零〇一二三四五六七八九十百千万\d]+)条(?:之[一二三四五六七八九十]+)?)[ \t\u3000])',
+    re.MULTILINE
+)
+CHAPTER_PATTERN = re.compile(r'^第\S+章')
+SECTION_PATTERN = re.compile(r'^第\S+节')
+SENTENCE_END_PATTERN = re.compile(r'(?<=[。；;\n])')
+
+
+class StatuteSplitter:
+    """
+    法律条文专用切分器：以"条"为自然单元切分，超长条文再按句子切分
+
+    元数据中记录 article（如"第十条"）、article_number（如"十"）、chapter、section，
+    同时保留 header1-4 与 book 以兼容 MdSplitter 的元数据。
+    """
+
+    def __init__(self, max_chunk_size: int = None) -> None:
+        self.max_chunk_size = max_chunk_size or config.STATUTE_MAX_ARTICLE_CHARS
+
+    def _iter_units(self, text: str) -> Iterator[tuple]:
+        """单次扫描产出 (文本片段, 结构化元数据)"""
+        headers: Dict[str, str] = {}
+        chapter: Optional[str] = None
+        section: Optional[str] = None
+        unit_start = 0
+        unit_meta: Dict[str, str] = {}
+
+        for match in STATUTE_PATTERN.finditer(text):
+            if match.start() > unit_start:
+                yield text[unit_start:match.start()], unit_meta
+
+            if match.group("hashes"):
+                level = len(match.group("hashes"))
+                header = match.group("header").strip()
+                for deeper in range(level, 5):
+                    headers.pop(f"header{deeper}", None)
+                headers[f"header{level}"] = header
+                if CHAPTER_PATTERN.match(header):
+                    chapter, section = header, None
+                elif SECTION_PATTERN.match(header):
+                    section = header
+                elif level == 1:
+                    chapter, section = None, None
+                unit_start = match.end()
+                unit_meta = self._build_unit_meta(headers, chapter, section)
+            else:
+                unit_start = match.start()
+                unit_meta = self._build_unit_meta(headers, chapter, section)
+                unit_meta["article"] = match.group("article")
+                unit_meta["article_number"] = match.group("number")
+
+        if unit_start < len(text):
+            yield text[unit_start:], unit_meta
+
+    @staticmethod
+    def _build_unit_meta(headers: Dict[str, str], chapter: Optional[str], section: Optional[str]) -> Dict[str, str]:
+        meta = dict(headers)
+        if "header1" in headers:
+            meta["book"] = headers["header1"]
+        if chapter:
+            meta["chapter"] = chapter
+        if section:
+            meta["section"] = section
+        return meta
+
+    def _split_long_text(self, text: str) -> List[str]:
+        """按句子边界把超长条文切成不超过 max_chunk_size 的片段"""
+        if len(text) <= self.max_chunk_size:
+            return [text]
+
+        pieces, current = [], ""
+        for sentence in SENTENCE_END_PATTERN.split(text):
+            if current and len(current) + len(sentence) > self.max_chunk_size:
+                pieces.append(current)
+                current = ""
+            while len(sentence) > self.max_chunk_size:
+                pieces.append(sentence[:self.max_chunk_size])
+                sentence = sentence[self.max_chunk_size:]
+            current += sentence
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """Split documents."""
+        chunks = []
+        for doc in documents:
+            chunk_seq_id = 0
+            for unit_text, unit_meta in self._iter_units(doc.page_content):
+                for piece in self._split_long_text(unit_text.strip()):
+                    piece = piece.strip()
+                    if not piece:
+                        continue
+                    metadata = {**doc.metadata, **unit_meta, "chunk_seq_id": chunk_seq_id}
+                    chunks.append(Document(page_content=piece, metadata=metadata))
+                    chunk_seq_id += 1
+        return chunks
+
+
+def get_law_splitter():
+    """按配置返回法律条文分割器"""
+    if config.LAW_SPLITTER == "statute":
+        return StatuteSplitter(max_chunk_size=config.STATUTE_MAX_ARTICLE_CHARS)
+    return MdSplitter(chunk_size=config.LAW_BOOK_CHUNK_SIZE, chunk_overlap=config.LAW_BOOK_CHUNK_OVERLAP)
+
+
+@lru_cache(maxsize=None)
+def get_splitter_for_collection(collection_name: str):
+    """根据集合返回对应的文档分割器（每个进程内只创建一次）"""
+    if collection_name == config.LAW_DOCUMENTS_COLLECTION:
+        return get_law_splitter()
+    return MdSplitter(chunk_size=config.CASE_CHUNK_SIZE, chunk_overlap=config.CASE_CHUNK_OVERLAP)
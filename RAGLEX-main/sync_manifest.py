@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步清单模块：记录已入库文件的 mtime、大小、内容哈希和 file_id
+用于增量同步时识别新增、变更和删除的文件，并保证 file_id 跨多次同步保持稳定
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import config
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# 文档类型 -> 向量集合
+COLLECTION_BY_DOC_TYPE = {
+    config.DOC_TYPE_LAW: config.LAW_DOCUMENTS_COLLECTION,
+    config.DOC_TYPE_PRIVATE_CASE: config.CASE_DOCUMENTS_COLLECTION,
+    config.DOC_TYPE_PUBLIC_CASE: config.CASE_DOCUMENTS_COLLECTION,
+    "case": config.CASE_DOCUMENTS_COLLECTION,
+}
+
+# file_id 分配起点，与 SeparatedLawLoader / CaseLoader 保持一致
+FILE_ID_START = {
+    config.LAW_DOCUMENTS_COLLECTION: 1,
+    config.CASE_DOCUMENTS_COLLECTION: 1000,
+}
+
+
+def compute_file_hash(file_path: str) -> str:
+    """分块计算文件 sha256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _scan_directory(path: str, doc_type: str, exclude_case_dirs: bool = False) -> Dict[str, str]:
+    if not os.path.exists(path):
+        return {}
+
+    files = {}
+    for file_path in sorted(Path(path).glob("**/*.md")):
+        # source 与 DirectoryLoader 生成的路径格式一致
+        source = str(file_path)
+        if not file_path.is_file():
+            continue
+        if exclude_case_dirs and "案例" in source:
+            continue
+        files[source] = doc_type
+    return files
+
+
+def scan_source_files(scope: str = "all") -> Dict[str, str]:
+    """
+    扫描法律条文和案例目录
+
+    Args:
+        scope: "all"、"law" 或 "case"
+
+    Returns:
+        {source: doc_type}
+    """
+    files = {}
+    if scope in ("all", "law"):
+        files.update(_scan_directory(config.LAW_BOOK_PATH, config.DOC_TYPE_LAW, exclude_case_dirs=True))
+    if scope in ("all", "case"):
+        case_files = {}
+        case_files.update(_scan_directory(config.PRIVATE_CASE_DOCS_PATH, config.DOC_TYPE_PRIVATE_CASE))
+        case_files.update(_scan_directory(config.PUBLIC_CASE_DOCS_PATH, config.DOC_TYPE_PUBLIC_CASE))
+        # 新路径都不存在时兼容旧路径
+        if not case_files:
+            case_files.update(_scan_directory(config.CASE_DOCS_PATH, "case"))
+        files.update(case_files)
+    return files
+
+
+class SyncManifest:
+    """
+    同步清单：持久化为 JSON 文件，记录每个 source 的 file_id 与文件指纹
+    """
+
+    def __init__(self, manifest_path: str = None):
+        self.manifest_path = manifest_path or config.SYNC_MANIFEST_PATH
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.next_file_ids: Dict[str, int] = dict(FILE_ID_START)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.next_file_ids.update(data.get("next_file_ids", {}))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING] 同步清单读取失败，将按首次同步处理: {e}")
+
+    def save(self):
+        """原子写入清单文件"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"files": self.files, "next_file_ids": self.next_file_ids}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def allocate_file_id(self, collection_name: str) -> int:
+        """为新文件分配 file_id，已分配的 id 不会复用"""
+        file_id = self.next_file_ids.get(collection_name, FILE_ID_START.get(collection_name, 1))
+        self.next_file_ids[collection_name] = file_id + 1
+        return file_id
+
+    def get_file_id(self, source: str) -> Optional[int]:
+        entry = self.files.get(source)
+        return entry["file_id"] if entry else None
+
+    def record(self, source: str, doc_type: str, file_id: int, content_hash: str = None):
+        """记录文件的当前指纹"""
+        stat = os.stat(source)
+        self.files[source] = {
+            "file_id": file_id,
+            "doc_type": doc_type,
+            "collection": COLLECTION_BY_DOC_TYPE[doc_type],
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": content_hash or compute_file_hash(source),
+        }
+        start = self.next_file_ids.get(self.files[source]["collection"], 1)
+        if file_id >= start:
+            self.next_file_ids[self.files[source]["collection"]] = file_id + 1
+
+    def remove(self, source: str):
+        self.files.pop(source, None)
+
+    def detect_changes(self, scanned: Dict[str, str], collections: List[str]) -> Dict[str, List]:
+        """
+        对比扫描结果与清单
+
+        mtime 和大小均未变化的文件直接视为未变化，只有指纹变化时才计算内容哈希
+
+        Args:
+            scanned: scan_source_files 的结果
+            collections: 本次同步涉及的集合，只在这些集合内判断删除
+
+        Returns:
+            {"added": [...], "changed": [...], "removed": [...], "unchanged": [...]}，
+            added/changed 元素为 {"source", "doc_type", "sha256"}
+        """
+        changes = {"added": [], "changed": [], "removed": [], "unchanged": []}
+
+        for source, doc_type in scanned.items():
+            entry = self.files.get(source)
+            if entry is None or entry.get("doc_type") != doc_type:
+                changes["added" if entry is None else "changed"].append(
+                    {"source": source, "doc_type": doc_type, "sha256": None}
+                )
+                continue
+
+            stat = os.stat(source)
+            if stat.st_mtime == entry.get("mtime") and stat.st_size == entry.get("size"):
+                changes["unchanged"].append(source)
+                continue
+
+            content_hash = compute_file_hash(source)
+            if content_hash == entry.get("sha256"):
+                # 仅修改时间变化，刷新指纹即可
+                entry["mtime"] = stat.st_mtime
+                entry["size"] = stat.st_size
+                changes["unchanged"].append(source)
+            else:
+                changes["changed"].append({"source": source, "doc_type": doc_type, "sha256": content_hash})
+
+        for source, entry in self.files.items():
+            if entry.get("collection") in collections and source not in scanned:
+                changes["removed"].append(source)
+
+        return changes
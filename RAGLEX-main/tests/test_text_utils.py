@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+上下文打包、引用来源与法条编号解析的单元测试
+只依赖纯函数模块，不需要加载模型或向量库：python -m pytest tests
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from article_index import chinese_to_int, normalize_article_number  # noqa: E402
+from citation import build_source_summary  # noqa: E402
+from config import config  # noqa: E402
+from context_packer import (  # noqa: E402
+    _is_near_duplicate, _shingles, count_tokens, pack_context_docs
+)
+
+
+def make_doc(content: str, **metadata):
+    return SimpleNamespace(page_content=content, metadata=metadata)
+
+
+def make_text(seed: int, length: int) -> str:
+    """生成互不相似的中文文本"""
+    return "".join(chr(0x4e00 + (seed * 131 + i * 7) % 5000) for i in range(length))
+
+
+# ==================== 法条编号 ====================
+
+def test_chinese_to_int():
+    assert chinese_to_int("1079") == 1079
+    assert chinese_to_int("一千零七十九") == 1079
+    assert chinese_to_int("十") == 10
+    assert chinese_to_int("十八") == 18
+    assert chinese_to_int("两百") == 200
+    assert chinese_to_int("一万零一") == 10001
+    assert chinese_to_int("十二万三千") == 123000
+
+
+def test_chinese_to_int_invalid():
+    # 单独的 "万" 没有数值
+    assert chinese_to_int("万") is None
+    assert chinese_to_int("零") is None
+    assert chinese_to_int("条") is None
+
+
+def test_normalize_article_number():
+    assert normalize_article_number("第一千零七十九条") == "1079"
+    assert normalize_article_number("第1079条") == "1079"
+    assert normalize_article_number(" 1079 ") == "1079"
+    assert normalize_article_number("一千零七十九") == "1079"
+
+
+def test_normalize_article_number_suffix():
+    assert normalize_article_number("第十八条之一") == "18-1"
+    assert normalize_article_number("第18条之2") == "18-2"
+    assert normalize_article_number("第十八条") != normalize_article_number("第十八条之一")
+
+
+def test_normalize_article_number_invalid():
+    assert normalize_article_number("第万条") is None
+    assert normalize_article_number("第十八章") is None
+    assert normalize_article_number("") is None
+
+
+# ==================== 上下文打包 ====================
+
+def test_is_near_duplicate():
+    text = make_text(1, 200)
+    kept = [_shingles(text)]
+    # 末尾改动一个字，相似度仍高于阈值
+    assert _is_near_duplicate(_shingles(text[:-1] + "甲"), kept)
+    assert not _is_near_duplicate(_shingles(make_text(2, 200)), kept)
+    # 长度相差过大时直接判定不重复
+    assert not _is_near_duplicate(_shingles(text[:100]), kept)
+    assert not _is_near_duplicate(_shingles(text), [])
+
+
+def test_pack_context_docs_dedup():
+    text = make_text(1, 200)
+    docs = [
+        make_doc(text, doc_type="law", rerank_score=0.5),
+        make_doc(" " + text + "\n", doc_type="law", rerank_score=0.9),
+        make_doc(text[:-1] + "甲", doc_type="law", rerank_score=0.1),
+        make_doc(make_text(2, 200), doc_type="law", rerank_score=0.3),
+    ]
+    packed, context, stats = pack_context_docs(docs, token_budget=100000)
+
+    # 完全重复与近似重复都只保留得分最高的一份
+    assert packed == [docs[1], docs[3]]
+    assert stats["duplicates_removed"] == 2
+    assert stats["packed_docs"] == 2
+    assert context.count(text) == 1
+
+
+def test_pack_context_docs_orders_by_score():
+    docs = [make_doc(make_text(i, 200), doc_type="law", rerank_score=score)
+            for i, score in enumerate([0.1, 0.9, 0.5])]
+    packed, _, _ = pack_context_docs(docs, token_budget=100000)
+    assert packed == [docs[1], docs[2], docs[0]]
+
+
+def test_pack_context_docs_truncates_at_budget():
+    first, second = make_text(1, 2000), make_text(2, 2000)
+    budget = count_tokens(first) + config.CONTEXT_MIN_CHUNK_TOKENS * 2
+    docs = [make_doc(first, doc_type="law", rerank_score=0.9),
+            make_doc(second, doc_type="law", rerank_score=0.5)]
+    packed, context, stats = pack_context_docs(docs, token_budget=budget)
+
+    # 第二篇按剩余预算截断放入，原始文档保持不变
+    assert packed == docs
+    assert first in context
+    assert second not in context
+    assert second[:50] in context
+    assert docs[1].page_content == second
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_pack_context_docs_skips_small_remainder():
+    first, second = make_text(1, 2000), make_text(2, 2000)
+    budget = count_tokens(first) + config.CONTEXT_MIN_CHUNK_TOKENS // 2
+    docs = [make_doc(first, doc_type="law", rerank_score=0.9),
+            make_doc(second, doc_type="law", rerank_score=0.5)]
+    packed, context, _ = pack_context_docs(docs, token_budget=budget)
+
+    # 剩余预算不足 CONTEXT_MIN_CHUNK_TOKENS 时不再截断放入
+    assert packed == docs[:1]
+    assert context == first
+
+
+def test_pack_context_docs_web_content():
+    web_content = make_text(3, 100)
+    packed, context, stats = pack_context_docs([], web_content=web_content, token_budget=100000)
+    assert packed == []
+    assert context.endswith("网络搜索结果:\n" + web_content)
+    assert stats["input_docs"] == 0
+
+
+# ==================== 引用来源 ====================
+
+def test_build_source_summary_empty():
+    assert build_source_summary([]) == ""
+    assert build_source_summary(None) == ""
+
+
+def test_build_source_summary_law_dedup():
+    docs = [
+        make_doc("第一千零七十九条 夫妻一方要求离婚的，可以由有关组织进行调解。", doc_type="law", book="民法典"),
+        make_doc("第一千零七十九条 夫妻一方要求离婚的，可以由有关组织进行调解。", doc_type="law", book="民法典"),
+        make_doc("第十八条之一 成年人为完全民事行为能力人。", doc_type="law", book="《民法典》"),
+    ]
+    summary = build_source_summary(docs)
+
+    lines = summary.splitlines()
+    assert lines[0] == "---"
+    assert lines[1] == "**法律条文依据：**"
+    assert lines[2] == "- 《民法典》第一千零七十九条规定：夫妻一方要求离婚的，可以由有关组织进行调解。"
+    assert lines[3] == "- 《民法典》第十八条之一规定：成年人为完全民事行为能力人。"
+    assert len(lines) == 4
+
+
+def test_build_source_summary_case():
+    content = (
+        "## 法院\n北京市第一中级人民法院\n\n"
+        "## 判决日期\n未提供\n\n"
+        "## 裁判要旨\n借款合同有效。利息约定过高部分不予支持。"
+    )
+    docs = [
+        make_doc("第五条 诚实信用。", doc_type="law", book="民法典"),
+        make_doc(content, doc_type="public_case", title="张三诉李四借款合同纠纷案", file_id="c1"),
+        make_doc(content, doc_type="public_case", title="张三诉李四借款合同纠纷案", file_id="c1"),
+    ]
+    summary = build_source_summary(docs)
+
+    assert "**案例依据：**" in summary
+    assert summary.count("张三诉李四借款合同纠纷案") == 1
+    assert "  - 《张三诉李四借款合同纠纷案》（北京市第一中级人民法院）：借款合同有效。" in summary
+    assert "未提供" not in summary
+
+
+def test_build_source_summary_truncates_long_article():
+    content = "第一条 " + "甲" * (config.SOURCE_SUMMARY_LAW_MAX_CHARS + 50)
+    summary = build_source_summary([make_doc(content, doc_type="law", book="某法")])
+    assert summary.endswith("甲" * config.SOURCE_SUMMARY_LAW_MAX_CHARS + "…")
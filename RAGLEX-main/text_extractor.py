@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文本抽取模块：按页/段落流式读取上传文件
+文件在常驻的抽取子进程中解析（并发数受限），带单文件超时，并按文件内容哈希缓存结果
+"""
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_extract_slots: Optional[threading.BoundedSemaphore] = None
+_extract_slots_lock = threading.Lock()
+# 常驻的单进程抽取执行器，按并发名额复用，避免每个文件重复启动解释器与导入解析库
+_idle_executors: List[ProcessPoolExecutor] = []
+_idle_executors_lock = threading.Lock()
+
+
+def compute_file_hash(file_path: str) -> str:
+    """分块计算文件 sha256，避免整文件读入内存"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """逐页产出 PDF 文本"""
+    import pypdf
+
+    with open(file_path, 'rb') as file:
+        reader = pypdf.PdfReader(file)
+        for page in reader.pages:
+            yield page.extract_text() or ""
+
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+    """逐段产出 DOCX 文本"""
+    import docx
+
+    document = docx.Document(file_path)
+    for paragraph in document.paragraphs:
+        yield paragraph.text
+
+
+def iter_text_blocks(file_path: str) -> Iterator[str]:
+    """
+    按文件类型逐块产出文本
+
+    Args:
+        file_path: 本地文件路径
+
+    Returns:
+        文本块生成器，PDF 为页，DOCX 为段落，TXT/MD 为整篇
+    """
+    file_ext = os.path.splitext(file_path)[1].lower()
+
+    if file_ext == '.pdf':
+        yield from iter_pdf_pages(file_path)
+    elif file_ext == '.docx':
+        yield from iter_docx_paragraphs(file_path)
+    elif file_ext in ['.txt', '.md']:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            yield file.read()
+    else:
+        raise ValueError(f"不支持的文件格式: {file_ext}")
+
+
+def extract_text_from_path(file_path: str) -> str:
+    """在当前进程内抽取全文（进程池工作函数），一次性 join 避免逐页字符串拼接"""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext in ['.txt', '.md']:
+        return "".join(iter_text_blocks(file_path))
+    return "".join(f"{block}\n" for block in iter_text_blocks(file_path))
+
+
+class ExtractTimeoutError(Exception):
+    """单个文件抽取超时"""
+
+
+def _get_extract_slots() -> threading.BoundedSemaphore:
+    global _extract_slots
+    with _extract_slots_lock:
+        if _extract_slots is None:
+            _extract_slots = threading.BoundedSemaphore(max(1, config.EXTRACT_WORKERS))
+        return _extract_slots
+
+
+def _checkout_executor() -> ProcessPoolExecutor:
+    """取出一个空闲的抽取进程，空闲列表为空时才新建（调用方已持有并发名额）"""
+    with _idle_executors_lock:
+        if _idle_executors:
+            return _idle_executors.pop()
+    # 单进程执行器，超时时可以只终止该文件所在的进程
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _release_executor(executor: ProcessPoolExecutor):
+    with _idle_executors_lock:
+        _idle_executors.append(executor)
+
+
+def _terminate_executor(executor: ProcessPoolExecutor):
+    """终止执行器的工作进程并丢弃该执行器"""
+    for process in list((getattr(executor, '_processes', None) or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_extract_process(file_path: str, timeout: float) -> str:
+    """
+    在常驻抽取进程中抽取文件，并发数受 EXTRACT_WORKERS 限制
+    超时只终止该文件所在的进程，不影响其他正在抽取的文件
+    """
+    with _get_extract_slots():
+        executor = _checkout_executor()
+        try:
+            text = executor.submit(extract_text_from_path, file_path).result(timeout=timeout)
+        except FutureTimeoutError:
+            _terminate_executor(executor)
+            raise ExtractTimeoutError(file_path)
+        except BrokenProcessPool:
+            _terminate_executor(executor)
+            raise RuntimeError("文本抽取进程异常退出")
+        except BaseException:
+            # 抽取函数自身抛出的异常不影响进程复用
+            _release_executor(executor)
+            raise
+        _release_executor(executor)
+        return text
+
+
+def _get_cache_path(content_hash: str) -> str:
+    os.makedirs(config.EXTRACT_CACHE_DIR, exist_ok=True)
+    return os.path.join(config.EXTRACT_CACHE_DIR, f"{content_hash}.txt")
+
+
+def _load_cached_text(content_hash: str) -> Optional[str]:
+    cache_path = _get_cache_path(content_hash)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def _store_cached_text(content_hash: str, text: str):
+    cache_path = _get_cache_path(content_hash)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"文本抽取缓存写入失败: {str(e)}")
+
+
+async def extract_text_async(file_path: str, timeout: Optional[float] = None) -> str:
+    """
+    异步抽取文件文本：命中内容哈希缓存时直接返回，否则在抽取子进程中执行
+
+    Args:
+        file_path: 本地文件路径
+        timeout: 单文件抽取超时（秒），默认使用 config.EXTRACT_TIMEOUT
+
+    Returns:
+        抽取的文本，失败或超时返回空字符串
+    """
+    loop = asyncio.get_running_loop()
+    timeout = timeout or config.EXTRACT_TIMEOUT
+
+    try:
+        content_hash = await loop.run_in_executor(None, compute_file_hash, file_path)
+        cached_text = _load_cached_text(content_hash)
+        if cached_text is not None:
+            print(f"[DEBUG] 文本抽取命中缓存: {content_hash[:12]}")
+            return cached_text
+
+        text = await loop.run_in_executor(None, _run_extract_process, file_path, timeout)
+        _store_cached_text(content_hash, text)
+        return text
+    except ExtractTimeoutError:
+        logger.error(f"文本提取超时（{timeout}秒）: {file_path}")
+        return ""
+    except ImportError as e:
+        logger.error(f"文档解析库未安装: {str(e)}")
+        return ""
+    except ValueError as e:
+        logger.warning(str(e))
+        return ""
+    except Exception as e:
+        logger.error(f"文本提取失败: {str(e)}")
+        return ""
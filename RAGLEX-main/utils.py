@@ -32,6 +32,11 @@ os.environ["DEEPSEEK_API_BASE"] = "https://api.deepseek.com/v1"
 
 # 导入权限管理器
 import permission_manager
+from citation import CASE_CITATION_FIELDS, extract_case_citation_metadata, fill_case_citation_metadata
+from article_index import update_article_index, remove_article_sources, clear_article_index
+from case_sections import (
+    apply_case_sections, store_case_sections, delete_case_sections, clear_case_sections
+)
 def get_model(callbacks: Callbacks = None):
     return get_model_openai(callbacks=callbacks)
 
@@ -213,6 +218,7 @@ def index_law_documents(docs: List[Document], show_progress: bool = True) -> Dic
 
     record_manager = get_record_manager("law_documents")
     vectorstore = get_law_vectorstore()
+    update_article_index(docs)
 
     pbar = None
     if show_progress:
@@ -253,6 +259,8 @@ def index_case_documents(docs: List[Document], show_progress: bool = True) -> Di
 
     record_manager = get_record_manager("case_documents")
     vectorstore = get_case_vectorstore()
+    fill_case_citation_metadata(docs)
+    store_case_sections(docs)
 
     pbar = None
     if show_progress:
@@ -305,6 +313,7 @@ def clear_law_vectorstore() -> None:
     record_manager = get_record_manager("law_documents")
     vectorstore = get_law_vectorstore()
     index([], record_manager, vectorstore, cleanup="full", source_id_key="source")
+    clear_article_index()
     print("法律条文向量数据库已清除")
 
 def clear_case_vectorstore() -> None:
@@ -312,6 +321,7 @@ def clear_case_vectorstore() -> None:
     record_manager = get_record_manager("case_documents")
     vectorstore = get_case_vectorstore()
     index([], record_manager, vectorstore, cleanup="full", source_id_key="source")
+    clear_case_sections()
     print("案例向量数据库已清除")
 
 def clear_all_separated_vectorstores() -> None:
@@ -321,6 +331,90 @@ def clear_all_separated_vectorstores() -> None:
     print("所有分离的向量数据库已清除")
 
 
+# ==================== 增量同步索引函数 ====================
+
+def index_documents_incremental(docs: List[Document], collection_name: str, show_progress: bool = True) -> Dict:
+    """
+    增量索引文档：按 source 分组调用 index(cleanup="incremental")，
+    内容未变化的块不会重复嵌入，同一 source 下已不存在的旧块会被清理
+
+    Args:
+        docs: 已切分的文档块列表
+        collection_name: 集合名称（同时作为记录管理器命名空间）
+        show_progress: 是否显示进度条
+
+    Returns:
+        索引结果统计
+    """
+    info = defaultdict(int)
+
+    record_manager = get_record_manager(collection_name)
+    record_manager.create_schema()
+    vectorstore = get_vectorstore(collection_name)
+
+    if collection_name == config.CASE_DOCUMENTS_COLLECTION:
+        fill_case_citation_metadata(docs)
+        store_case_sections(docs)
+    elif collection_name == config.LAW_DOCUMENTS_COLLECTION:
+        update_article_index(docs)
+
+    docs_by_source = defaultdict(list)
+    for doc in docs:
+        docs_by_source[doc.metadata.get("source", "")].append(doc)
+
+    pbar = None
+    if show_progress:
+        from tqdm import tqdm
+        pbar = tqdm(total=len(docs_by_source), desc=f"增量索引 {collection_name}")
+
+    # 同一文件的块必须在同一次 index 调用中写入，否则后一批次的清理会删掉前一批次刚写入的块
+    for source_docs in docs_by_source.values():
+        result = index(
+            source_docs,
+            record_manager,
+            vectorstore,
+            cleanup="incremental",
+            source_id_key="source",
+        )
+        for k, v in result.items():
+            info[k] += v
+
+        if pbar:
+            pbar.update(1)
+
+    if pbar:
+        pbar.close()
+
+    return dict(info)
+
+
+def delete_documents_by_source(sources: List[str], collection_name: str) -> int:
+    """
+    删除指定 source 文件对应的全部向量及索引记录
+
+    Args:
+        sources: 文件路径列表（与文档 metadata 中的 source 一致）
+        collection_name: 集合名称
+
+    Returns:
+        删除的向量数量
+    """
+    if not sources:
+        return 0
+
+    record_manager = get_record_manager(collection_name)
+    record_manager.create_schema()
+    vectorstore = get_vectorstore(collection_name)
+
+    keys = record_manager.list_keys(group_ids=list(sources))
+    if keys:
+        vectorstore.delete(keys)
+        record_manager.delete_keys(keys)
+    if collection_name == config.LAW_DOCUMENTS_COLLECTION:
+        remove_article_sources(sources)
+    return len(keys)
+
+
 def get_model_openai(
         model: str = "gpt-4o-mini",
         streaming: bool = True,
@@ -515,6 +609,13 @@ def rerank_existing_documents(question: str, docs: List[Document], top_k: int =
     reranker = FlagReranker(str(config.RERANKER_PATH))
     try:
         scores = reranker.compute_score(sentence_pairs)
+        # 只有一个句子对时 compute_score 返回单个分数
+        if not isinstance(scores, list):
+            scores = [scores]
+        
+        # 记录得分，供上下文打包按得分排序
+        for score, doc in zip(scores, docs):
+            doc.metadata["rerank_score"] = float(score)
         
         # 根据分数排序并返回前top_k个文档
         sorted_docs = [doc for _, doc in sorted(zip(scores, docs), key=lambda x: x[0], reverse=True)[:top_k]]
@@ -524,9 +625,67 @@ def rerank_existing_documents(question: str, docs: List[Document], top_k: int =
         del reranker
         clear_gpu_memory()
 
+def _embed_queries(queries: List[str]) -> List[List[float]]:
+    """一次批量计算全部查询向量；BGE 查询需要加检索指令前缀，与 similarity_search 使用的 embed_query 保持一致"""
+    embedder = get_embeder()
+    instruction = getattr(embedder, "query_instruction", "") or ""
+    return embedder.embed_documents([instruction + query for query in queries])
+
+
+def query_similarity(first: str, second: str) -> float:
+    """两条查询的向量余弦相似度（向量已归一化，直接取内积）"""
+    if not first or not second:
+        return 0.0
+    if first.strip() == second.strip():
+        return 1.0
+    first_vector, second_vector = get_embeder().embed_documents([first, second])
+    return float(sum(a * b for a, b in zip(first_vector, second_vector)))
+
+
+def multi_query_vector_search(vectorstore: Chroma, queries: List[str], k: int = 5, where: dict = None) -> List[Document]:
+    """
+    多查询向量检索：所有查询一次批量向量化，在集合上做一次多向量查询，
+    各查询的结果按倒数排名融合（RRF）并按切片ID去重
+
+    Args:
+        vectorstore: Chroma 向量库
+        queries: 查询语句列表（多查询改写结果）
+        k: 每个查询的检索数量，也是融合后返回的数量
+        where: Chroma 元数据过滤条件
+
+    Returns:
+        按融合得分降序排列的文档列表
+    """
+    # 去掉空查询与重复查询，保持原有顺序
+    unique_queries = list(dict.fromkeys(query.strip() for query in queries if query and query.strip()))
+    unique_queries = unique_queries[:config.MULTI_QUERY_MAX_QUERIES]
+    if not unique_queries:
+        return []
+
+    query_embeddings = _embed_queries(unique_queries)
+    result = vectorstore._collection.query(
+        query_embeddings=query_embeddings,
+        n_results=k,
+        where=where,
+        include=["documents", "metadatas"]
+    )
+
+    fused_scores = defaultdict(float)
+    fused_docs = {}
+    for ids, contents, metadatas in zip(result["ids"], result["documents"], result["metadatas"]):
+        for rank, (chunk_id, content, metadata) in enumerate(zip(ids, contents, metadatas)):
+            fused_scores[chunk_id] += 1.0 / (config.MULTI_QUERY_RRF_K + rank + 1)
+            if chunk_id not in fused_docs:
+                fused_docs[chunk_id] = Document(page_content=content, metadata=metadata or {})
+
+    ranked_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)[:k]
+    return [fused_docs[chunk_id] for chunk_id in ranked_ids]
+
+
 # ==================== 分离的检索函数 ====================
 
-def search_law_documents(question: str, k: int = 5, use_rerank: bool = True, rerank_top_k: int = 3) -> List[Document]:
+def search_law_documents(question: str, k: int = 5, use_rerank: bool = True, rerank_top_k: int = 3,
+                         queries: List[str] = None) -> List[Document]:
     """
     专门检索法律条文文档
     
@@ -535,12 +694,19 @@ def search_law_documents(question: str, k: int = 5, use_rerank: bool = True, rer
         k: 初始检索数量
         use_rerank: 是否使用重排序
         rerank_top_k: 重排序后返回的文档数量
+        queries: 多查询改写结果（可选），提供时用全部查询召回，融合后以question重排序
     
     Returns:
         法律条文文档列表
     """
     vectorstore = get_law_vectorstore()
     
+    if queries:
+        initial_docs = multi_query_vector_search(vectorstore, [question] + list(queries), k=k*3 if use_rerank else k)
+        if use_rerank and initial_docs:
+            return rerank_existing_documents(question, initial_docs, rerank_top_k)
+        return initial_docs
+    
     if use_rerank:
         # 先检索更多文档，然后重排序
         initial_docs = vectorstore.similarity_search(question, k=k*3)
@@ -550,43 +716,8 @@ def search_law_documents(question: str, k: int = 5, use_rerank: bool = True, rer
     else:
         return vectorstore.similarity_search(question, k=k)
 
-def extract_case_key_sections(case_content: str) -> str:
-    """
-    从案例文档中提取四个关键部分：基本案情、裁判理由、裁判要旨、法律条文
-    
-    Args:
-        case_content: 案例文档的完整内容
-    
-    Returns:
-        提取的关键部分内容
-    """
-    import re
-    
-    sections = []
-    
-    # 提取基本案情
-    basic_facts_match = re.search(r'## 基本案情\s*([\s\S]*?)(?=##|$)', case_content)
-    if basic_facts_match:
-        sections.append(f"## 基本案情\n{basic_facts_match.group(1).strip()}")
-    
-    # 提取裁判理由
-    reasoning_match = re.search(r'## 裁判理由\s*([\s\S]*?)(?=##|$)', case_content)
-    if reasoning_match:
-        sections.append(f"## 裁判理由\n{reasoning_match.group(1).strip()}")
-    
-    # 提取裁判要旨
-    key_points_match = re.search(r'## 裁判要旨\s*([\s\S]*?)(?=##|$)', case_content)
-    if key_points_match:
-        sections.append(f"## 裁判要旨\n{key_points_match.group(1).strip()}")
-    
-    # 提取法律条文
-    legal_articles_match = re.search(r'## 法律条文\s*([\s\S]*?)(?=##|$)', case_content)
-    if legal_articles_match:
-        sections.append(f"## 法律条文\n{legal_articles_match.group(1).strip()}")
-    
-    return "\n\n".join(sections) if sections else case_content
-
-def search_case_documents(question: str, k: int = 5, use_rerank: bool = True, rerank_top_k: int = 3) -> List[Document]:
+def search_case_documents(question: str, k: int = 5, use_rerank: bool = True, rerank_top_k: int = 3,
+                          queries: List[str] = None) -> List[Document]:
     """
     专门检索案例文档，并提取关键部分
     
@@ -595,34 +726,26 @@ def search_case_documents(question: str, k: int = 5, use_rerank: bool = True, re
         k: 初始检索数量
         use_rerank: 是否使用重排序
         rerank_top_k: 重排序后返回的文档数量
+        queries: 多查询改写结果（可选），提供时用全部查询召回，融合后以question重排序
     
     Returns:
         案例文档列表（内容已提取关键部分）
     """
     vectorstore = get_case_vectorstore()
     
-    if use_rerank:
-        # 先检索更多文档，然后重排序
-        initial_docs = vectorstore.similarity_search(question, k=k*3)
-        if initial_docs:
-            ranked_docs = rerank_existing_documents(question, initial_docs, rerank_top_k)
-        else:
-            ranked_docs = []
+    initial_k = k*3 if use_rerank else k
+    if queries:
+        initial_docs = multi_query_vector_search(vectorstore, [question] + list(queries), k=initial_k)
     else:
-        ranked_docs = vectorstore.similarity_search(question, k=k)
-    
-    # 对每个案例文档提取关键部分
-    processed_docs = []
-    for doc in ranked_docs:
-        # 创建新的文档对象，内容为提取的关键部分
-        from langchain.docstore.document import Document
-        processed_doc = Document(
-            page_content=extract_case_key_sections(doc.page_content),
-            metadata=doc.metadata
-        )
-        processed_docs.append(processed_doc)
+        initial_docs = vectorstore.similarity_search(question, k=initial_k)
     
-    return processed_docs
+    # 换成入库时预先提取的关键部分，重排序和生成回答都使用短文本
+    initial_docs = apply_case_sections(initial_docs)
+    
+    if use_rerank and initial_docs:
+        # 先检索更多文档，然后重排序
+        return rerank_existing_documents(question, initial_docs, rerank_top_k)
+    return initial_docs
 
 def search_law_by_keywords(keywords: List[str], k: int = 5) -> List[Document]:
     """
@@ -752,6 +875,10 @@ def update_vector_metadata(file_id: int, new_metadata: dict):
                 'title': new_metadata.get('title', current_metadata.get('title', '未知标题')),
                 'chunk_seq_id': current_metadata.get('chunk_seq_id', i)  # 保持原有的chunk序号
             }
+            # 保留入库时提取的引用字段
+            for key in CASE_CITATION_FIELDS:
+                if key in current_metadata:
+                    updated_metadata[key] = current_metadata[key]
             updated_metadatas.append(updated_metadata)
         
         # 使用正确的 Chroma API 更新元数据
@@ -872,6 +999,9 @@ def add_single_file_to_vectorstore(file_path: str, metadata: dict, vectorstore_t
             'title': title
             # chunk_seq_id 将在下面的循环中添加
         }
+        # 案例额外记录法院、判决日期、案例编号，供模板生成引用来源
+        if vectorstore_type == 'case':
+            clean_metadata.update(extract_case_citation_metadata(documents[0].page_content))
         
         # 验证必需字段
         if clean_metadata['file_id'] is None:
@@ -897,6 +1027,9 @@ def add_single_file_to_vectorstore(file_path: str, metadata: dict, vectorstore_t
         
         # 写入向量存储
         vectorstore.add_documents(chunks)
+        if vectorstore_type == 'case':
+            delete_case_sections([clean_metadata['file_id']])
+            store_case_sections(chunks)
         
         logger.info(f"[GATEKEEPER] 成功写入文件到{vectorstore_type}向量存储: {file_path}, 共 {len(chunks)} 个块")
         print(f"[GATEKEEPER] 文件 {clean_metadata['file_id']} 写入完成，共 {len(chunks)} 个块")
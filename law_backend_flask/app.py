@@ -8,6 +8,7 @@ RAGLEX 法律问答系统后端
 from flask import Flask, jsonify, current_app
 from flask_cors import CORS
 import logging
+import multiprocessing
 import os
 from config import Config
 from models import db
@@ -122,7 +123,9 @@ def register_basic_routes(app):
         return jsonify({'error': '未授权访问'}), 401
 
 # 创建应用实例（用于开发环境）
-app = create_app()
+# spawn 启动的文本抽取子进程会重新执行主模块，子进程中不创建应用（避免重复建表、初始化 MinIO）
+if multiprocessing.current_process().name == 'MainProcess':
+    app = create_app()
 
 if __name__ == '__main__':
     app.run(
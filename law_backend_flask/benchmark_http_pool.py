@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+出站 HTTP 连接复用基准测试
+对比每次 requests.post 新建连接与共享连接池 Session 两种方式下的单次请求耗时
+
+默认在本机启动一个 HTTP/1.1 keep-alive 测试服务；--url 可指定真实的模型接口地址（会发送 POST 请求）。
+
+用法: python benchmark_http_pool.py [--requests 200] [--url http://127.0.0.1:11434/v1/models]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.http_client import build_http_session
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头与响应体分两次写出，关闭 Nagle 避免与客户端延迟 ACK 叠加出 40ms 等待
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_local_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/chat/completions"
+
+
+def measure(post, url, count):
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        post(url, json={'ping': 1}, timeout=10).content
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name, timings):
+    print(
+        f"{name:<14} 平均 {statistics.mean(timings):7.3f} ms  "
+        f"中位数 {statistics.median(timings):7.3f} ms  "
+        f"P95 {sorted(timings)[int(len(timings) * 0.95) - 1]:7.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='出站 HTTP 连接复用基准测试')
+    parser.add_argument('--requests', type=int, default=200, help='每种方式的请求次数')
+    parser.add_argument('--url', help='目标地址，默认使用本机测试服务')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        server, url = start_local_server()
+
+    print(f"目标地址: {url}，每种方式 {args.requests} 次请求")
+    session = build_http_session()
+    # 预热：建立第一条连接
+    session.post(url, json={'ping': 1}, timeout=10).content
+
+    report('requests.post', measure(requests.post, url, args.requests))
+    report('pooled session', measure(session.post, url, args.requests))
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
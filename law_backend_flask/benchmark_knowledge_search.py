@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地知识库打分基准测试
+对比切片检索字段现场计算与入库预计算两种方式下，单次查询的打分耗时
+
+用法: python benchmark_knowledge_search.py --file 某文档.pdf [--copies 20] [--repeat 5] [--query 问题 ...]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.knowledge_base import (
+    _build_query_features,
+    _chunk_search_fields,
+    _score_chunk,
+    build_chunk_search_fields,
+    chunk_text,
+    normalize_text
+)
+from utils.text_extraction import extract_text_from_path
+
+DEFAULT_QUERIES = ['经济补偿金怎么算', '劳动合同解除的条件', '违约金的数额']
+
+
+def build_chunks(file_path: str, copies: int, precomputed: bool):
+    chunks = chunk_text(normalize_text(extract_text_from_path(file_path, os.path.basename(file_path))))
+    rows = []
+    for copy_index in range(copies):
+        for chunk in chunks:
+            search_text, ngram_signature = build_chunk_search_fields(chunk) if precomputed else (None, None)
+            rows.append(SimpleNamespace(
+                content=chunk,
+                filename=f'{copy_index}-{os.path.basename(file_path)}',
+                search_text=search_text,
+                ngram_signature=ngram_signature
+            ))
+    return rows
+
+
+def score_on_the_fly(question, rows):
+    """迁移前的方式：每个切片都重新计算问题特征与切片检索字段"""
+    for row in rows:
+        content_compact, content_signature = _chunk_search_fields(row)
+        _score_chunk(_build_query_features(question), content_compact, content_signature, row.filename)
+
+
+def score_precomputed(question, rows):
+    """当前方式：问题特征只计算一次，切片读取入库时的检索字段"""
+    features = _build_query_features(question)
+    for row in rows:
+        content_compact, content_signature = _chunk_search_fields(row)
+        _score_chunk(features, content_compact, content_signature, row.filename)
+
+
+def measure(score_fn, queries, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        for question in queries:
+            start = time.perf_counter()
+            score_fn(question, rows)
+            timings.append(time.perf_counter() - start)
+    return min(timings), statistics.mean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地知识库打分基准测试')
+    parser.add_argument('--file', required=True, help='用于构造切片的文档（txt/pdf/docx）')
+    parser.add_argument('--copies', type=int, default=20, help='文档切片复制份数，用于放大切片规模')
+    parser.add_argument('--repeat', type=int, default=5, help='每个查询重复次数')
+    parser.add_argument('--query', action='append', help='查询问题，可多次指定')
+    args = parser.parse_args()
+
+    queries = args.query or DEFAULT_QUERIES
+    raw_rows = build_chunks(args.file, args.copies, precomputed=False)
+    precomputed_rows = build_chunks(args.file, args.copies, precomputed=True)
+    print(f"切片数: {len(raw_rows)}，查询数: {len(queries)}")
+
+    for label, score_fn, rows in (
+        ('现场计算', score_on_the_fly, raw_rows),
+        ('预计算', score_precomputed, precomputed_rows),
+    ):
+        best, mean = measure(score_fn, queries, rows, args.repeat)
+        print(f"{label:<8} 单次查询耗时: 最优 {best * 1000:.2f} ms，平均 {mean * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
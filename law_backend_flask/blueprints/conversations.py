@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from flask import Blueprint, request, jsonify, g, current_app
+from sqlalchemy import and_, func, or_
 from models import db, Conversation, Message, User
 from datetime import datetime
 from utils.auth import login_required
@@ -13,20 +14,74 @@ conversations_bp = Blueprint('conversations', __name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def encode_conversation_cursor(conversation):
+    """分页游标：最后一条对话的 更新时间|ID"""
+    return f"{conversation.updated_at.isoformat()}|{conversation.id}"
+
+
+def decode_conversation_cursor(cursor):
+    updated_at, conversation_id = cursor.rsplit('|', 1)
+    return datetime.fromisoformat(updated_at), int(conversation_id)
+
+
 @conversations_bp.route('/', methods=['GET'])
 @login_required
 def get_conversations(current_user):
-    """获取用户的所有对话历史"""
+    """
+    获取用户的对话历史，按更新时间倒序
+
+    查询参数:
+        limit: 每页数量（可选，默认返回全部）
+        cursor: 上一页返回的 next_cursor，按 (updated_at, id) 键集分页
+    """
     try:
         # 使用认证用户的ID
         user_id = current_user.id
-        
-        # 获取用户的所有对话，按更新时间倒序
-        conversations = Conversation.query.filter_by(user_id=user_id).order_by(Conversation.updated_at.desc()).all()
+
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit <= 0:
+            return jsonify({
+                'success': False,
+                'message': 'limit 必须为正整数'
+            }), 400
+
+        # 消息数以关联子查询随对话一并查出，整页只需一次查询
+        message_count = db.session.query(func.count(Message.id)).filter(
+            Message.conversation_id == Conversation.id
+        ).correlate(Conversation).scalar_subquery()
+        query = db.session.query(Conversation, message_count).filter(
+            Conversation.user_id == user_id
+        )
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                cursor_updated_at, cursor_id = decode_conversation_cursor(cursor)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': '无效的分页游标'
+                }), 400
+            query = query.filter(or_(
+                Conversation.updated_at < cursor_updated_at,
+                and_(Conversation.updated_at == cursor_updated_at, Conversation.id < cursor_id)
+            ))
+
+        query = query.order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+        if limit is not None:
+            # 多取一条判断是否还有下一页
+            query = query.limit(limit + 1)
+        rows = query.all()
+
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
         
         return jsonify({
             'success': True,
-            'data': [conv.to_dict() for conv in conversations]
+            'data': [conv.to_dict(message_count=count) for conv, count in rows],
+            'has_more': has_more,
+            'next_cursor': encode_conversation_cursor(rows[-1][0]) if has_more else None
         })
         
     except Exception as e:
@@ -261,8 +316,11 @@ def update_conversation(current_user, conversation_id):
 @login_required
 def get_conversation_context(current_user, conversation_id):
     """
-    获取指定对话的完整上下文信息
+    获取指定对话的上下文信息
     专为远程服务器调用设计，提供对话历史和元数据
+
+    查询参数:
+        limit: 只返回最近 limit 条消息（可选，默认返回全部）；message_count 始终为对话消息总数
     """
     try:
         # 参数验证
@@ -273,6 +331,14 @@ def get_conversation_context(current_user, conversation_id):
                 'error': '无效的对话ID',
                 'conversation_id': conversation_id
             }), 400
+
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'limit 必须为正整数',
+                'conversation_id': conversation_id
+            }), 400
         
         # 获取对话信息
         conversation = Conversation.query.filter_by(
@@ -288,9 +354,13 @@ def get_conversation_context(current_user, conversation_id):
             }), 404
         
         # 获取对话消息，按时间顺序排列
-        messages = Message.query.filter_by(
-            conversation_id=conversation_id
-        ).order_by(Message.created_at.asc()).all()
+        total_count = conversation.messages.count()
+        if limit is not None:
+            messages = Message.get_recent(conversation_id, limit)
+        else:
+            messages = Message.query.filter_by(
+                conversation_id=conversation_id
+            ).order_by(Message.created_at.asc(), Message.id.asc()).all()
         
         # 构建消息列表
         message_list = []
@@ -311,11 +381,15 @@ def get_conversation_context(current_user, conversation_id):
             'title': conversation.title,
             'created_at': conversation.created_at.isoformat(),
             'updated_at': conversation.updated_at.isoformat(),
-            'message_count': len(message_list),
+            'message_count': total_count,
+            'returned_count': len(message_list),
             'messages': message_list
         }
         
-        current_app.logger.info(f"成功获取对话上下文: conversation_id={conversation_id}, message_count={len(message_list)}")
+        current_app.logger.info(
+            f"成功获取对话上下文: conversation_id={conversation_id}, "
+            f"message_count={total_count}, returned_count={len(message_list)}"
+        )
         return jsonify(context), 200
         
     except Exception as e:
@@ -4,37 +4,44 @@
 包含文件上传、下载、删除等功能
 """
 
-from flask import Blueprint, request, jsonify, send_file, current_app, Response
+from flask import Blueprint, request, jsonify, current_app, Response
 import json
 from datetime import datetime
 import os
+import time
 import uuid
 from werkzeug.utils import secure_filename
 from models import db, UserFile
 from utils.auth import login_required, sanitize_input, log_user_activity
 from utils.minio_client import upload_file, get_file_url
-from utils import download_file, delete_file_from_minio
-from utils.knowledge_base import (
-    index_user_file_to_knowledge,
-    remove_user_file_from_knowledge
+from utils import delete_file_from_minio, stream_file_response
+from utils.knowledge_base import remove_user_file_from_knowledge
+from utils.knowledge_jobs import (
+    enqueue_knowledge_jobs,
+    expire_stale_jobs,
+    get_active_job_file_ids,
+    get_batch_jobs,
+    summarize_jobs
 )
 
 documents_bp = Blueprint('documents', __name__)
 
+KNOWLEDGE_TYPE_NAMES = {'public': '公有知识库', 'private': '私有知识库'}
+JOB_PROGRESS_POLL_INTERVAL = 0.5
 
-def sync_file_to_local_knowledge(current_user, user_file, knowledge_types):
-    """将文件同步到本地知识库。"""
-    try:
-        result = index_user_file_to_knowledge(user_file, current_user, knowledge_types)
-        return True, '', result
-    except Exception as exc:
-        current_app.logger.error(
-            "本地知识库上传失败: user_id=%s file_id=%s error=%s",
-            current_user.id,
-            user_file.id,
-            str(exc)
-        )
-        return False, str(exc), None
+
+def split_knowledge_types_to_upload(user_file, knowledge_types):
+    """按文件当前上传状态拆分为 (待上传类型, 已上传的知识库名称)。"""
+    types_to_upload = []
+    already_uploaded = []
+    for knowledge_type in knowledge_types:
+        uploaded = user_file.public_knowledge_uploaded if knowledge_type == 'public' \
+            else user_file.private_knowledge_uploaded
+        if uploaded:
+            already_uploaded.append(KNOWLEDGE_TYPE_NAMES[knowledge_type])
+        elif knowledge_type not in types_to_upload:
+            types_to_upload.append(knowledge_type)
+    return types_to_upload, already_uploaded
 
 
 def remove_file_from_local_knowledge(user_file, knowledge_types):
@@ -338,26 +345,27 @@ def download_user_file(current_user, file_id):
             user_id=current_user.id
         ).first_or_404()
         
-        # 从MinIO下载文件
-        file_data = download_file(user_file.minio_path)
+        # 从MinIO流式读取文件，不在内存中缓存完整内容
+        response = stream_file_response(
+            user_file.minio_path,
+            user_file.filename,
+            as_attachment=True
+        )
         
-        if not file_data:
+        if response is None:
             return jsonify({
                 'success': False,
                 'message': '查无此文件'
             }), 500
         
-        # 记录用户活动
-        log_user_activity(current_user.id, 'download_file', {
-            'file_id': user_file.id,
-            'filename': user_file.filename
-        })
+        # 记录用户活动（续传的分段请求与 304 不重复记录）
+        if response.status_code == 200:
+            log_user_activity(current_user.id, 'download_file', {
+                'file_id': user_file.id,
+                'filename': user_file.filename
+            })
         
-        return send_file(
-            file_data,
-            as_attachment=True,
-            download_name=user_file.filename
-        )
+        return response
         
     except Exception as e:
         current_app.logger.error(f"下载文档错误: {str(e)}")
@@ -412,6 +420,9 @@ def delete_user_file(current_user, file_id):
             'knowledge_types_deleted': knowledge_types_to_delete
         })
         
+        # 清理残留的知识切片及倒排索引，避免级联删除遗留索引记录
+        remove_user_file_from_knowledge(user_file.id)
+        
         # 从数据库删除记录
         db.session.delete(user_file)
         db.session.commit()
@@ -440,31 +451,27 @@ def preview_file(current_user, filename):
             user_id=current_user.id
         ).first_or_404()
         
-        # 从MinIO获取文件
-        file_data = download_file(user_file.minio_path)
+        # 从MinIO流式读取文件，PDF 阅读器可按 Range 分段加载
+        response = stream_file_response(
+            user_file.minio_path,
+            user_file.filename,
+            as_attachment=False
+        )
         
-        if not file_data:
+        if response is None:
             return jsonify({
                 'success': False,
                 'message': '文件预览失败'
             }), 500
         
-        # 获取文件类型
-        from utils.minio_client import get_content_type
-        content_type = get_content_type(user_file.filename)
+        # 记录用户活动（分段请求与 304 不重复记录）
+        if response.status_code == 200:
+            log_user_activity(current_user.id, 'preview_file', {
+                'file_id': user_file.id,
+                'filename': user_file.filename
+            })
         
-        # 记录用户活动
-        log_user_activity(current_user.id, 'preview_file', {
-            'file_id': user_file.id,
-            'filename': user_file.filename
-        })
-        
-        return send_file(
-            file_data,
-            mimetype=content_type,
-            as_attachment=False,
-            download_name=user_file.filename
-        )
+        return response
         
     except Exception as e:
         current_app.logger.error(f"文件预览错误: {str(e)}")
@@ -510,13 +517,7 @@ def upload_to_knowledge(current_user, file_id):
         ).first_or_404()
         
         # 检查是否已经上传过，过滤掉已上传的类型
-        types_to_upload = []
-        for knowledge_type in knowledge_types:
-            if knowledge_type == 'public' and user_file.public_knowledge_uploaded:
-                continue
-            if knowledge_type == 'private' and user_file.private_knowledge_uploaded:
-                continue
-            types_to_upload.append(knowledge_type)
+        types_to_upload, _ = split_knowledge_types_to_upload(user_file, knowledge_types)
         
         if not types_to_upload:
             return jsonify({
@@ -524,6 +525,13 @@ def upload_to_knowledge(current_user, file_id):
                 'message': '所选知识库类型均已上传'
             }), 400
         
+        expire_stale_jobs()
+        if user_file.id in get_active_job_file_ids([user_file.id]):
+            return jsonify({
+                'success': False,
+                'message': '文件正在上传到知识库，请等待当前任务完成'
+            }), 409
+        
         # 打印用户ID和文件路径（测试用）
         print(f"用户ID: {current_user.id}")
         print(f"用户名: {current_user.username}")
@@ -532,59 +540,21 @@ def upload_to_knowledge(current_user, file_id):
         print(f"文件分类: {user_file.file_category}")
         print(f"知识库类型: {type(types_to_upload)}")
         
-        upload_success, error_message, result = sync_file_to_local_knowledge(
-            current_user,
-            user_file,
-            types_to_upload
-        )
-        
-        # 只有在远程上传成功时才更新数据库状态
-        if not upload_success:
-            return jsonify({
-                'success': False,
-                'message': f'上传到知识库失败: {error_message}'
-            }), 500
-        
-        # 更新上传状态（只有在远程上传成功后才执行）
-        uploaded_types = []
-        for knowledge_type in types_to_upload:
-            if knowledge_type == 'public':
-                user_file.public_knowledge_uploaded = True
-                uploaded_types.append('公有知识库')
-            elif knowledge_type == 'private':
-                user_file.private_knowledge_uploaded = True
-                uploaded_types.append('私有知识库')
-        
-        # 提交数据库更改
-        try:
-            db.session.commit()
-        except Exception as db_error:
-            db.session.rollback()
-            current_app.logger.error(f"数据库更新失败: {str(db_error)}")
-            return jsonify({
-                'success': False,
-                'message': '数据库更新失败，请联系管理员'
-            }), 500
-        
-        # 记录用户活动
-        log_user_activity(current_user.id, 'upload_to_knowledge', {
-            'file_id': user_file.id,
-            'filename': user_file.filename,
-            'minio_path': user_file.minio_path,
-            'knowledge_types': types_to_upload
-        })
+        # 提交后台入库任务，上传状态在任务成功后更新
+        batch_id, jobs = enqueue_knowledge_jobs(current_user.id, [(user_file, types_to_upload)])
         
-        knowledge_names = '和'.join(uploaded_types)
-        current_app.logger.info(f"用户 {current_user.username} 上传文件到{knowledge_names}: {user_file.filename}")
+        knowledge_names = '和'.join(KNOWLEDGE_TYPE_NAMES[knowledge_type] for knowledge_type in types_to_upload)
+        current_app.logger.info(f"用户 {current_user.username} 提交文件到{knowledge_names}的入库任务: {user_file.filename}")
         
         return jsonify({
             'success': True,
-            'message': f'文件已成功上传到{knowledge_names}',
+            'message': f'已提交上传到{knowledge_names}的任务，正在后台处理',
             'data': {
                 **user_file.to_dict(),
-                'indexed_chunks': (result or {}).get('chunk_count', 0)
+                'batch_id': batch_id,
+                'job': jobs[0].to_dict()
             }
-        }), 200
+        }), 202
         
     except Exception as e:
         db.session.rollback()
@@ -710,6 +680,91 @@ def cancel_knowledge_upload(current_user, file_id):
         }), 500
 
 
+def collect_knowledge_upload_files(current_user, file_ids, knowledge_types):
+    """
+    校验批量上传的文件，返回 (失败/警告列表, [(用户文件, 待上传类型), ...])
+    
+    部分类型已上传的文件记一条警告，未上传的类型仍会提交任务。
+    """
+    expire_stale_jobs()
+    user_files = {
+        user_file.id: user_file
+        for user_file in UserFile.query.filter(
+            UserFile.id.in_(file_ids),
+            UserFile.user_id == current_user.id
+        ).all()
+    }
+    active_file_ids = get_active_job_file_ids(list(user_files))
+    
+    failed_files = []
+    file_types = []
+    seen_file_ids = set()
+    for file_id in file_ids:
+        user_file = user_files.get(file_id)
+        if not user_file:
+            failed_files.append({
+                'file_id': file_id,
+                'filename': f'文件ID: {file_id}',
+                'error': '文件不存在或无权限访问'
+            })
+            continue
+        if file_id in seen_file_ids:
+            continue
+        seen_file_ids.add(file_id)
+        
+        if file_id in active_file_ids:
+            failed_files.append({
+                'file_id': file_id,
+                'filename': user_file.filename,
+                'error': '文件正在上传到知识库，请等待当前任务完成'
+            })
+            continue
+        
+        types_to_upload, already_uploaded = split_knowledge_types_to_upload(user_file, knowledge_types)
+        if already_uploaded:
+            failed_files.append({
+                'file_id': file_id,
+                'filename': user_file.filename,
+                'error': f"{'和'.join(already_uploaded)}已经上传",
+                'type': 'warning'  # 标记为警告类型
+            })
+        if types_to_upload:
+            file_types.append((user_file, types_to_upload))
+    
+    return failed_files, file_types
+
+
+@documents_bp.route('/knowledge-jobs/<batch_id>', methods=['GET'])
+@login_required
+def get_knowledge_jobs(current_user, batch_id):
+    """查询知识库入库任务进度"""
+    try:
+        expire_stale_jobs()
+        jobs = get_batch_jobs(batch_id, current_user.id)
+        if not jobs:
+            return jsonify({
+                'success': False,
+                'message': '任务不存在'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'message': '获取任务进度成功',
+            'data': {
+                'batch_id': batch_id,
+                'summary': summarize_jobs(jobs),
+                'jobs': [job.to_dict() for job in jobs]
+            }
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"获取入库任务进度错误: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': '获取任务进度失败，请稍后重试'
+        }), 500
+
+
 @documents_bp.route('/batch-upload-knowledge', methods=['POST'])
 @login_required
 def batch_upload_to_knowledge(current_user):
@@ -748,125 +803,29 @@ def batch_upload_to_knowledge(current_user):
                     'message': f'无效的知识库类型: {knowledge_type}'
                 }), 400
         
-        # 批量处理结果
+        # 校验文件并提交后台入库任务
+        failed_files, file_types = collect_knowledge_upload_files(current_user, file_ids, knowledge_types)
+        batch_id, jobs = enqueue_knowledge_jobs(current_user.id, file_types) if file_types else (None, [])
+        
         results = {
-            'success_files': [],
-            'failed_files': [],
+            'batch_id': batch_id,
+            'jobs': [job.to_dict() for job in jobs],
+            'failed_files': failed_files,
             'total_count': len(file_ids),
-            'success_count': 0,
-            'failed_count': 0
+            'queued_count': len(jobs),
+            'failed_count': len(failed_files)
         }
         
-        # 逐个处理文件
-        for file_id in file_ids:
-            try:
-                # 查找文件
-                user_file = UserFile.query.filter_by(
-                    id=file_id,
-                    user_id=current_user.id
-                ).first()
-                
-                if not user_file:
-                    results['failed_files'].append({
-                        'file_id': file_id,
-                        'error': '文件不存在或无权限访问'
-                    })
-                    results['failed_count'] += 1
-                    continue
-                
-                # 检查文件是否已上传到指定知识库
-                types_to_upload = []
-                already_uploaded = []
-                
-                for knowledge_type in knowledge_types:
-                    if knowledge_type == 'public' and not user_file.public_knowledge_uploaded:
-                        types_to_upload.append('public')
-                    elif knowledge_type == 'private' and not user_file.private_knowledge_uploaded:
-                        types_to_upload.append('private')
-                    else:
-                        type_name = '公有知识库' if knowledge_type == 'public' else '私有知识库'
-                        already_uploaded.append(type_name)
-                
-                if not types_to_upload:
-                    uploaded_names = '和'.join(already_uploaded)
-                    results['failed_files'].append({
-                        'file_id': file_id,
-                        'filename': user_file.filename,
-                        'error': f'文件已上传到{uploaded_names}'
-                    })
-                    results['failed_count'] += 1
-                    continue
-                
-                upload_success, error_message, _ = sync_file_to_local_knowledge(
-                    current_user,
-                    user_file,
-                    types_to_upload
-                )
-                
-                # 处理上传结果
-                if upload_success:
-                    # 更新数据库状态
-                    uploaded_types = []
-                    for knowledge_type in types_to_upload:
-                        if knowledge_type == 'public':
-                            user_file.public_knowledge_uploaded = True
-                            uploaded_types.append('公有知识库')
-                        elif knowledge_type == 'private':
-                            user_file.private_knowledge_uploaded = True
-                            uploaded_types.append('私有知识库')
-                    
-                    # 记录用户活动
-                    log_user_activity(current_user.id, 'batch_upload_to_knowledge', {
-                        'file_id': user_file.id,
-                        'filename': user_file.filename,
-                        'minio_path': user_file.minio_path,
-                        'knowledge_types': types_to_upload
-                    })
-                    
-                    knowledge_names = '和'.join(uploaded_types)
-                    results['success_files'].append({
-                        'file_id': file_id,
-                        'filename': user_file.filename,
-                        'message': f'已成功上传到{knowledge_names}'
-                    })
-                    results['success_count'] += 1
-                    
-                else:
-                    results['failed_files'].append({
-                        'file_id': file_id,
-                        'filename': user_file.filename,
-                        'error': f'上传失败: {error_message}'
-                    })
-                    results['failed_count'] += 1
-                    
-            except Exception as file_error:
-                current_app.logger.error(f"处理文件 {file_id} 时出错: {str(file_error)}")
-                results['failed_files'].append({
-                    'file_id': file_id,
-                    'error': f'处理文件时出错: {str(file_error)}'
-                })
-                results['failed_count'] += 1
-        
-        # 提交数据库更改
-        try:
-            db.session.commit()
-        except Exception as db_error:
-            db.session.rollback()
-            current_app.logger.error(f"批量上传数据库更新失败: {str(db_error)}")
-            return jsonify({
-                'success': False,
-                'message': '数据库更新失败，请联系管理员'
-            }), 500
-        
-        # 构建响应消息
-        if results['success_count'] > 0 and results['failed_count'] == 0:
-            message = f'批量上传成功，共处理 {results["success_count"]} 个文件'
+        # 构建响应消息（警告的文件仍会上传未上传的类型）
+        blocked_count = sum(1 for error_info in failed_files if error_info.get('type') != 'warning')
+        if jobs and not blocked_count:
+            message = f'已提交 {len(jobs)} 个文件的入库任务，正在后台处理'
             success = True
-        elif results['success_count'] > 0 and results['failed_count'] > 0:
-            message = f'部分上传成功，成功 {results["success_count"]} 个，失败 {results["failed_count"]} 个'
+        elif jobs:
+            message = f'已提交 {len(jobs)} 个文件的入库任务，{blocked_count} 个文件无法上传'
             success = True
         else:
-            message = f'批量上传失败，共 {results["failed_count"]} 个文件上传失败'
+            message = f'批量上传失败，共 {len(failed_files)} 个文件无法上传'
             success = False
         
         current_app.logger.info(f"用户 {current_user.username} 批量上传文件到知识库: {message}")
@@ -875,7 +834,7 @@ def batch_upload_to_knowledge(current_user):
             'success': success,
             'message': message,
             'data': results
-        }), 200
+        }), 202 if jobs else 200
         
     except Exception as e:
         db.session.rollback()
@@ -988,171 +947,87 @@ def batch_upload_to_knowledge_with_progress(current_user):
                     'message': f'无效的知识库类型: {knowledge_type}'
                 }), 400
         
+        # 校验文件并提交后台入库任务，进度从任务表读取
+        failed_files, file_types = collect_knowledge_upload_files(current_user, file_ids, knowledge_types)
+        batch_id, _ = enqueue_knowledge_jobs(current_user.id, file_types) if file_types else (None, [])
+        queued_file_ids = {user_file.id for user_file, _ in file_types}
+        # 校验阶段即结束的文件直接计为完成；带警告但仍提交了任务的文件在任务结束时计为完成
+        skipped_count = sum(1 for error_info in failed_files if error_info['file_id'] not in queued_file_ids)
+        
         # 获取当前应用实例（在生成器外部获取）
         app = current_app._get_current_object()
+        user_id = current_user.id
+        username = current_user.username
+        total = len(file_ids)
+        
+        def progress_event(completed, current_file, errors):
+            return f"data: {json.dumps({'type': 'progress', 'completed': completed, 'total': total, 'currentFile': current_file, 'errors': errors})}\n\n"
         
         def generate_progress():
-            """生成器函数，用于实时返回进度"""
+            """生成器函数，轮询任务表实时返回进度"""
             
-            # 批量处理结果
             results = {
+                'batch_id': batch_id,
                 'success_files': [],
-                'failed_files': [],
-                'total_count': len(file_ids),
+                'failed_files': list(failed_files),
+                'total_count': total,
                 'success_count': 0,
-                'failed_count': 0
+                'failed_count': len(failed_files)
             }
             
-            # 发送初始进度
-            yield f"data: {json.dumps({'type': 'progress', 'completed': 0, 'total': len(file_ids), 'currentFile': '', 'errors': []})}\n\n"
+            # 发送初始进度（包含校验阶段的错误与警告）
+            yield progress_event(skipped_count, '', failed_files)
             
-            # 在应用上下文中处理文件
             with app.app_context():
-                # 逐个处理文件
-                for index, file_id in enumerate(file_ids):
-                    try:
-                        # 查找文件
-                        user_file = UserFile.query.filter_by(
-                            id=file_id,
-                            user_id=current_user.id
-                        ).first()
-                        
-                        if not user_file:
-                            error_info = {
-                                'file_id': file_id,
-                                'filename': f'文件ID: {file_id}',
-                                'error': '文件不存在或无权限访问'
-                            }
-                            results['failed_files'].append(error_info)
-                            results['failed_count'] += 1
-                            
-                            # 发送进度更新
-                            yield f"data: {json.dumps({'type': 'progress', 'completed': index + 1, 'total': len(file_ids), 'currentFile': '', 'errors': [error_info]})}\n\n"
-                            continue
-                        
-                        # 发送当前处理文件信息
-                        yield f"data: {json.dumps({'type': 'progress', 'completed': index, 'total': len(file_ids), 'currentFile': user_file.filename, 'errors': []})}\n\n"
-                        
-                        # 检查文件是否已上传到指定知识库
-                        types_to_upload = []
-                        already_uploaded = []
-                        
-                        for knowledge_type in knowledge_types:
-                            if knowledge_type == 'public':
-                                if user_file.public_knowledge_uploaded:
-                                    already_uploaded.append('公有知识库')
-                                else:
-                                    types_to_upload.append('public')
-                            elif knowledge_type == 'private':
-                                if user_file.private_knowledge_uploaded:
-                                    already_uploaded.append('私有知识库')
-                                else:
-                                    types_to_upload.append('private')
+                try:
+                    finished_job_ids = set()
+                    last_state = None
+                    while batch_id:
+                        expire_stale_jobs()
+                        jobs = get_batch_jobs(batch_id, user_id)
                         
-                        # 如果有任何知识库已上传，显示警告但继续处理未上传的部分
-                        if already_uploaded:
-                            # 构建精确的警告信息
-                            uploaded_names = '和'.join(already_uploaded)
-                            warning_message = f'{uploaded_names}已经上传'
-                            
-                            error_info = {
-                                'file_id': file_id,
-                                'filename': user_file.filename,
-                                'error': warning_message,
-                                'type': 'warning'  # 标记为警告类型
-                            }
-                            results['failed_files'].append(error_info)
-                            results['failed_count'] += 1
-                            
-                            # 发送进度更新
-                            yield f"data: {json.dumps({'type': 'progress', 'completed': index + 1, 'total': len(file_ids), 'currentFile': '', 'errors': [error_info]})}\n\n"
-                            
-                            # 如果没有需要上传的类型，跳过
-                            if not types_to_upload:
+                        new_errors = []
+                        for job in jobs:
+                            if job.status not in ('success', 'failed') or job.id in finished_job_ids:
                                 continue
+                            finished_job_ids.add(job.id)
+                            type_names = '和'.join(KNOWLEDGE_TYPE_NAMES[t] for t in job.get_knowledge_types())
+                            if job.status == 'success':
+                                results['success_files'].append({
+                                    'file_id': job.user_file_id,
+                                    'filename': job.filename,
+                                    'message': f'已成功上传到{type_names}'
+                                })
+                                results['success_count'] += 1
+                            else:
+                                error_info = {
+                                    'file_id': job.user_file_id,
+                                    'filename': job.filename,
+                                    'error': f'上传到{type_names}失败: {job.error_message}'
+                                }
+                                results['failed_files'].append(error_info)
+                                results['failed_count'] += 1
+                                new_errors.append(error_info)
                         
-                        upload_success, error_message, _ = sync_file_to_local_knowledge(
-                            current_user,
-                            user_file,
-                            types_to_upload
-                        )
-                        
-                        # 处理上传结果
-                        if upload_success:
-                            # 更新数据库状态
-                            uploaded_types = []
-                            for knowledge_type in types_to_upload:
-                                if knowledge_type == 'public':
-                                    user_file.public_knowledge_uploaded = True
-                                    uploaded_types.append('公有知识库')
-                                elif knowledge_type == 'private':
-                                    user_file.private_knowledge_uploaded = True
-                                    uploaded_types.append('私有知识库')
-                            
-                            # 记录用户活动
-                            log_user_activity(current_user.id, 'batch_upload_to_knowledge', {
-                                'file_id': user_file.id,
-                                'filename': user_file.filename,
-                                'minio_path': user_file.minio_path,
-                                'knowledge_types': types_to_upload
-                            })
-                            
-                            knowledge_names = '和'.join(uploaded_types)
-                            results['success_files'].append({
-                                'file_id': file_id,
-                                'filename': user_file.filename,
-                                'message': f'已成功上传到{knowledge_names}'
-                            })
-                            results['success_count'] += 1
-                            
-                            # 发送成功进度更新
-                            yield f"data: {json.dumps({'type': 'progress', 'completed': index + 1, 'total': len(file_ids), 'currentFile': '', 'errors': []})}\n\n"
-                            
-                        else:
-                            # 构建具体的失败知识库类型信息
-                            failed_types = []
-                            for knowledge_type in types_to_upload:
-                                if knowledge_type == 'public':
-                                    failed_types.append('公有知识库')
-                                elif knowledge_type == 'private':
-                                    failed_types.append('私有知识库')
-                            
-                            failed_type_text = '和'.join(failed_types)
-                            error_info = {
-                                'file_id': file_id,
-                                'filename': user_file.filename,
-                                'error': f'上传到{failed_type_text}失败: {error_message}'
-                            }
-                            results['failed_files'].append(error_info)
-                            results['failed_count'] += 1
-                            
-                            # 发送失败进度更新
-                            yield f"data: {json.dumps({'type': 'progress', 'completed': index + 1, 'total': len(file_ids), 'currentFile': '', 'errors': [error_info]})}\n\n"
-                            
-                    except Exception as file_error:
-                        app.logger.error(f"处理文件 {file_id} 时出错: {str(file_error)}")
-                        error_info = {
-                            'file_id': file_id,
-                            'filename': f'文件ID: {file_id}',
-                            'error': f'处理失败: {str(file_error)}'
-                        }
-                        results['failed_files'].append(error_info)
-                        results['failed_count'] += 1
+                        summary = summarize_jobs(jobs)
+                        current_file = '、'.join(job.filename for job in jobs if job.status == 'running')
+                        # 结束只读事务，下一轮重新读取任务状态
+                        db.session.commit()
+                        state = (summary['finished'], current_file)
+                        if state != last_state or new_errors:
+                            yield progress_event(skipped_count + summary['finished'], current_file, new_errors)
+                            last_state = state
                         
-                        # 发送错误进度更新
-                        yield f"data: {json.dumps({'type': 'progress', 'completed': index + 1, 'total': len(file_ids), 'currentFile': '', 'errors': [error_info]})}\n\n"
-                        
-                        # 回滚数据库事务
-                        db.session.rollback()
-            
-                # 提交数据库更改
-                try:
-                    db.session.commit()
-                except Exception as db_error:
+                        if summary['finished'] >= summary['total']:
+                            break
+                        time.sleep(JOB_PROGRESS_POLL_INTERVAL)
+                except Exception as poll_error:
                     db.session.rollback()
-                    app.logger.error(f"批量上传数据库更新失败: {str(db_error)}")
-                    yield f"data: {json.dumps({'type': 'error', 'message': '数据库更新失败，请联系管理员'})}\n\n"
+                    app.logger.error(f"批量上传进度查询失败: {str(poll_error)}")
+                    yield f"data: {json.dumps({'type': 'error', 'message': '进度查询失败，请刷新后查看上传状态'})}\n\n"
                     return
+                finally:
+                    db.session.remove()
                 
                 # 构建最终结果
                 if results['success_count'] > 0 and results['failed_count'] == 0:
@@ -1165,7 +1040,7 @@ def batch_upload_to_knowledge_with_progress(current_user):
                     message = f'批量上传失败，共 {results["failed_count"]} 个文件上传失败'
                     success = False
                 
-                app.logger.info(f"用户 {current_user.username} 批量上传文件到知识库: {message}")
+                app.logger.info(f"用户 {username} 批量上传文件到知识库: {message}")
                 
                 # 发送最终结果
                 yield f"data: {json.dumps({'type': 'complete', 'success': success, 'message': message, 'data': results})}\n\n"
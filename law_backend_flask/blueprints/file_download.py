@@ -1,6 +1,7 @@
-from flask import Blueprint, request, jsonify, send_file
-from utils.minio_client import download_file_by_path
-import io
+from flask import Blueprint, request, jsonify
+from utils import stream_file_response
+from utils.minio_client import get_content_type, resolve_minio_path, stat_file
+import os
 
 file_download_bp = Blueprint('file_download', __name__)
 
@@ -14,7 +15,7 @@ def download_file():
     }
     
     返回:
-    - 成功: 直接返回文件流
+    - 成功: 流式返回文件内容，支持 Range / If-None-Match
     - 失败: 返回错误信息的JSON
     """
     try:
@@ -33,26 +34,15 @@ def download_file():
                 'code': 400
             }), 400
         
-        # 调用下载函数
-        result = download_file_by_path(minio_path)
-        if result is None:
+        _, object_name = resolve_minio_path(minio_path)
+        response = stream_file_response(minio_path, os.path.basename(object_name), as_attachment=True)
+        if response is None:
             return jsonify({
                 'error': '文件下载失败或文件不存在',
                 'code': 404
             }), 404
         
-        file_data, filename, content_type = result
-        
-        # 创建文件流并返回
-        file_stream = io.BytesIO(file_data)
-        file_stream.seek(0)
-        
-        return send_file(
-            file_stream,
-            as_attachment=True,
-            download_name=filename,
-            mimetype=content_type
-        )
+        return response
         
     except Exception as e:
         return jsonify({
@@ -93,9 +83,10 @@ def get_file_info():
                 'code': 400
             }), 400
         
-        # 调用下载函数获取文件信息
-        result = download_file_by_path(minio_path)
-        if result is None:
+        # 只读取对象元数据，不下载文件内容
+        bucket_name, object_name = resolve_minio_path(minio_path)
+        file_stat = stat_file(bucket_name, object_name)
+        if file_stat is None:
             return jsonify({
                 'filename': None,
                 'content_type': None,
@@ -103,12 +94,12 @@ def get_file_info():
                 'exists': False
             })
         
-        file_data, filename, content_type = result
-        
+        filename = os.path.basename(object_name)
         return jsonify({
             'filename': filename,
-            'content_type': content_type,
-            'size': len(file_data),
+            'content_type': get_content_type(filename),
+            'size': file_stat['size'],
+            'etag': file_stat['etag'],
             'exists': True
         })
         
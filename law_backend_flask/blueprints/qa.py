@@ -5,17 +5,20 @@
 """
 
 from flask import Blueprint, request, jsonify, current_app
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from models import db
 from utils.auth import login_required, sanitize_input
+from utils.http_client import get_http_session
 from utils.knowledge_base import search_knowledge_chunks, format_knowledge_context
 from utils.web_search import (
     format_web_search_context,
     is_web_search_requested,
     search_web
 )
-import requests
 import os
+import threading
+import time
 
 qa_bp = Blueprint('qa', __name__)
 
@@ -23,7 +26,14 @@ DEFAULT_LLM_BASE_URL = "http://127.0.0.1:11434/v1"
 DEFAULT_LLM_MODEL = "qwen2.5:7b"
 DEFAULT_LLM_API_KEY = "ollama"
 DEFAULT_CONTEXT_MESSAGE_COUNT = 6
+DEFAULT_RETRIEVAL_DEADLINE = 12.0
+RETRIEVAL_WORKERS = 16
 LEGACY_UI_MODELS = {"ChatGLM-6B", "Qwen-7B"}
+KNOWLEDGE_MODES = ('shared_knowledge', 'private_knowledge', 'entire_knowledge', 'knowledgeQA')
+
+# 联网搜索与本地知识库检索共用的线程池（gevent worker 下线程会被 monkey patch 为协程）
+_retrieval_executor = None
+_retrieval_executor_lock = threading.Lock()
 
 
 def get_chat_service_url():
@@ -69,6 +79,85 @@ def get_context_message_count():
         return DEFAULT_CONTEXT_MESSAGE_COUNT
 
 
+def get_retrieval_deadline():
+    """联网搜索与知识库检索的共同截止时间（秒），超时的一路直接放弃。"""
+    try:
+        return max(1.0, float(os.environ.get('QA_RETRIEVAL_DEADLINE_SECONDS', str(DEFAULT_RETRIEVAL_DEADLINE))))
+    except ValueError:
+        return DEFAULT_RETRIEVAL_DEADLINE
+
+
+def _get_retrieval_executor():
+    global _retrieval_executor
+    with _retrieval_executor_lock:
+        if _retrieval_executor is None:
+            _retrieval_executor = ThreadPoolExecutor(
+                max_workers=RETRIEVAL_WORKERS,
+                thread_name_prefix='qa-retrieval'
+            )
+        return _retrieval_executor
+
+
+def _timed_call(app, func, *args):
+    """在应用上下文中执行检索，返回 (结果, 耗时毫秒)；结束后释放本线程的数据库会话。"""
+    started = time.perf_counter()
+    with app.app_context():
+        try:
+            return func(*args), round((time.perf_counter() - started) * 1000, 1)
+        finally:
+            db.session.remove()
+
+
+def run_retrievals(tasks):
+    """
+    并发执行多路检索，在共同截止时间内等待
+
+    Args:
+        tasks: {名称: (函数, 参数元组)}
+
+    Returns:
+        (results, timings): results 为 {名称: 结果}，失败或超时的一路结果为空列表；
+        timings 为 {名称: {'status': ok/error/timeout, 'elapsed_ms': 耗时, 'hits': 命中数}}
+    """
+    if not tasks:
+        return {}, {}
+
+    app = current_app._get_current_object()
+    executor = _get_retrieval_executor()
+    started = time.perf_counter()
+    futures = {
+        name: executor.submit(_timed_call, app, func, *args)
+        for name, (func, args) in tasks.items()
+    }
+    wait(futures.values(), timeout=get_retrieval_deadline())
+
+    results = {}
+    timings = {}
+    for name, future in futures.items():
+        if not future.done():
+            # 超时的一路在后台继续执行，结果丢弃
+            results[name] = []
+            timings[name] = {
+                'status': 'timeout',
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+                'hits': 0
+            }
+            continue
+        try:
+            result, elapsed_ms = future.result()
+            results[name] = result or []
+            timings[name] = {'status': 'ok', 'elapsed_ms': elapsed_ms, 'hits': len(results[name])}
+        except Exception as e:
+            current_app.logger.warning("检索失败: name=%s error=%s", name, str(e))
+            results[name] = []
+            timings[name] = {
+                'status': 'error',
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+                'hits': 0
+            }
+    return results, timings
+
+
 def load_conversation_context(current_user, conversation_id):
     """从本地数据库提取最近几条对话上下文。"""
     if not conversation_id:
@@ -84,14 +173,13 @@ def load_conversation_context(current_user, conversation_id):
     if not conversation:
         return None, []
 
-    messages = (
-        Message.query.filter_by(conversation_id=conversation_id)
-        .order_by(Message.created_at.asc(), Message.id.asc())
-        .all()
-    )
+    context_message_count = get_context_message_count()
+    if context_message_count <= 0:
+        return conversation, []
+
     recent_messages = [
         {'role': message.role, 'content': message.content}
-        for message in messages[-get_context_message_count():]
+        for message in Message.get_recent(conversation_id, context_message_count)
         if message.content
     ]
     return conversation, recent_messages
@@ -125,7 +213,7 @@ def build_fallback_messages(question, recent_messages, mode):
 
 def call_llm(messages, temperature=0.2, max_tokens=800, requested_model=None):
     """调用本机可用的 OpenAI 兼容模型接口。"""
-    response = requests.post(
+    response = get_http_session().post(
         f"{get_llm_base_url()}/chat/completions",
         headers={
             'Authorization': f"Bearer {get_llm_api_key()}",
@@ -420,37 +508,31 @@ def knowledge_query(current_user):
         answer = ""
         top_k_value = int(top_k) if top_k is not None else 3
         web_requested = is_web_search_requested(web_search)
-        knowledge_results = []
-        web_results = []
         remote_error_message = ""
         chat_service_url = get_chat_service_url()
 
+        # 联网搜索与本地知识库检索互不依赖，并发执行
+        retrieval_tasks = {}
         if web_requested:
-            try:
-                web_results = search_web(question, top_k_value)
-                current_app.logger.info(
-                    "联网搜索完成: user_id=%s conversation_id=%s requested=%s hits=%s",
-                    current_user.id,
-                    conversation_id,
-                    web_search,
-                    len(web_results)
-                )
-            except Exception as e:
-                current_app.logger.warning(
-                    "联网搜索失败: user_id=%s conversation_id=%s error=%s",
-                    current_user.id,
-                    conversation_id,
-                    str(e)
-                )
+            retrieval_tasks['web_search'] = (search_web, (question, top_k_value))
+        if mode in KNOWLEDGE_MODES:
+            retrieval_tasks['knowledge_search'] = (
+                search_knowledge_chunks,
+                (current_user.id, question, mode, top_k_value)
+            )
+        retrieval_results, retrieval_timings = run_retrievals(retrieval_tasks)
+        web_results = retrieval_results.get('web_search', [])
+        knowledge_results = retrieval_results.get('knowledge_search', [])
+        if retrieval_timings:
+            current_app.logger.info(
+                "检索完成: user_id=%s conversation_id=%s timings=%s",
+                current_user.id,
+                conversation_id,
+                retrieval_timings
+            )
 
-        if mode in ('shared_knowledge', 'private_knowledge', 'entire_knowledge', 'knowledgeQA'):
+        if mode in KNOWLEDGE_MODES:
             try:
-                knowledge_results = search_knowledge_chunks(
-                    current_user.id,
-                    question,
-                    mode,
-                    top_k_value
-                )
                 if knowledge_results or web_results:
                     current_app.logger.info(
                         "知识增强资料可用: user_id=%s conversation_id=%s knowledge_hits=%s web_hits=%s",
@@ -484,7 +566,7 @@ def knowledge_query(current_user):
                         mode
                     )
             except Exception as e:
-                current_app.logger.error(f"本地知识库检索失败: {str(e)}")
+                current_app.logger.error(f"知识增强回答失败: {str(e)}")
 
         if not answer and web_results:
             try:
@@ -517,7 +599,7 @@ def knowledge_query(current_user):
                     'conversation_id': conversation_id or 0,
                     'recent_messages_count': 3
                 }
-                response = requests.post(
+                response = get_http_session().post(
                     f"{chat_service_url.rstrip('/')}/api/chat",
                     json=payload,
                     timeout=30
@@ -578,7 +660,8 @@ def knowledge_query(current_user):
                 'conversation_id': conversation_id,
                 'sources': build_response_sources(knowledge_results, web_results),
                 'web_search_used': web_requested,
-                'web_result_count': len(web_results)
+                'web_result_count': len(web_results),
+                'retrieval_timings': retrieval_timings
             }
         }), 200
         
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：将知识切片正文拆分到 knowledge_chunk_contents
+
+旧版 knowledge_chunks 每个知识库类型各存一份正文，倒排索引与全文索引以切片 ID 为键。
+迁移后正文每个文件只存一份，knowledge_chunks 通过 content_id 引用正文，
+倒排索引（knowledge_terms）与全文索引改以正文 ID 为键并重建。
+同一文件公有/私有正文不一致时，以最近写入的一份为准。
+"""
+
+import os
+import sys
+from sqlalchemy import inspect, text
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db, KnowledgeChunkContent, KnowledgeTerm
+from utils.knowledge_base import _insert_file_contents
+from utils.knowledge_index import (
+    FULLTEXT_TABLE_NAME,
+    create_fulltext_index
+)
+
+LEGACY_COLUMNS = ('content', 'content_preview', 'search_text', 'ngram_signature')
+LEGACY_FULLTEXT_INDEX_NAME = 'ft_knowledge_chunks_search_text'
+
+
+def _column_names(table_name):
+    return {column['name'] for column in inspect(db.engine).get_columns(table_name)}
+
+
+def _rebuild_search_indexes():
+    """删除以切片 ID 为键的旧索引并按新结构建表，返回是否需要重建全文索引"""
+    inspector = inspect(db.engine)
+    dialect_name = db.engine.dialect.name
+
+    if inspector.has_table(KnowledgeTerm.__tablename__) and \
+            'chunk_id' in _column_names(KnowledgeTerm.__tablename__):
+        print("正在重建倒排索引表 knowledge_terms...")
+        db.session.execute(text(f"DROP TABLE {KnowledgeTerm.__tablename__}"))
+        db.session.commit()
+    KnowledgeTerm.__table__.create(bind=db.engine, checkfirst=True)
+
+    rebuild_fulltext = False
+    if dialect_name == 'sqlite' and inspector.has_table(FULLTEXT_TABLE_NAME):
+        db.session.execute(text(f"DROP TABLE {FULLTEXT_TABLE_NAME}"))
+        # 先建空表，正文写入时同步导入
+        create_fulltext_index()
+        db.session.commit()
+    elif dialect_name == 'mysql':
+        # 旧 FULLTEXT 索引随 search_text 列一起删除，迁移完成后在正文表上重建
+        rebuild_fulltext = any(
+            index.get('name') == LEGACY_FULLTEXT_INDEX_NAME
+            for index in inspector.get_indexes('knowledge_chunks')
+        )
+    return rebuild_fulltext
+
+
+def _migrate_file(user_file_id):
+    """为单个文件写入正文并回填 knowledge_chunks.content_id"""
+    rows = db.session.execute(text(
+        "SELECT chunk_index, content FROM knowledge_chunks "
+        "WHERE user_file_id = :user_file_id "
+        "ORDER BY chunk_index, created_at DESC, id DESC"
+    ), {'user_file_id': user_file_id}).fetchall()
+
+    contents_by_index = {}
+    for row in rows:
+        contents_by_index.setdefault(row.chunk_index, row.content)
+    chunk_indexes = sorted(contents_by_index)
+
+    existing = KnowledgeChunkContent.query.filter(
+        KnowledgeChunkContent.user_file_id == user_file_id
+    ).first()
+    if existing is None:
+        content_ids = _insert_file_contents(
+            user_file_id,
+            [contents_by_index[chunk_index] for chunk_index in chunk_indexes]
+        )
+    else:
+        # 上次迁移中断时已写入的正文直接复用
+        content_ids = [
+            row.id
+            for row in db.session.query(KnowledgeChunkContent.id).filter(
+                KnowledgeChunkContent.user_file_id == user_file_id
+            ).order_by(KnowledgeChunkContent.chunk_index)
+        ]
+
+    db.session.execute(text(
+        "UPDATE knowledge_chunks SET content_id = :content_id "
+        "WHERE user_file_id = :user_file_id AND chunk_index = :chunk_index"
+    ), [
+        {'content_id': content_id, 'user_file_id': user_file_id, 'chunk_index': chunk_index}
+        for chunk_index, content_id in zip(chunk_indexes, content_ids)
+    ])
+
+
+def _drop_legacy_columns():
+    dialect_name = db.engine.dialect.name
+    legacy_columns = [column for column in LEGACY_COLUMNS if column in _column_names('knowledge_chunks')]
+    for column_name in legacy_columns:
+        print(f"正在删除旧字段 {column_name}...")
+        db.session.execute(text(f"ALTER TABLE knowledge_chunks DROP COLUMN {column_name}"))
+
+    if dialect_name == 'mysql':
+        db.session.execute(text(
+            "ALTER TABLE knowledge_chunks MODIFY content_id INTEGER NOT NULL, "
+            "ADD INDEX ix_knowledge_chunks_content_id (content_id), "
+            "ADD CONSTRAINT fk_knowledge_chunks_content_id FOREIGN KEY (content_id) "
+            "REFERENCES knowledge_chunk_contents (id)"
+        ))
+    else:
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_knowledge_chunks_content_id ON knowledge_chunks (content_id)"
+        ))
+    db.session.commit()
+
+
+def migrate_knowledge_chunk_contents():
+    """将旧版知识切片迁移为 正文 + 可见性记录 结构"""
+    app = create_app('development')
+
+    with app.app_context():
+        try:
+            columns = _column_names('knowledge_chunks')
+            if 'content' not in columns:
+                print("知识切片已是新结构，无需迁移")
+                return
+
+            KnowledgeChunkContent.__table__.create(bind=db.engine, checkfirst=True)
+            if 'content_id' not in columns:
+                print("正在添加字段 content_id...")
+                db.session.execute(text("ALTER TABLE knowledge_chunks ADD COLUMN content_id INTEGER NULL"))
+                db.session.commit()
+
+            rebuild_fulltext = _rebuild_search_indexes()
+
+            file_ids = [
+                row.user_file_id
+                for row in db.session.execute(text(
+                    "SELECT DISTINCT user_file_id FROM knowledge_chunks "
+                    "WHERE content_id IS NULL ORDER BY user_file_id"
+                ))
+            ]
+            print(f"正在迁移 {len(file_ids)} 个文件的知识切片...")
+            for processed, user_file_id in enumerate(file_ids, start=1):
+                _migrate_file(user_file_id)
+                db.session.commit()
+                print(f"- 已处理 {processed}/{len(file_ids)}")
+
+            _drop_legacy_columns()
+
+            if rebuild_fulltext:
+                print("正在重建全文索引...")
+                create_fulltext_index()
+                db.session.commit()
+
+            print("知识切片正文迁移完成！")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"迁移失败: {str(e)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    migrate_knowledge_chunk_contents()
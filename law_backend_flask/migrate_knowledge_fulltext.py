@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为知识切片建立数据库全文索引（KNOWLEDGE_SEARCH_BACKEND=fulltext）
+
+- SQLite: 创建 FTS5 trigram 虚拟表并导入已有切片正文
+- MySQL: 在 knowledge_chunk_contents.search_text 上建立 ngram 解析器的 FULLTEXT 索引
+
+旧版切片表需先执行 migrate_knowledge_chunk_contents.py。
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db, KnowledgeChunkContent
+from utils.knowledge_base import _normalize_for_search
+from utils.knowledge_index import (
+    add_fulltext_rows,
+    create_fulltext_index,
+    has_fulltext_index
+)
+
+BATCH_SIZE = 500
+
+
+def migrate_knowledge_fulltext():
+    """建立全文索引，SQLite 下同时导入已有切片正文"""
+    app = create_app('development')
+
+    with app.app_context():
+        try:
+            if has_fulltext_index():
+                print("全文索引已存在，无需迁移")
+                return
+
+            print(f"正在为 {db.engine.dialect.name} 建立全文索引...")
+            create_fulltext_index()
+            db.session.commit()
+
+            if db.engine.dialect.name != 'sqlite':
+                print("全文索引建立完成！")
+                return
+
+            total = KnowledgeChunkContent.query.count()
+            print(f"正在导入 {total} 个切片正文...")
+            processed = 0
+            last_id = 0
+            while True:
+                contents = KnowledgeChunkContent.query.filter(
+                    KnowledgeChunkContent.id > last_id
+                ).order_by(KnowledgeChunkContent.id).limit(BATCH_SIZE).all()
+                if not contents:
+                    break
+
+                add_fulltext_rows(
+                    (
+                        chunk_content.id,
+                        chunk_content.search_text
+                        if chunk_content.search_text is not None
+                        else _normalize_for_search(chunk_content.content)
+                    )
+                    for chunk_content in contents
+                )
+                db.session.commit()
+
+                last_id = contents[-1].id
+                processed += len(contents)
+                print(f"- 已处理 {processed}/{total}")
+
+            print("全文索引建立完成！")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"迁移失败: {str(e)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    migrate_knowledge_fulltext()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为已有切片正文建立倒排索引（knowledge_terms）
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db, KnowledgeChunkContent, KnowledgeTerm
+from utils.knowledge_base import build_chunk_term_counts
+from utils.knowledge_index import add_content_terms
+
+BATCH_SIZE = 200
+
+
+def migrate_knowledge_index():
+    """为尚未建立倒排索引的切片正文补建索引"""
+    app = create_app('development')
+
+    with app.app_context():
+        try:
+            # 建表（已存在时跳过）
+            KnowledgeTerm.__table__.create(bind=db.engine, checkfirst=True)
+
+            indexed_ids = db.session.query(KnowledgeTerm.content_id).distinct()
+            pending_query = KnowledgeChunkContent.query.filter(
+                ~KnowledgeChunkContent.id.in_(indexed_ids)
+            ).order_by(KnowledgeChunkContent.id)
+
+            total = pending_query.count()
+            if not total:
+                print("所有切片正文均已建立倒排索引，无需迁移")
+                return
+
+            print(f"正在为 {total} 个切片正文建立倒排索引...")
+            processed = 0
+            last_id = 0
+            while True:
+                contents = pending_query.filter(KnowledgeChunkContent.id > last_id).limit(BATCH_SIZE).all()
+                if not contents:
+                    break
+
+                add_content_terms(
+                    (chunk_content.id, build_chunk_term_counts(chunk_content.content))
+                    for chunk_content in contents
+                )
+                db.session.commit()
+
+                last_id = contents[-1].id
+                processed += len(contents)
+                print(f"- 已处理 {processed}/{total}")
+
+            print("倒排索引建立完成！")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"迁移失败: {str(e)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    migrate_knowledge_index()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为已入库文件补建切片向量（KNOWLEDGE_EMBEDDING_MODEL）
+
+向量文件保存在 KNOWLEDGE_VECTOR_DIR（默认 data/knowledge_vectors），已存在的文件跳过。
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db, KnowledgeChunkContent
+from utils.knowledge_vectors import is_vector_search_enabled, write_file_vectors
+
+
+def migrate_knowledge_vectors():
+    """逐个文件计算切片向量"""
+    app = create_app('development')
+
+    with app.app_context():
+        try:
+            if not is_vector_search_enabled():
+                print("未配置 KNOWLEDGE_EMBEDDING_MODEL 或缺少 numpy / sentence-transformers，跳过")
+                return
+
+            file_ids = [
+                row.user_file_id
+                for row in db.session.query(KnowledgeChunkContent.user_file_id).distinct().order_by(
+                    KnowledgeChunkContent.user_file_id
+                )
+            ]
+            print(f"正在为 {len(file_ids)} 个文件计算切片向量...")
+            written = 0
+            for processed, user_file_id in enumerate(file_ids, start=1):
+                chunks = [
+                    row.content
+                    for row in db.session.query(KnowledgeChunkContent.content).filter(
+                        KnowledgeChunkContent.user_file_id == user_file_id
+                    ).order_by(KnowledgeChunkContent.chunk_index)
+                ]
+                if write_file_vectors(user_file_id, chunks, overwrite=False):
+                    written += 1
+                print(f"- 已处理 {processed}/{len(file_ids)}")
+
+            print(f"切片向量补建完成！新写入 {written} 个文件")
+
+        except Exception as e:
+            print(f"迁移失败: {str(e)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    migrate_knowledge_vectors()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为 messages 添加 (conversation_id, created_at, id) 复合索引
+
+对话上下文按时间倒序 LIMIT 读取最近消息，依赖该索引避免扫描整段历史。
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db, Message
+
+
+def migrate_message_index():
+    """创建消息复合索引（已存在时跳过）"""
+    app = create_app('development')
+
+    with app.app_context():
+        try:
+            for index in Message.__table__.indexes:
+                print(f"正在创建索引 {index.name}...")
+                index.create(bind=db.engine, checkfirst=True)
+            print("消息索引迁移完成！")
+
+        except Exception as e:
+            print(f"迁移失败: {str(e)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    migrate_message_index()
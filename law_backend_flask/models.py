@@ -99,8 +99,34 @@ class UserFile(db.Model):
         return f'<UserFile {self.filename}>'
 
 
+class KnowledgeChunkContent(db.Model):
+    """本地知识库切片正文：每个文件的切片正文只存一份，由公有/私有切片记录引用"""
+    __tablename__ = 'knowledge_chunk_contents'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_file_id = db.Column(db.Integer, db.ForeignKey('user_files.id'), nullable=False, index=True)
+    chunk_index = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    content_preview = db.Column(db.String(500), nullable=True)
+    # 入库时预计算的检索字段：去空白小写文本、n-gram 哈希签名（排序后的 uint32 数组）
+    search_text = db.Column(db.Text, nullable=True)
+    ngram_signature = db.Column(db.LargeBinary, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            'user_file_id',
+            'chunk_index',
+            name='uq_knowledge_chunk_content_file_index'
+        ),
+    )
+
+    def __repr__(self):
+        return f'<KnowledgeChunkContent {self.user_file_id}:{self.chunk_index}>'
+
+
 class KnowledgeChunk(db.Model):
-    """本地知识库切片模型"""
+    """本地知识库切片模型（可见性记录，正文见 KnowledgeChunkContent）"""
     __tablename__ = 'knowledge_chunks'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -110,8 +136,7 @@ class KnowledgeChunk(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     file_category = db.Column(db.String(50), nullable=True)
     chunk_index = db.Column(db.Integer, nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    content_preview = db.Column(db.String(500), nullable=True)
+    content_id = db.Column(db.Integer, db.ForeignKey('knowledge_chunk_contents.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user_file = db.relationship(
@@ -122,6 +147,7 @@ class KnowledgeChunk(db.Model):
         'User',
         backref=db.backref('knowledge_chunks', lazy='dynamic')
     )
+    chunk_content = db.relationship('KnowledgeChunkContent')
 
     __table_args__ = (
         db.UniqueConstraint(
@@ -141,13 +167,76 @@ class KnowledgeChunk(db.Model):
             'filename': self.filename,
             'file_category': self.file_category,
             'chunk_index': self.chunk_index,
-            'content_preview': self.content_preview,
+            'content_preview': self.chunk_content.content_preview if self.chunk_content else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
     def __repr__(self):
         return f'<KnowledgeChunk {self.user_file_id}:{self.knowledge_type}:{self.chunk_index}>'
 
+class KnowledgeTerm(db.Model):
+    """本地知识库倒排索引：检索词 -> 切片正文"""
+    __tablename__ = 'knowledge_terms'
+
+    # MySQL 默认排序规则不区分全半角/大小写，倒排词需按二进制比较
+    term = db.Column(
+        db.String(64).with_variant(db.String(64, collation='utf8mb4_bin'), 'mysql'),
+        primary_key=True
+    )
+    content_id = db.Column(
+        db.Integer,
+        db.ForeignKey('knowledge_chunk_contents.id', ondelete='CASCADE'),
+        primary_key=True,
+        index=True
+    )
+    tf = db.Column(db.Integer, nullable=False, default=1)
+
+    def __repr__(self):
+        return f'<KnowledgeTerm {self.term}:{self.content_id}>'
+
+class KnowledgeIndexJob(db.Model):
+    """本地知识库后台入库任务"""
+    __tablename__ = 'knowledge_index_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(36), nullable=False, index=True)  # 同一次提交的任务共享批次ID
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_file_id = db.Column(db.Integer, db.ForeignKey('user_files.id', ondelete='CASCADE'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    knowledge_types = db.Column(db.String(50), nullable=False)  # 逗号分隔: public,private
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, running, success, failed
+    error_message = db.Column(db.Text, nullable=True)
+    chunk_count = db.Column(db.Integer, nullable=True)
+
+    # 时间戳
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def get_knowledge_types(self):
+        return [item for item in (self.knowledge_types or '').split(',') if item]
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'batch_id': self.batch_id,
+            'user_id': self.user_id,
+            'user_file_id': self.user_file_id,
+            'filename': self.filename,
+            'knowledge_types': self.get_knowledge_types(),
+            'status': self.status,
+            'error_message': self.error_message,
+            'chunk_count': self.chunk_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<KnowledgeIndexJob {self.id}: {self.status}>'
+
 class SystemConfig(db.Model):
     """系统配置模型"""
     __tablename__ = 'system_config'
@@ -194,16 +283,20 @@ class Conversation(db.Model):
     # 关联关系
     user = db.relationship('User', backref='conversations')
     messages = db.relationship('Message', backref='conversation', lazy='dynamic', cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_conversations_user_updated_id', 'user_id', 'updated_at', 'id'),
+    )
     
-    def to_dict(self):
-        """转换为字典"""
+    def to_dict(self, message_count=None):
+        """转换为字典，批量序列化时可传入预先统计的 message_count，避免逐个 COUNT"""
         return {
             'id': self.id,
             'user_id': self.user_id,
             'title': self.title,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'message_count': self.messages.count()
+            'message_count': self.messages.count() if message_count is None else message_count
         }
     
     def __repr__(self):
@@ -220,6 +313,20 @@ class Message(db.Model):
     
     # 时间戳
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_messages_conversation_created_id', 'conversation_id', 'created_at', 'id'),
+    )
+
+    @classmethod
+    def get_recent(cls, conversation_id, limit):
+        """按时间倒序 LIMIT 取最近 limit 条消息，返回按时间正序排列的列表"""
+        messages = cls.query.filter_by(conversation_id=conversation_id).order_by(
+            cls.created_at.desc(),
+            cls.id.desc()
+        ).limit(limit).all()
+        messages.reverse()
+        return messages
     
     def to_dict(self):
         """转换为字典"""
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地知识库纯函数单元测试
+测试文本切片与检索词构建，不依赖运行中的后端服务
+"""
+
+import os
+import sys
+from typing import Iterator
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.knowledge_base import (  # noqa: E402
+    build_chunk_term_counts,
+    build_ngram_signature,
+    build_query_index_terms,
+    chunk_text,
+    decode_ngram_signature,
+    iter_chunk_text,
+    normalize_text
+)
+
+
+def _make_text(sentences: int) -> str:
+    """生成互不相同的句子，每句以句号结尾"""
+    return ''.join(
+        ''.join(chr(0x4e00 + (index * 37 + offset) % 5000) for offset in range(40)) + '。'
+        for index in range(sentences)
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.knowledge
+class TestChunkText:
+    """文本切片测试类"""
+
+    def test_empty_text(self):
+        """测试空文本不产出切片"""
+        assert chunk_text('') == []
+        assert chunk_text(None) == []
+
+    def test_short_text_single_chunk(self):
+        """测试短文本规范化后作为单个切片"""
+        assert chunk_text('  第一条\r\n\r\n\r\n内容  ', chunk_size=300, overlap=50) == ['第一条\n\n内容']
+
+    def test_iter_chunk_text_is_lazy(self):
+        """测试 iter_chunk_text 返回迭代器，与 chunk_text 结果一致"""
+        text = _make_text(60)
+        chunks = iter_chunk_text(text, chunk_size=300, overlap=50)
+        assert isinstance(chunks, Iterator)
+        assert next(chunks) == chunk_text(text, chunk_size=300, overlap=50)[0]
+
+    def test_long_text_breaks_at_sentence_end(self):
+        """测试长文本按长度上限切分，并在句末标点处断开"""
+        text = _make_text(60)
+        chunks = chunk_text(text, chunk_size=300, overlap=50)
+
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert len(chunk) <= 300
+            assert chunk in text
+        for chunk in chunks[:-1]:
+            assert chunk.endswith('。')
+        assert text.startswith(chunks[0])
+        assert text.endswith(chunks[-1])
+
+    def test_consecutive_chunks_overlap(self):
+        """测试相邻切片保留重叠部分"""
+        text = _make_text(60)
+        chunks = chunk_text(text, chunk_size=300, overlap=50)
+        for previous, current in zip(chunks, chunks[1:]):
+            assert previous[-50:] == current[:50]
+
+    def test_text_without_boundaries(self):
+        """测试没有断点的文本按固定长度切分"""
+        text = 'a' * 1000
+        chunks = chunk_text(text, chunk_size=300, overlap=50)
+        assert all(len(chunk) == 300 for chunk in chunks[:-1])
+        assert text.endswith(chunks[-1])
+
+    def test_normalize_text(self):
+        """测试换行、空白与空字符规范化"""
+        assert normalize_text('a\r\nb\rc\x00 \t d\n\n\n\ne') == 'a\nb\nc d\n\ne'
+
+
+@pytest.mark.unit
+@pytest.mark.knowledge
+class TestSearchTerms:
+    """检索词构建测试类"""
+
+    def test_chunk_term_counts(self):
+        """测试切片检索词包含 2/3-gram 及词频"""
+        counts = build_chunk_term_counts('合同 法合同')
+        assert counts['合同'] == 2
+        assert counts['同法'] == 1
+        assert counts['合同法'] == 1
+        assert ' ' not in ''.join(counts)
+
+    def test_chunk_term_counts_structured_tokens(self):
+        """测试案号、编号等结构化字符串合并为单个检索词"""
+        counts = build_chunk_term_counts('编号 ABC-2023-001 已登记')
+        assert counts['abc2023001'] == 1
+
+    def test_query_index_terms(self):
+        """测试问题检索词去除空白并统一小写"""
+        terms = build_query_index_terms('劳动 合同 ABC-123456')
+        assert '劳动' in terms
+        assert '动合同' in terms
+        assert 'abc123456' in terms
+        assert all(term == term.lower() and ' ' not in term for term in terms)
+
+    def test_query_index_terms_short_question(self):
+        """测试单个字符的问题没有检索词"""
+        assert build_query_index_terms('法') == []
+
+    def test_ngram_signature_round_trip(self):
+        """测试 n-gram 签名去重排序，且可还原为哈希序列"""
+        signature = build_ngram_signature('合同合同')
+        hashes = decode_ngram_signature(signature)
+        # 2-gram：合同、同合；3-gram：合同合、同合同
+        assert len(hashes) == 4
+        assert list(hashes) == sorted(set(hashes))
+        assert build_ngram_signature('') == b''
@@ -9,12 +9,18 @@ from .minio_client import (
     get_minio_client,
     upload_file,
     download_file as minio_download_file,
+    download_file_to_path as minio_download_file_to_path,
     delete_file as minio_delete_file,
     get_file_url,
     list_files,
-    check_minio_health
+    check_minio_health,
+    get_content_type,
+    iter_file_range,
+    resolve_minio_path,
+    stat_file
 )
-from flask import current_app
+from flask import current_app, request, Response
+from urllib.parse import quote
 import io
 
 def download_file(minio_path):
@@ -49,6 +55,98 @@ def download_file(minio_path):
         current_app.logger.error(f"文件下载失败: {str(e)}")
         return None
 
+def _content_disposition(filename, as_attachment):
+    disposition = 'attachment' if as_attachment else 'inline'
+    try:
+        filename.encode('ascii')
+        return f'{disposition}; filename="{filename}"'
+    except UnicodeEncodeError:
+        # 非 ASCII 文件名按 RFC 5987 编码
+        return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+def stream_file_response(minio_path, download_name, as_attachment=True, mimetype=None):
+    """以流式响应返回MinIO文件，支持 Range 断点续传与 ETag 条件请求
+    
+    Args:
+        minio_path: MinIO路径，格式为 bucket/object_name 或 object_name
+        download_name: 下载文件名
+        as_attachment: 是否作为附件下载
+        mimetype: 响应类型，默认按文件名推断
+        
+    Returns:
+        Response: 流式响应，文件不存在时返回 None
+    """
+    bucket_name, object_name = resolve_minio_path(minio_path)
+    file_stat = stat_file(bucket_name, object_name)
+    if file_stat is None:
+        return None
+
+    size = file_stat['size']
+    etag = file_stat['etag']
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    status = 200
+    offset, length = 0, size
+    byte_range = request.range
+    # 多段 Range 不支持；If-Range 与当前 ETag 不一致说明文件已变化，均返回完整文件
+    if byte_range is not None and len(byte_range.ranges) == 1 and \
+            ('If-Range' not in request.headers or request.if_range.etag == etag):
+        requested = byte_range.range_for_length(size)
+        if requested is None:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        offset, length = requested[0], requested[1] - requested[0]
+        status = 206
+
+    response = Response(
+        iter_file_range(bucket_name, object_name, offset, length),
+        status=status,
+        mimetype=mimetype or get_content_type(download_name),
+        direct_passthrough=True
+    )
+    response.headers['Content-Length'] = str(length)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Disposition'] = _content_disposition(download_name, as_attachment)
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {offset}-{offset + length - 1}/{size}'
+    if etag:
+        response.set_etag(etag)
+    if file_stat['last_modified']:
+        response.last_modified = file_stat['last_modified']
+    return response
+
+def download_file_to_path(minio_path, file_path):
+    """将文件流式下载到本地路径的适配函数
+    
+    Args:
+        minio_path: MinIO路径，格式为 bucket/object_name 或 object_name
+        file_path: 本地目标路径
+        
+    Returns:
+        str: 本地文件路径，失败时返回 None
+    """
+    try:
+        # 检查路径格式并解析
+        if '/' in minio_path and not minio_path.startswith('generals/') and not minio_path.startswith('cases/'):
+            # 完整路径格式: bucket_name/object_name
+            parts = minio_path.split('/', 1)
+            bucket_name = parts[0]
+            object_name = parts[1]
+        else:
+            # 只有object_name的格式，使用配置中的默认bucket
+            bucket_name = current_app.config['MINIO_BUCKET_NAME']
+            object_name = minio_path
+        
+        return minio_download_file_to_path(bucket_name, object_name, file_path)
+        
+    except Exception as e:
+        current_app.logger.error(f"文件下载失败: {str(e)}")
+        return None
+
 def delete_file_from_minio(minio_path):
     """删除MinIO文件的适配函数
     
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件文本抽取的纯函数实现，同时作为抽取子进程的工作模块。
+
+本模块不依赖 Flask 应用，spawn 子进程反序列化任务时只导入这里的函数，不会创建应用实例。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import subprocess
+from typing import Iterator
+
+
+def decode_text_bytes(file_bytes: bytes) -> str:
+    for encoding in ('utf-8', 'utf-8-sig', 'gb18030', 'gbk'):
+        try:
+            return file_bytes.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return file_bytes.decode('utf-8', errors='ignore')
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """逐页读取 PDF 文本，文件句柄直接指向磁盘文件而非内存副本。"""
+    from pypdf import PdfReader
+
+    with open(file_path, 'rb') as file_obj:
+        reader = PdfReader(file_obj)
+        for page in reader.pages:
+            yield (page.extract_text() or '').strip()
+
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+    from docx import Document as DocxDocument
+
+    document = DocxDocument(file_path)
+    for paragraph in document.paragraphs:
+        text = paragraph.text.strip()
+        if text:
+            yield text
+
+
+def _extract_text_from_doc(file_path: str) -> str:
+    for command in ('antiword', 'catdoc'):
+        executable = shutil.which(command)
+        if not executable:
+            continue
+
+        result = subprocess.run(
+            [executable, file_path],
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='ignore',
+            timeout=30,
+            check=False
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            return result.stdout
+
+    raise ValueError('当前环境暂不支持 .doc 文件解析，请优先上传 PDF、DOCX、TXT 或 JSON 文件')
+
+
+def iter_text_blocks(file_path: str, filename: str) -> Iterator[str]:
+    """按文件类型逐块产出文本：PDF 为页，DOCX 为段落，其余类型为整篇。"""
+    extension = os.path.splitext(filename or file_path)[1].lower()
+
+    if extension == '.pdf':
+        yield from iter_pdf_pages(file_path)
+        return
+    if extension == '.docx':
+        yield from iter_docx_paragraphs(file_path)
+        return
+    if extension == '.doc':
+        yield _extract_text_from_doc(file_path)
+        return
+    if extension in ('.txt', '.md', '.json'):
+        with open(file_path, 'rb') as file_obj:
+            raw_text = decode_text_bytes(file_obj.read())
+        if extension == '.json':
+            try:
+                raw_text = json.dumps(json.loads(raw_text), ensure_ascii=False, indent=2)
+            except json.JSONDecodeError:
+                pass
+        yield raw_text
+        return
+
+    raise ValueError(f'暂不支持将 {extension or "未知类型"} 文件导入知识库')
+
+
+def extract_text_from_path(file_path: str, filename: str) -> str:
+    """在当前进程内抽取文件文本（抽取子进程的工作函数）。"""
+    return '\n\n'.join(iter_text_blocks(file_path, filename))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+出站 HTTP 连接池。
+
+每个 worker 进程共享一个 requests.Session：按主机复用 keep-alive 连接，
+单主机连接数上限为 HTTP_POOL_MAXSIZE（超出时排队等待空闲连接），
+建立连接失败时按带抖动的指数退避重试 HTTP_CONNECT_RETRIES 次。
+只重试连接阶段的错误，请求已发出后的读超时不重试，POST 不会被重复提交。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 20
+DEFAULT_CONNECT_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.2
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def get_pool_connections() -> int:
+    """缓存连接池的主机数。"""
+    try:
+        return max(1, int(os.environ.get('HTTP_POOL_CONNECTIONS', str(DEFAULT_POOL_CONNECTIONS))))
+    except ValueError:
+        return DEFAULT_POOL_CONNECTIONS
+
+
+def get_pool_maxsize() -> int:
+    """单个主机的最大连接数。"""
+    try:
+        return max(1, int(os.environ.get('HTTP_POOL_MAXSIZE', str(DEFAULT_POOL_MAXSIZE))))
+    except ValueError:
+        return DEFAULT_POOL_MAXSIZE
+
+
+def get_connect_retries() -> int:
+    try:
+        return max(0, int(os.environ.get('HTTP_CONNECT_RETRIES', str(DEFAULT_CONNECT_RETRIES))))
+    except ValueError:
+        return DEFAULT_CONNECT_RETRIES
+
+
+def _build_retry() -> Retry:
+    retries = get_connect_retries()
+    options = {
+        'total': retries,
+        'connect': retries,
+        'read': 0,
+        'status': 0,
+        'other': 0,
+        'backoff_factor': DEFAULT_RETRY_BACKOFF,
+        'raise_on_status': False
+    }
+    try:
+        # urllib3 2.x 支持退避抖动，避免多个 worker 同时重连
+        return Retry(backoff_jitter=DEFAULT_RETRY_BACKOFF, **options)
+    except TypeError:
+        return Retry(**options)
+
+
+def build_http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=get_pool_connections(),
+        pool_maxsize=get_pool_maxsize(),
+        pool_block=True,
+        max_retries=_build_retry()
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_http_session() -> requests.Session:
+    """获取当前进程共享的 Session；gunicorn fork 出的子进程会重新创建，避免共用父进程的连接。"""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            _session = build_http_session()
+            _session_pid = pid
+        return _session
@@ -6,28 +6,49 @@
 
 from __future__ import annotations
 
-import io
-import json
 import os
 import re
-import shutil
-import subprocess
+import struct
 import tempfile
-from typing import Dict, List, Sequence
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
 
-from docx import Document as DocxDocument
 from flask import current_app
-from pypdf import PdfReader
 from sqlalchemy import and_, or_
-
-from models import db, KnowledgeChunk
-from utils import download_file
+from sqlalchemy.orm import joinedload
+
+from models import db, KnowledgeChunk, KnowledgeChunkContent
+from utils import download_file_to_path
+from utils.knowledge_index import (
+    add_content_terms,
+    add_fulltext_rows,
+    find_candidate_chunk_ids,
+    find_fulltext_candidate_ids,
+    get_search_backend,
+    has_fulltext_index,
+    has_term_index,
+    remove_content_terms,
+    remove_fulltext_rows
+)
+from utils.knowledge_vectors import (
+    discard_file_vectors,
+    encode_file_vectors,
+    get_vector_weight,
+    install_file_vectors,
+    remove_file_vectors,
+    search_vector_scores
+)
+from utils.text_extraction import extract_text_cached, extract_text_from_path
 
 
 DEFAULT_CHUNK_SIZE = 900
 DEFAULT_CHUNK_OVERLAP = 120
 DEFAULT_MAX_CONTEXT_CHUNKS = 6
 DEFAULT_MIN_SEARCH_SCORE = 5.0
+CHUNK_INSERT_BATCH_SIZE = 500
 
 
 def get_chunk_size() -> int:
@@ -66,81 +87,17 @@ def normalize_knowledge_types(knowledge_types: Sequence[str] | None) -> List[str
     return valid_types
 
 
-def _decode_text_bytes(file_bytes: bytes) -> str:
-    for encoding in ('utf-8', 'utf-8-sig', 'gb18030', 'gbk'):
-        try:
-            return file_bytes.decode(encoding)
-        except UnicodeDecodeError:
-            continue
-    return file_bytes.decode('utf-8', errors='ignore')
-
-
-def _extract_text_from_pdf(file_bytes: bytes) -> str:
-    reader = PdfReader(io.BytesIO(file_bytes))
-    return '\n\n'.join((page.extract_text() or '').strip() for page in reader.pages)
-
-
-def _extract_text_from_docx(file_bytes: bytes) -> str:
-    document = DocxDocument(io.BytesIO(file_bytes))
-    parts = []
-    for paragraph in document.paragraphs:
-        text = paragraph.text.strip()
-        if text:
-            parts.append(text)
-    return '\n\n'.join(parts)
-
-
-def _extract_text_from_doc(file_bytes: bytes) -> str:
-    for command in ('antiword', 'catdoc'):
-        executable = shutil.which(command)
-        if not executable:
-            continue
-
-        with tempfile.NamedTemporaryFile(suffix='.doc', delete=False) as temp_file:
-            temp_file.write(file_bytes)
-            temp_path = temp_file.name
-
-        try:
-            result = subprocess.run(
-                [executable, temp_path],
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                errors='ignore',
-                timeout=30,
-                check=False
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                return result.stdout
-        finally:
-            try:
-                os.remove(temp_path)
-            except OSError:
-                pass
-
-    raise ValueError('当前环境暂不支持 .doc 文件解析，请优先上传 PDF、DOCX、TXT 或 JSON 文件')
-
-
 def extract_text_from_bytes(file_bytes: bytes, filename: str) -> str:
+    """兼容按内存字节抽取的调用方：先落盘，再复用流式抽取逻辑。"""
     extension = os.path.splitext(filename or '')[1].lower()
+    with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as temp_file:
+        temp_file.write(file_bytes)
+        temp_path = temp_file.name
 
-    if extension == '.pdf':
-        return _extract_text_from_pdf(file_bytes)
-    if extension == '.docx':
-        return _extract_text_from_docx(file_bytes)
-    if extension == '.doc':
-        return _extract_text_from_doc(file_bytes)
-    if extension in ('.txt', '.md'):
-        return _decode_text_bytes(file_bytes)
-    if extension == '.json':
-        raw_text = _decode_text_bytes(file_bytes)
-        try:
-            parsed = json.loads(raw_text)
-            return json.dumps(parsed, ensure_ascii=False, indent=2)
-        except json.JSONDecodeError:
-            return raw_text
-
-    raise ValueError(f'暂不支持将 {extension or "未知类型"} 文件导入知识库')
+    try:
+        return extract_text_from_path(temp_path, filename)
+    finally:
+        _remove_temp_file(temp_path)
 
 
 def normalize_text(text: str) -> str:
@@ -150,17 +107,37 @@ def normalize_text(text: str) -> str:
     return text.strip()
 
 
+# 切片断点：换行或句末标点
+CHUNK_BOUNDARY_PATTERN = re.compile(r'[\n。！？；.]')
+
+
 def chunk_text(text: str, chunk_size: int | None = None, overlap: int | None = None) -> List[str]:
+    return list(iter_chunk_text(text, chunk_size, overlap))
+
+
+def iter_chunk_text(text: str, chunk_size: int | None = None, overlap: int | None = None) -> Iterator[str]:
+    """
+    按长度切分文本，逐个产出切片。
+
+    切片尽量在窗口后半段最后一个换行或句末标点处断开，切分结果与此前的 chunk_text 一致，
+    已入库正文无需重建。
+    """
+    return iter_normalized_chunks(normalize_text(text), chunk_size, overlap)
+
+
+def iter_normalized_chunks(normalized: str, chunk_size: int | None = None, overlap: int | None = None) -> Iterator[str]:
+    """切分已经 normalize_text 处理过的文本；断点位置一次扫描得出，之后每个窗口只做二分查找。"""
     chunk_size = chunk_size or get_chunk_size()
     overlap = overlap or get_chunk_overlap()
-    normalized = normalize_text(text)
 
     if not normalized:
-        return []
+        return
     if len(normalized) <= chunk_size:
-        return [normalized]
+        yield normalized
+        return
 
-    chunks: List[str] = []
+    boundaries = array('q', (match.start() for match in CHUNK_BOUNDARY_PATTERN.finditer(normalized)))
+    previous_chunk = None
     start = 0
     text_length = len(normalized)
 
@@ -169,22 +146,16 @@ def chunk_text(text: str, chunk_size: int | None = None, overlap: int | None = N
         end = target_end
 
         if target_end < text_length:
+            # 窗口后半段 [search_start, target_end) 内最后一个断点
             search_start = min(text_length, start + max(100, chunk_size // 2))
-            boundary = max(
-                normalized.rfind('\n\n', search_start, target_end),
-                normalized.rfind('\n', search_start, target_end),
-                normalized.rfind('。', search_start, target_end),
-                normalized.rfind('！', search_start, target_end),
-                normalized.rfind('？', search_start, target_end),
-                normalized.rfind('；', search_start, target_end),
-                normalized.rfind('.', search_start, target_end)
-            )
-            if boundary > start:
-                end = boundary + 1
+            position = bisect_left(boundaries, target_end) - 1
+            if position >= 0 and boundaries[position] >= search_start:
+                end = boundaries[position] + 1
 
         chunk = normalized[start:end].strip()
-        if chunk and (not chunks or chunk != chunks[-1]):
-            chunks.append(chunk)
+        if chunk and chunk != previous_chunk:
+            yield chunk
+            previous_chunk = chunk
 
         if end >= text_length:
             break
@@ -194,74 +165,246 @@ def chunk_text(text: str, chunk_size: int | None = None, overlap: int | None = N
             next_start = end
         start = next_start
 
-    return chunks
 
+def download_minio_file_to_temp(minio_path: str, filename: str) -> str:
+    extension = os.path.splitext(filename or '')[1].lower()
+    with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as temp_file:
+        temp_path = temp_file.name
 
-def load_minio_file_bytes(minio_path: str) -> bytes:
-    file_obj = download_file(minio_path)
-    if not file_obj:
+    if not download_file_to_path(minio_path, temp_path):
+        _remove_temp_file(temp_path)
         raise ValueError('文件下载失败，未能从对象存储读取文件内容')
 
+    if os.path.getsize(temp_path) == 0:
+        _remove_temp_file(temp_path)
+        raise ValueError('文件内容为空，无法导入知识库')
+
+    return temp_path
+
+
+def _remove_temp_file(temp_path: str) -> None:
     try:
-        file_bytes = file_obj.read()
+        os.remove(temp_path)
+    except OSError:
+        pass
+
+
+def prepare_user_file_for_knowledge(user_file) -> Dict[str, object]:
+    """
+    入库准备阶段：下载、抽取文件并计算切片向量，只读数据库，可与其他入库任务并行执行
+
+    切片不整体保存，各环节通过 iter_normalized_chunks(prepared['text']) 逐个生成。
+
+    Returns:
+        {'text': 规范化后的全文, 'content_ids': 正文未变化时已入库的正文ID（变化时为 None）,
+         'vector_path': 待启用的向量临时文件（未计算时为 None）}
+    """
+    temp_path = download_minio_file_to_temp(user_file.minio_path, user_file.filename)
+    try:
+        clean_text = normalize_text(extract_text_cached(temp_path, user_file.filename))
     finally:
-        try:
-            file_obj.close()
-        except Exception:
-            pass
+        _remove_temp_file(temp_path)
+    if not clean_text:
+        raise ValueError('文件解析成功，但未提取到可用文本')
 
-    if not file_bytes:
-        raise ValueError('文件内容为空，无法导入知识库')
+    content_ids = _load_file_content_ids(user_file.id, iter_normalized_chunks(clean_text))
+    vector_path = None
+    try:
+        # 正文未变化时复用已有向量文件
+        vector_path = encode_file_vectors(
+            user_file.id,
+            iter_normalized_chunks(clean_text),
+            overwrite=content_ids is None
+        )
+    except Exception as exc:
+        # 向量检索是可选增强，失败时不影响词法检索入库
+        current_app.logger.warning("切片向量计算失败: file_id=%s error=%s", user_file.id, str(exc))
 
-    return file_bytes
+    return {
+        'text': clean_text,
+        'content_ids': content_ids,
+        'vector_path': vector_path
+    }
 
 
-def index_user_file_to_knowledge(user_file, owner_user, knowledge_types: Sequence[str]) -> Dict[str, int]:
+def write_prepared_file_to_knowledge(user_file, owner_user, knowledge_types: Sequence[str], prepared: Dict[str, object]) -> Dict[str, int]:
+    """入库写入阶段：写入切片正文、索引与可见性记录并启用向量文件，由调用方提交事务。"""
     normalized_types = normalize_knowledge_types(knowledge_types)
     if not normalized_types:
         raise ValueError('未提供有效的知识库类型')
 
-    file_bytes = load_minio_file_bytes(user_file.minio_path)
-    raw_text = extract_text_from_bytes(file_bytes, user_file.filename)
-    clean_text = normalize_text(raw_text)
-    if not clean_text:
-        raise ValueError('文件解析成功，但未提取到可用文本')
-
-    chunks = chunk_text(clean_text)
-    if not chunks:
+    content_ids = prepared['content_ids']
+    if content_ids is None:
+        # 正文变化（或首次入库）：重写正文，已入库的其他知识库类型一并指向新正文
+        existing_types = [
+            row.knowledge_type
+            for row in db.session.query(KnowledgeChunk.knowledge_type).filter(
+                KnowledgeChunk.user_file_id == user_file.id
+            ).distinct()
+        ]
+        normalized_types = normalize_knowledge_types(list(normalized_types) + existing_types)
+        KnowledgeChunk.query.filter(
+            KnowledgeChunk.user_file_id == user_file.id
+        ).delete(synchronize_session=False)
+        _delete_file_contents(user_file.id)
+        content_ids = _insert_file_contents(user_file.id, iter_normalized_chunks(prepared['text']))
+    else:
+        KnowledgeChunk.query.filter(
+            KnowledgeChunk.user_file_id == user_file.id,
+            KnowledgeChunk.knowledge_type.in_(normalized_types)
+        ).delete(synchronize_session=False)
+
+    _bulk_insert(KnowledgeChunk.__table__, (
+        {
+            'user_file_id': user_file.id,
+            'owner_user_id': owner_user.id,
+            'knowledge_type': knowledge_type,
+            'filename': user_file.filename,
+            'file_category': user_file.file_category,
+            'chunk_index': chunk_index,
+            'content_id': content_id
+        }
+        for knowledge_type in normalized_types
+        for chunk_index, content_id in enumerate(content_ids)
+    ))
+    if not content_ids:
         raise ValueError('文件内容过短，无法切分为知识片段')
+    db.session.flush()
 
-    KnowledgeChunk.query.filter(
-        KnowledgeChunk.user_file_id == user_file.id,
-        KnowledgeChunk.knowledge_type.in_(normalized_types)
-    ).delete(synchronize_session=False)
-
-    for knowledge_type in normalized_types:
-        for chunk_index, chunk in enumerate(chunks):
-            db.session.add(KnowledgeChunk(
-                user_file_id=user_file.id,
-                owner_user_id=owner_user.id,
-                knowledge_type=knowledge_type,
-                filename=user_file.filename,
-                file_category=user_file.file_category,
-                chunk_index=chunk_index,
-                content=chunk,
-                content_preview=chunk[:200]
-            ))
+    if prepared['vector_path']:
+        install_file_vectors(user_file.id, prepared['vector_path'])
+        prepared['vector_path'] = None
 
-    db.session.flush()
     current_app.logger.info(
         "本地知识库入库完成: file_id=%s knowledge_types=%s chunks=%s",
         user_file.id,
         normalized_types,
-        len(chunks)
+        len(content_ids)
     )
     return {
-        'chunk_count': len(chunks),
+        'chunk_count': len(content_ids),
         'knowledge_type_count': len(normalized_types)
     }
 
 
+def index_user_file_to_knowledge(user_file, owner_user, knowledge_types: Sequence[str]) -> Dict[str, int]:
+    if not normalize_knowledge_types(knowledge_types):
+        raise ValueError('未提供有效的知识库类型')
+
+    prepared = prepare_user_file_for_knowledge(user_file)
+    try:
+        return write_prepared_file_to_knowledge(user_file, owner_user, knowledge_types, prepared)
+    finally:
+        # 写入失败时删除未启用的向量临时文件
+        discard_file_vectors(prepared['vector_path'])
+
+
+def _bulk_insert(table, rows) -> int:
+    """按批执行 executemany 插入，绕开 ORM 对象与 identity map。"""
+    batch: List[Dict[str, object]] = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_INSERT_BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        total += len(batch)
+    return total
+
+
+def _load_file_content_ids(user_file_id: int, chunks: Iterable[str]) -> List[int] | None:
+    """文件已入库的正文与本次切分结果一致时返回正文 ID 列表，否则返回 None；正文与切片均逐条比较。"""
+    rows = db.session.query(
+        KnowledgeChunkContent.id,
+        KnowledgeChunkContent.content
+    ).filter(
+        KnowledgeChunkContent.user_file_id == user_file_id
+    ).order_by(KnowledgeChunkContent.chunk_index).yield_per(CHUNK_INSERT_BATCH_SIZE)
+
+    content_ids = []
+    chunk_iterator = iter(chunks)
+    for row in rows:
+        if row.content != next(chunk_iterator, None):
+            return None
+        content_ids.append(row.id)
+    if not content_ids or next(chunk_iterator, None) is not None:
+        return None
+    return content_ids
+
+
+def _insert_file_contents(user_file_id: int, chunks: Iterable[str]) -> List[int]:
+    """
+    分批写入文件的切片正文及其倒排/全文索引，返回按 chunk_index 排列的正文 ID。
+
+    切片逐批消费，同一时间只有一批切片及其检索字段在内存中。
+    """
+    content_ids: List[int] = []
+    batch: List[str] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= CHUNK_INSERT_BATCH_SIZE:
+            content_ids.extend(_insert_content_batch(user_file_id, len(content_ids), batch))
+            batch = []
+    if batch:
+        content_ids.extend(_insert_content_batch(user_file_id, len(content_ids), batch))
+    return content_ids
+
+
+def _insert_content_batch(user_file_id: int, first_index: int, chunks: Sequence[str]) -> List[int]:
+    search_fields = [build_chunk_search_fields(chunk) for chunk in chunks]
+    db.session.execute(KnowledgeChunkContent.__table__.insert(), [
+        {
+            'user_file_id': user_file_id,
+            'chunk_index': first_index + offset,
+            'content': chunk,
+            'content_preview': chunk[:200],
+            'search_text': search_fields[offset][0],
+            'ngram_signature': search_fields[offset][1]
+        }
+        for offset, chunk in enumerate(chunks)
+    ])
+
+    # executemany 不返回自增主键，按 (user_file_id, chunk_index) 唯一约束回查
+    content_ids = [
+        row.id
+        for row in db.session.query(KnowledgeChunkContent.id).filter(
+            KnowledgeChunkContent.user_file_id == user_file_id,
+            KnowledgeChunkContent.chunk_index >= first_index,
+            KnowledgeChunkContent.chunk_index < first_index + len(chunks)
+        ).order_by(KnowledgeChunkContent.chunk_index)
+    ]
+    add_content_terms(
+        (content_id, build_chunk_term_counts(chunk))
+        for content_id, chunk in zip(content_ids, chunks)
+    )
+    add_fulltext_rows(
+        (content_id, search_fields[offset][0])
+        for offset, content_id in enumerate(content_ids)
+    )
+    return content_ids
+
+
+def _delete_file_contents(user_file_id: int) -> int:
+    """删除文件的切片正文及其倒排/全文索引。"""
+    content_ids = [
+        row.id
+        for row in db.session.query(KnowledgeChunkContent.id).filter(
+            KnowledgeChunkContent.user_file_id == user_file_id
+        )
+    ]
+    remove_file_vectors(user_file_id)
+    if not content_ids:
+        return 0
+    remove_content_terms(content_ids)
+    remove_fulltext_rows(content_ids)
+    return KnowledgeChunkContent.query.filter(
+        KnowledgeChunkContent.id.in_(content_ids)
+    ).delete(synchronize_session=False)
+
+
 def remove_user_file_from_knowledge(user_file_id: int, knowledge_types: Sequence[str] | None = None) -> int:
     query = KnowledgeChunk.query.filter(KnowledgeChunk.user_file_id == user_file_id)
     normalized_types = normalize_knowledge_types(knowledge_types)
@@ -269,6 +412,12 @@ def remove_user_file_from_knowledge(user_file_id: int, knowledge_types: Sequence
         query = query.filter(KnowledgeChunk.knowledge_type.in_(normalized_types))
 
     deleted_count = query.delete(synchronize_session=False)
+    # 没有任何知识库类型再引用时，正文及索引一并删除
+    remaining = db.session.query(KnowledgeChunk.id).filter(
+        KnowledgeChunk.user_file_id == user_file_id
+    ).first()
+    if remaining is None:
+        _delete_file_contents(user_file_id)
     db.session.flush()
     return deleted_count
 
@@ -333,12 +482,80 @@ def _extract_structured_tokens(text: str, min_length: int = 6) -> List[str]:
     return tokens
 
 
-def _score_chunk(question: str, content: str, title: str) -> float:
-    question_compact = _normalize_for_search(question)
-    content_compact = _normalize_for_search(content)
+def build_chunk_term_counts(content: str) -> Dict[str, int]:
+    """切片倒排检索词：字符 2/3-gram 与结构化编号，附带词频。"""
+    compact = _normalize_for_search(content)
+    compact = ''.join(ch for ch in compact if ch.isalnum() or '\u4e00' <= ch <= '\u9fff')
+    counts: Counter = Counter()
+    for size in (2, 3):
+        counts.update(compact[index:index + size] for index in range(0, len(compact) - size + 1))
+    counts.update(_extract_structured_tokens(content))
+    return dict(counts)
+
+
+def build_query_index_terms(question: str) -> List[str]:
+    return list(_build_ngrams(question)) + _extract_structured_tokens(question)
+
+
+def _hash_ngram(ngram: str) -> int:
+    return zlib.crc32(ngram.encode('utf-8'))
+
+
+def build_ngram_signature(text: str) -> bytes:
+    """n-gram 签名：各 n-gram 的 crc32 去重排序后按小端 uint32 序列化。"""
+    hashes = sorted({_hash_ngram(ngram) for ngram in _build_ngrams(text)})
+    return struct.pack('<%dI' % len(hashes), *hashes)
+
+
+def decode_ngram_signature(signature: bytes) -> Tuple[int, ...]:
+    return struct.unpack('<%dI' % (len(signature) // 4), signature)
+
+
+def build_chunk_search_fields(content: str) -> Tuple[str, bytes]:
+    """切片入库时预计算的检索字段：(去空白小写文本, n-gram 签名)。"""
+    return _normalize_for_search(content), build_ngram_signature(content)
+
+
+def _build_query_features(question: str) -> Dict[str, object]:
+    """问题侧特征，每次检索只计算一次。"""
+    question_ngrams = _build_ngrams(question)
+    return {
+        'compact': _normalize_for_search(question),
+        'terms': [
+            (term, min(len(term), 8))
+            for term in _extract_query_terms(question)
+            if len(term) >= 2
+        ],
+        'ngram_hashes': [_hash_ngram(ngram) for ngram in question_ngrams],
+        'structured_tokens': _extract_structured_tokens(question)
+    }
+
+
+def _count_signature_hits(signature: Sequence[int], hashes: Sequence[int]) -> int:
+    """在排序签名中二分查找问题 n-gram 哈希，返回命中个数。"""
+    size = len(signature)
+    hits = 0
+    for value in hashes:
+        position = bisect_left(signature, value)
+        if position < size and signature[position] == value:
+            hits += 1
+    return hits
+
+
+def _chunk_search_fields(chunk_content) -> Tuple[str, Sequence[int]]:
+    """读取切片正文的预计算检索字段；旧数据尚未回填时现场计算。"""
+    search_text = chunk_content.search_text
+    if search_text is None:
+        search_text = _normalize_for_search(chunk_content.content)
+    signature = chunk_content.ngram_signature
+    if signature is None:
+        signature = build_ngram_signature(chunk_content.content)
+    return search_text, decode_ngram_signature(signature)
+
+
+def _score_chunk(features: Dict[str, object], content_compact: str, content_signature: Sequence[int], title: str) -> float:
+    question_compact = features['compact']
     title_compact = _normalize_for_search(title)
-    content_structured = re.sub(r'[^a-z0-9]+', '', content_compact)
-    title_structured = re.sub(r'[^a-z0-9]+', '', title_compact)
 
     if not question_compact or not content_compact:
         return 0.0
@@ -349,10 +566,7 @@ def _score_chunk(question: str, content: str, title: str) -> float:
     if question_compact in title_compact:
         score += 12.0
 
-    for term in _extract_query_terms(question):
-        if len(term) < 2:
-            continue
-        term_length_weight = min(len(term), 8)
+    for term, term_length_weight in features['terms']:
         content_hits = min(content_compact.count(term), 5)
         title_hits = min(title_compact.count(term), 3)
         if content_hits:
@@ -360,14 +574,15 @@ def _score_chunk(question: str, content: str, title: str) -> float:
         if title_hits:
             score += title_hits * (3.0 + term_length_weight * 0.75)
 
-    question_ngrams = _build_ngrams(question)
-    if question_ngrams:
-        content_ngrams = _build_ngrams(content)
-        overlap_ratio = len(question_ngrams & content_ngrams) / max(len(question_ngrams), 1)
+    question_hashes = features['ngram_hashes']
+    if question_hashes:
+        overlap_ratio = _count_signature_hits(content_signature, question_hashes) / len(question_hashes)
         score += overlap_ratio * 20.0
 
-    structured_tokens = _extract_structured_tokens(question)
+    structured_tokens = features['structured_tokens']
     if structured_tokens:
+        content_structured = re.sub(r'[^a-z0-9]+', '', content_compact)
+        title_structured = re.sub(r'[^a-z0-9]+', '', title_compact)
         exact_hits = sum(
             1
             for token in structured_tokens
@@ -381,38 +596,96 @@ def _score_chunk(question: str, content: str, title: str) -> float:
     return round(score, 4)
 
 
-def search_knowledge_chunks(user_id: int, question: str, mode: str, top_k: int = 3) -> List[Dict[str, object]]:
-    if not question or mode == 'none_knowledge':
-        return []
-
-    query = KnowledgeChunk.query
-    if mode == 'shared_knowledge':
-        query = query.filter(KnowledgeChunk.knowledge_type == 'public')
-    elif mode == 'private_knowledge':
-        query = query.filter(
+def _build_visibility_partitions(user_id: int, mode: str) -> List[Tuple[object, object]]:
+    """按检索模式返回可见性分区 [(分区键, 过滤条件), ...]：公有知识库为一个分区，每个用户的私有知识库各为一个分区。"""
+    public_partition = ('public', KnowledgeChunk.knowledge_type == 'public')
+    private_partition = (
+        ('private', user_id),
+        and_(
             KnowledgeChunk.knowledge_type == 'private',
             KnowledgeChunk.owner_user_id == user_id
         )
-    elif mode in ('entire_knowledge', 'knowledgeQA'):
-        query = query.filter(or_(
-            KnowledgeChunk.knowledge_type == 'public',
-            and_(
-                KnowledgeChunk.knowledge_type == 'private',
-                KnowledgeChunk.owner_user_id == user_id
+    )
+    if mode == 'shared_knowledge':
+        return [public_partition]
+    if mode == 'private_knowledge':
+        return [private_partition]
+    if mode in ('entire_knowledge', 'knowledgeQA'):
+        return [public_partition, private_partition]
+    return []
+
+
+def _build_visibility_filter(partitions: Sequence[Tuple[object, object]]):
+    if not partitions:
+        return None
+    if len(partitions) == 1:
+        return partitions[0][1]
+    return or_(*(partition_filter for _, partition_filter in partitions))
+
+
+def _load_candidate_chunks(question: str, visibility_filter, vector_content_ids: Sequence[int] = ()) -> List[KnowledgeChunk]:
+    """
+    按 KNOWLEDGE_SEARCH_BACKEND 召回候选切片，所选后端不可用时依次退回倒排表、全量扫描。
+
+    vector_content_ids 为向量检索命中的正文 ID，其可见切片一并加入候选。
+    """
+    backend = get_search_backend()
+    index_terms = build_query_index_terms(question)
+    candidate_ids = None
+
+    if backend == 'fulltext' and has_fulltext_index():
+        candidate_ids = find_fulltext_candidate_ids(index_terms, visibility_filter)
+    if candidate_ids is None and backend != 'scan' and has_term_index():
+        candidate_ids = find_candidate_chunk_ids(index_terms, visibility_filter)
+
+    query = KnowledgeChunk.query.options(joinedload(KnowledgeChunk.chunk_content))
+    if candidate_ids is None:
+        # 索引尚未建立（旧数据未迁移）或显式选择 scan 时全量扫描
+        return query.filter(visibility_filter).all()
+    if vector_content_ids:
+        return query.filter(
+            visibility_filter,
+            or_(
+                KnowledgeChunk.id.in_(candidate_ids),
+                KnowledgeChunk.content_id.in_(list(vector_content_ids))
             )
-        ))
-    else:
+        ).all()
+    if not candidate_ids:
+        return []
+    return query.filter(KnowledgeChunk.id.in_(candidate_ids)).all()
+
+
+def search_knowledge_chunks(user_id: int, question: str, mode: str, top_k: int = 3) -> List[Dict[str, object]]:
+    if not question or mode == 'none_knowledge':
+        return []
+
+    partitions = _build_visibility_partitions(user_id, mode)
+    visibility_filter = _build_visibility_filter(partitions)
+    if visibility_filter is None:
         return []
 
-    candidates = query.all()
+    # 未启用向量检索时为空字典，仅使用词法得分
+    vector_scores = search_vector_scores(question, partitions)
+    candidates = _load_candidate_chunks(question, visibility_filter, list(vector_scores))
     if not candidates:
         return []
+    vector_weight = get_vector_weight()
 
     limit = max(1, min(int(top_k or 3) * 2, get_max_context_chunks()))
     min_score = get_min_search_score()
+    features = _build_query_features(question)
     scored_candidates = []
+    # 公有/私有切片共享正文，同一正文只打分一次
+    score_by_content: Dict[int, float] = {}
     for chunk in candidates:
-        score = _score_chunk(question, chunk.content, chunk.filename)
+        score = score_by_content.get(chunk.content_id)
+        if score is None:
+            content_compact, content_signature = _chunk_search_fields(chunk.chunk_content)
+            score = _score_chunk(features, content_compact, content_signature, chunk.filename)
+            vector_score = vector_scores.get(chunk.content_id)
+            if vector_score is not None:
+                score = round(score + vector_weight * max(0.0, vector_score), 4)
+            score_by_content[chunk.content_id] = score
         if score >= min_score:
             scored_candidates.append((score, chunk))
 
@@ -434,7 +707,7 @@ def search_knowledge_chunks(user_id: int, question: str, mode: str, top_k: int =
             'file_category': chunk.file_category,
             'chunk_index': chunk.chunk_index,
             'score': score,
-            'content': chunk.content
+            'content': chunk.chunk_content.content
         })
         file_hit_count[file_key] = file_hit_count.get(file_key, 0) + 1
 
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地知识库倒排索引。
+
+以字符 2/3-gram 与结构化编号为检索词，维护 检索词 -> 切片正文 的倒排表，
+检索时经切片记录按可见性过滤，只取命中检索词最多的候选切片交给打分函数。
+切片正文每个文件只存一份，公有/私有切片记录共享同一份倒排与全文索引。
+
+候选召回后端由 KNOWLEDGE_SEARCH_BACKEND 选择：
+- ngram: 上述倒排表（默认）
+- fulltext: 数据库全文索引，SQLite 使用 FTS5 trigram 虚拟表，MySQL 使用 ngram 解析器的 FULLTEXT 索引
+- scan: 不召回候选，全量打分
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import column, desc, func, inspect, table, text
+
+from models import db, KnowledgeChunk, KnowledgeChunkContent, KnowledgeTerm
+
+
+DEFAULT_CANDIDATE_LIMIT = 200
+TERM_INSERT_BATCH_SIZE = 5000
+MAX_TERM_LENGTH = 64
+
+SEARCH_BACKENDS = ('ngram', 'fulltext', 'scan')
+DEFAULT_SEARCH_BACKEND = 'ngram'
+FULLTEXT_TABLE_NAME = 'knowledge_chunk_fts'
+FULLTEXT_INDEX_NAME = 'ft_knowledge_chunk_contents_search_text'
+# SQLite trigram 分词器无法匹配少于 3 个字符的检索词
+FULLTEXT_MIN_TERM_LENGTH = 3
+
+# 全文索引是否存在，按数据库连接缓存；迁移脚本建立索引后需重启服务
+_fulltext_index_state: Dict[str, bool] = {}
+
+
+def get_candidate_limit() -> int:
+    try:
+        return max(20, int(os.environ.get('KNOWLEDGE_CANDIDATE_LIMIT', str(DEFAULT_CANDIDATE_LIMIT))))
+    except ValueError:
+        return DEFAULT_CANDIDATE_LIMIT
+
+
+def get_search_backend() -> str:
+    backend = os.environ.get('KNOWLEDGE_SEARCH_BACKEND', DEFAULT_SEARCH_BACKEND).strip().lower()
+    return backend if backend in SEARCH_BACKENDS else DEFAULT_SEARCH_BACKEND
+
+
+def add_content_terms(content_terms: Iterable[Tuple[int, Dict[str, int]]]) -> int:
+    """批量写入切片正文的检索词统计，返回写入的倒排记录数。"""
+    term_table = KnowledgeTerm.__table__
+    batch: List[Dict[str, object]] = []
+    total = 0
+
+    for content_id, term_counts in content_terms:
+        for term, tf in term_counts.items():
+            if not term or len(term) > MAX_TERM_LENGTH:
+                continue
+            batch.append({'term': term, 'content_id': content_id, 'tf': tf})
+            if len(batch) >= TERM_INSERT_BATCH_SIZE:
+                db.session.execute(term_table.insert(), batch)
+                total += len(batch)
+                batch = []
+
+    if batch:
+        db.session.execute(term_table.insert(), batch)
+        total += len(batch)
+    return total
+
+
+def remove_content_terms(content_ids: Sequence[int]) -> int:
+    if not content_ids:
+        return 0
+    return KnowledgeTerm.query.filter(
+        KnowledgeTerm.content_id.in_(list(content_ids))
+    ).delete(synchronize_session=False)
+
+
+def has_term_index() -> bool:
+    return db.session.query(KnowledgeTerm.content_id).first() is not None
+
+
+def find_candidate_chunk_ids(terms: Sequence[str], visibility_filter, limit: int | None = None) -> List[int]:
+    """返回命中检索词最多的候选切片 ID，按命中词数、词频降序。"""
+    terms = [term for term in dict.fromkeys(terms) if term and len(term) <= MAX_TERM_LENGTH]
+    if not terms:
+        return []
+
+    hits = func.count(KnowledgeTerm.term).label('hits')
+    term_frequency = func.sum(KnowledgeTerm.tf).label('term_frequency')
+    query = db.session.query(KnowledgeChunk.id, hits, term_frequency).join(
+        KnowledgeTerm,
+        KnowledgeTerm.content_id == KnowledgeChunk.content_id
+    ).filter(KnowledgeTerm.term.in_(terms))
+
+    if visibility_filter is not None:
+        query = query.filter(visibility_filter)
+
+    rows = query.group_by(KnowledgeChunk.id).order_by(
+        desc(hits),
+        desc(term_frequency)
+    ).limit(limit or get_candidate_limit()).all()
+    return [row.id for row in rows]
+
+
+def _dialect_name() -> str:
+    return db.engine.dialect.name
+
+
+def has_fulltext_index() -> bool:
+    cache_key = str(db.engine.url)
+    if cache_key not in _fulltext_index_state:
+        # 使用会话连接，避免 SQLite 写事务未提交时另开连接被锁
+        inspector = inspect(db.session.connection())
+        dialect_name = _dialect_name()
+        if dialect_name == 'sqlite':
+            exists = inspector.has_table(FULLTEXT_TABLE_NAME)
+        elif dialect_name == 'mysql':
+            exists = any(
+                index.get('name') == FULLTEXT_INDEX_NAME
+                for index in inspector.get_indexes(KnowledgeChunkContent.__tablename__)
+            )
+        else:
+            exists = False
+        _fulltext_index_state[cache_key] = exists
+    return _fulltext_index_state[cache_key]
+
+
+def create_fulltext_index() -> None:
+    """建立全文索引：SQLite 创建 FTS5 虚拟表，MySQL 在 search_text 上建 FULLTEXT 索引。"""
+    dialect_name = _dialect_name()
+    if dialect_name == 'sqlite':
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FULLTEXT_TABLE_NAME} "
+            "USING fts5(search_text, tokenize='trigram')"
+        ))
+    elif dialect_name == 'mysql':
+        db.session.execute(text(
+            f"ALTER TABLE {KnowledgeChunkContent.__tablename__} "
+            f"ADD FULLTEXT INDEX {FULLTEXT_INDEX_NAME} (search_text) WITH PARSER ngram"
+        ))
+    else:
+        raise ValueError(f'数据库 {dialect_name} 不支持全文索引')
+    _fulltext_index_state[str(db.engine.url)] = True
+
+
+def add_fulltext_rows(rows: Iterable[Tuple[int, str]]) -> int:
+    """
+    同步切片正文到 SQLite FTS5 虚拟表（rowid 为切片正文 ID）。
+
+    MySQL 的 FULLTEXT 索引建在 search_text 列上，由数据库自动维护，无需同步。
+    """
+    if _dialect_name() != 'sqlite' or not has_fulltext_index():
+        return 0
+    batch = [{'content_id': content_id, 'search_text': search_text} for content_id, search_text in rows]
+    if batch:
+        db.session.execute(text(
+            f"INSERT INTO {FULLTEXT_TABLE_NAME} (rowid, search_text) VALUES (:content_id, :search_text)"
+        ), batch)
+    return len(batch)
+
+
+def remove_fulltext_rows(content_ids: Sequence[int]) -> int:
+    if not content_ids or _dialect_name() != 'sqlite' or not has_fulltext_index():
+        return 0
+    fulltext_table = table(FULLTEXT_TABLE_NAME, column('rowid'))
+    return db.session.execute(
+        fulltext_table.delete().where(fulltext_table.c.rowid.in_(list(content_ids)))
+    ).rowcount
+
+
+def _quote_fts5_term(term: str) -> str:
+    return '"%s"' % term.replace('"', '""')
+
+
+def find_fulltext_candidate_ids(terms: Sequence[str], visibility_filter, limit: int | None = None) -> Optional[List[int]]:
+    """
+    通过数据库全文索引召回候选切片 ID，按相关度降序。
+
+    检索词不足以构造全文查询时返回 None，由调用方退回其他召回方式。
+    """
+    terms = [term for term in dict.fromkeys(terms) if term]
+    dialect_name = _dialect_name()
+    limit = limit or get_candidate_limit()
+
+    if dialect_name == 'sqlite':
+        terms = [term for term in terms if len(term) >= FULLTEXT_MIN_TERM_LENGTH]
+        if not terms:
+            return None
+        fulltext_table = table(FULLTEXT_TABLE_NAME, column('rowid'), column('rank'))
+        query = db.session.query(KnowledgeChunk.id).join(
+            fulltext_table,
+            fulltext_table.c.rowid == KnowledgeChunk.content_id
+        ).filter(
+            text(f"{FULLTEXT_TABLE_NAME} MATCH :match_expression")
+        ).params(
+            match_expression=' OR '.join(_quote_fts5_term(term) for term in terms)
+        )
+        order_by = fulltext_table.c.rank
+    elif dialect_name == 'mysql':
+        if not terms:
+            return None
+        relevance = text(
+            "MATCH (knowledge_chunk_contents.search_text) AGAINST (:match_expression IN NATURAL LANGUAGE MODE)"
+        ).bindparams(match_expression=' '.join(terms))
+        query = db.session.query(KnowledgeChunk.id).join(
+            KnowledgeChunkContent,
+            KnowledgeChunkContent.id == KnowledgeChunk.content_id
+        ).filter(relevance)
+        order_by = desc(relevance)
+    else:
+        return None
+
+    if visibility_filter is not None:
+        query = query.filter(visibility_filter)
+
+    rows = query.order_by(order_by).limit(limit).all()
+    return [row.id for row in rows]
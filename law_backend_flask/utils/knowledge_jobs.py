@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地知识库后台入库任务。
+
+上传到知识库的请求只写入任务表（knowledge_index_jobs）并提交到本进程的线程池，
+下载、文本抽取、切分与向量计算在后台并发执行，请求与 SSE 进度接口通过任务表查询进度。
+执行中的任务定期刷新 updated_at 作为心跳，超时判定只针对已失去心跳的任务（如进程重启后遗留）。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from flask import current_app
+
+from models import db, KnowledgeIndexJob, User, UserFile
+from utils.auth import log_user_activity
+from utils.knowledge_base import (
+    normalize_knowledge_types,
+    prepare_user_file_for_knowledge,
+    write_prepared_file_to_knowledge
+)
+from utils.knowledge_vectors import discard_file_vectors
+
+
+DEFAULT_INDEX_WORKERS = 2
+DEFAULT_JOB_TIMEOUT = 1800
+MAX_HEARTBEAT_INTERVAL = 60
+
+ACTIVE_JOB_STATUSES = ('pending', 'running')
+FINISHED_JOB_STATUSES = ('success', 'failed')
+
+_index_executor: Optional[ThreadPoolExecutor] = None
+_index_executor_lock = threading.Lock()
+# SQLite 只允许单个写事务，并发任务的写库阶段需串行，准备阶段（下载、抽取、切分、向量计算）仍并行
+_sqlite_write_lock = threading.Lock()
+
+
+def get_index_workers() -> int:
+    try:
+        return max(1, int(os.environ.get('KNOWLEDGE_INDEX_WORKERS', str(DEFAULT_INDEX_WORKERS))))
+    except ValueError:
+        return DEFAULT_INDEX_WORKERS
+
+
+def get_job_timeout() -> int:
+    """任务超过该时长没有心跳（如进程重启导致中断）时视为失败。"""
+    try:
+        return max(60, int(os.environ.get('KNOWLEDGE_INDEX_JOB_TIMEOUT_SECONDS', str(DEFAULT_JOB_TIMEOUT))))
+    except ValueError:
+        return DEFAULT_JOB_TIMEOUT
+
+
+def _get_index_executor() -> ThreadPoolExecutor:
+    global _index_executor
+    with _index_executor_lock:
+        if _index_executor is None:
+            _index_executor = ThreadPoolExecutor(
+                max_workers=get_index_workers(),
+                thread_name_prefix='knowledge-index'
+            )
+        return _index_executor
+
+
+def get_heartbeat_interval() -> int:
+    return min(MAX_HEARTBEAT_INTERVAL, get_job_timeout() // 3)
+
+
+def expire_stale_jobs() -> int:
+    """将超时没有心跳的未结束任务标记为失败，避免进度接口一直等待。"""
+    deadline = datetime.utcnow() - timedelta(seconds=get_job_timeout())
+    expired = KnowledgeIndexJob.query.filter(
+        KnowledgeIndexJob.status.in_(ACTIVE_JOB_STATUSES),
+        KnowledgeIndexJob.updated_at < deadline
+    ).update({
+        'status': 'failed',
+        'error_message': '任务超时或服务重启导致中断，请重新上传',
+        'finished_at': datetime.utcnow()
+    }, synchronize_session=False)
+    # 无论是否更新都结束事务，避免 SQLite 下长时间持有写锁
+    db.session.commit()
+    return expired
+
+
+def get_active_job_file_ids(user_file_ids: Sequence[int]) -> set:
+    if not user_file_ids:
+        return set()
+    rows = db.session.query(KnowledgeIndexJob.user_file_id).filter(
+        KnowledgeIndexJob.user_file_id.in_(list(user_file_ids)),
+        KnowledgeIndexJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).all()
+    return {row.user_file_id for row in rows}
+
+
+def enqueue_knowledge_jobs(user_id: int, file_types: Sequence[Tuple[UserFile, Sequence[str]]]) -> Tuple[str, List[KnowledgeIndexJob]]:
+    """
+    创建入库任务并提交到后台线程池
+
+    Args:
+        user_id: 提交任务的用户ID
+        file_types: [(用户文件, 待上传的知识库类型), ...]，调用方负责过滤已上传类型与进行中的文件
+
+    Returns:
+        (批次ID, 任务列表)
+    """
+    batch_id = uuid.uuid4().hex
+    jobs = []
+    for user_file, knowledge_types in file_types:
+        job = KnowledgeIndexJob(
+            batch_id=batch_id,
+            user_id=user_id,
+            user_file_id=user_file.id,
+            filename=user_file.filename,
+            knowledge_types=','.join(normalize_knowledge_types(knowledge_types)),
+            status='pending'
+        )
+        db.session.add(job)
+        jobs.append(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    executor = _get_index_executor()
+    for job in jobs:
+        executor.submit(_run_job, app, job.id)
+
+    current_app.logger.info(
+        "本地知识库入库任务已提交: batch_id=%s user_id=%s jobs=%s",
+        batch_id,
+        user_id,
+        len(jobs)
+    )
+    return batch_id, jobs
+
+
+def _claim_job(job_id: int) -> bool:
+    """原子地将任务从 pending 置为 running，防止重复执行。"""
+    now = datetime.utcnow()
+    claimed = KnowledgeIndexJob.query.filter(
+        KnowledgeIndexJob.id == job_id,
+        KnowledgeIndexJob.status == 'pending'
+    ).update({
+        'status': 'running',
+        'started_at': now,
+        'updated_at': now
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+def _finish_job(job_id: int, status: str, error_message: str | None = None, chunk_count: int | None = None) -> None:
+    KnowledgeIndexJob.query.filter(KnowledgeIndexJob.id == job_id).update({
+        'status': status,
+        'error_message': error_message,
+        'chunk_count': chunk_count,
+        'finished_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def _heartbeat_loop(app, job_id: int, stop_event: threading.Event) -> None:
+    """任务执行期间定期刷新 updated_at，避免长时间运行的任务被 expire_stale_jobs 误判为中断。"""
+    with app.app_context():
+        try:
+            while not stop_event.wait(get_heartbeat_interval()):
+                try:
+                    KnowledgeIndexJob.query.filter(
+                        KnowledgeIndexJob.id == job_id,
+                        KnowledgeIndexJob.status == 'running'
+                    ).update({'updated_at': datetime.utcnow()}, synchronize_session=False)
+                    db.session.commit()
+                except Exception as exc:
+                    # SQLite 写锁被其他任务占用时跳过本次心跳，下一轮重试
+                    db.session.rollback()
+                    app.logger.warning("入库任务心跳更新失败: job_id=%s error=%s", job_id, str(exc))
+        finally:
+            db.session.remove()
+
+
+def _start_heartbeat(app, job_id: int) -> threading.Event:
+    stop_event = threading.Event()
+    threading.Thread(
+        target=_heartbeat_loop,
+        args=(app, job_id, stop_event),
+        name=f'knowledge-index-heartbeat-{job_id}',
+        daemon=True
+    ).start()
+    return stop_event
+
+
+def _run_job(app, job_id: int) -> None:
+    with app.app_context():
+        heartbeat = None
+        prepared = None
+        try:
+            if not _claim_job(job_id):
+                return
+            heartbeat = _start_heartbeat(app, job_id)
+
+            job = db.session.get(KnowledgeIndexJob, job_id)
+            user_file = db.session.get(UserFile, job.user_file_id)
+            owner_user = db.session.get(User, job.user_id)
+            if user_file is None or owner_user is None:
+                _finish_job(job_id, 'failed', '文件不存在或已被删除')
+                return
+
+            knowledge_types = job.get_knowledge_types()
+            if not normalize_knowledge_types(knowledge_types):
+                raise ValueError('未提供有效的知识库类型')
+
+            # 准备阶段不写库，在写锁之外与其他任务并行执行
+            prepared = prepare_user_file_for_knowledge(user_file)
+            # 结束准备阶段的只读事务，写库阶段重新开始
+            db.session.commit()
+
+            write_lock = _sqlite_write_lock if db.engine.dialect.name == 'sqlite' else nullcontext()
+            with write_lock:
+                result = write_prepared_file_to_knowledge(user_file, owner_user, knowledge_types, prepared)
+                for knowledge_type in knowledge_types:
+                    if knowledge_type == 'public':
+                        user_file.public_knowledge_uploaded = True
+                    elif knowledge_type == 'private':
+                        user_file.private_knowledge_uploaded = True
+                db.session.commit()
+
+            log_user_activity(owner_user.id, 'upload_to_knowledge', {
+                'file_id': user_file.id,
+                'filename': user_file.filename,
+                'minio_path': user_file.minio_path,
+                'knowledge_types': knowledge_types,
+                'job_id': job_id
+            })
+            _finish_job(job_id, 'success', chunk_count=result.get('chunk_count', 0))
+
+        except Exception as exc:
+            db.session.rollback()
+            app.logger.error("本地知识库入库任务失败: job_id=%s error=%s", job_id, str(exc))
+            try:
+                _finish_job(job_id, 'failed', str(exc))
+            except Exception as finish_error:
+                db.session.rollback()
+                app.logger.error("入库任务状态更新失败: job_id=%s error=%s", job_id, str(finish_error))
+        finally:
+            if heartbeat is not None:
+                heartbeat.set()
+            if prepared is not None:
+                # 写入失败时删除未启用的向量临时文件
+                discard_file_vectors(prepared['vector_path'])
+            db.session.remove()
+
+
+def get_batch_jobs(batch_id: str, user_id: int) -> List[KnowledgeIndexJob]:
+    return KnowledgeIndexJob.query.filter_by(
+        batch_id=batch_id,
+        user_id=user_id
+    ).order_by(KnowledgeIndexJob.id).all()
+
+
+def summarize_jobs(jobs: Sequence[KnowledgeIndexJob]) -> Dict[str, int]:
+    summary = {status: 0 for status in ACTIVE_JOB_STATUSES + FINISHED_JOB_STATUSES}
+    for job in jobs:
+        summary[job.status] = summary.get(job.status, 0) + 1
+    summary['total'] = len(jobs)
+    summary['finished'] = summary['success'] + summary['failed']
+    return summary
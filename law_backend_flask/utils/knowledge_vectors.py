@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地知识库向量检索（可选）。
+
+设置 KNOWLEDGE_EMBEDDING_MODEL 为本地句向量模型路径（如 bge-large-zh-v1.5）后启用：
+入库时在 CPU 上计算切片正文的归一化向量，每个文件保存为一个 float16 矩阵（.npy，行号即 chunk_index）。
+检索时按可见性分区（公有知识库、每个用户的私有知识库）把分区内所有文件的向量拼成一个 float16 矩阵，
+连同对应的正文 ID 数组保存在向量目录的 partitions 子目录下，以只读内存映射打开，多个 worker 进程共享操作系统页缓存；
+每次查询对分区矩阵分块做矩阵乘法并按内积取 top-k，与词法得分融合。
+分区内切片记录或向量文件变化后由首个发现的进程重建分区文件。
+
+依赖 numpy 与 sentence-transformers，未安装或未配置模型时自动关闭，仅使用词法检索。
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from flask import current_app
+from sqlalchemy import func
+
+from models import db, KnowledgeChunk
+
+
+DEFAULT_VECTOR_TOP_K = 50
+DEFAULT_VECTOR_WEIGHT = 30.0
+DEFAULT_EMBED_BATCH_SIZE = 16
+PARTITION_CACHE_SIZE = 64
+# 分块计算内积，避免把整个 float16 分区矩阵一次性转换为 float32
+SCORE_BLOCK_ROWS = 65536
+VECTORS_VERSION_FILENAME = '.version'
+PARTITION_DIRNAME = 'partitions'
+
+_embedder = None
+_embedder_lock = threading.Lock()
+_embedder_unavailable = False
+
+# 分区键 -> (分区文件版本, 内存映射矩阵, 正文ID数组)；只缓存已打开的映射，数据本身在页缓存中
+_partition_cache: 'OrderedDict[object, Tuple[str, object, object]]' = OrderedDict()
+_partition_cache_lock = threading.Lock()
+
+
+def get_embedding_model_path() -> str:
+    return os.environ.get('KNOWLEDGE_EMBEDDING_MODEL', '').strip()
+
+
+def get_vector_top_k() -> int:
+    try:
+        return max(1, int(os.environ.get('KNOWLEDGE_VECTOR_TOP_K', str(DEFAULT_VECTOR_TOP_K))))
+    except ValueError:
+        return DEFAULT_VECTOR_TOP_K
+
+
+def get_vector_weight() -> float:
+    """向量相似度（-1~1）折算到词法得分量纲的权重。"""
+    try:
+        return max(0.0, float(os.environ.get('KNOWLEDGE_VECTOR_WEIGHT', str(DEFAULT_VECTOR_WEIGHT))))
+    except ValueError:
+        return DEFAULT_VECTOR_WEIGHT
+
+
+def get_embed_batch_size() -> int:
+    try:
+        return max(1, int(os.environ.get('KNOWLEDGE_EMBED_BATCH_SIZE', str(DEFAULT_EMBED_BATCH_SIZE))))
+    except ValueError:
+        return DEFAULT_EMBED_BATCH_SIZE
+
+
+def get_vector_dir() -> str:
+    vector_dir = os.environ.get('KNOWLEDGE_VECTOR_DIR')
+    if not vector_dir:
+        base_dir = current_app.config.get('DATA_FOLDER') or os.getcwd()
+        vector_dir = os.path.join(base_dir, 'knowledge_vectors')
+    os.makedirs(vector_dir, exist_ok=True)
+    return vector_dir
+
+
+def _vector_path(user_file_id: int) -> str:
+    return os.path.join(get_vector_dir(), f'{user_file_id}.npy')
+
+
+def _vectors_version_path() -> str:
+    return os.path.join(get_vector_dir(), VECTORS_VERSION_FILENAME)
+
+
+def _touch_vectors_version() -> None:
+    """向量文件写入或删除后更新版本标记，各 worker 进程据此让分区矩阵失效。"""
+    path = _vectors_version_path()
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+def _get_vectors_version() -> int:
+    try:
+        return os.stat(_vectors_version_path()).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _get_embedder():
+    """进程内共享一个 CPU 句向量模型，首次使用时加载。"""
+    global _embedder, _embedder_unavailable
+    if _embedder is not None or _embedder_unavailable:
+        return _embedder
+
+    with _embedder_lock:
+        if _embedder is not None or _embedder_unavailable:
+            return _embedder
+        model_path = get_embedding_model_path()
+        if not model_path:
+            _embedder_unavailable = True
+            return None
+        try:
+            import numpy  # noqa: F401
+            from sentence_transformers import SentenceTransformer
+        except ImportError as exc:
+            current_app.logger.warning("向量检索依赖未安装，已关闭向量检索: %s", str(exc))
+            _embedder_unavailable = True
+            return None
+        try:
+            _embedder = SentenceTransformer(model_path, device='cpu')
+        except Exception as exc:
+            current_app.logger.warning("句向量模型加载失败，已关闭向量检索: %s", str(exc))
+            _embedder_unavailable = True
+            return None
+        current_app.logger.info("句向量模型加载完成: %s", model_path)
+        return _embedder
+
+
+def is_vector_search_enabled() -> bool:
+    return _get_embedder() is not None
+
+
+def _encode(texts: Sequence[str]):
+    import numpy as np
+
+    embedder = _get_embedder()
+    texts = list(texts)
+    batch_size = get_embed_batch_size()
+    parts = []
+    for start in range(0, len(texts), batch_size):
+        # 模型推理本身已按 batch 并行，串行调用避免多个入库线程同时占满 CPU；
+        # 每批结束即释放锁，查询的问题编码不必等待整个文件的向量计算完成
+        with _embedder_lock:
+            parts.append(embedder.encode(
+                texts[start:start + batch_size],
+                batch_size=batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            ))
+    return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+
+def encode_file_vectors(user_file_id: int, chunks: Iterable[str], overwrite: bool = True) -> str | None:
+    """
+    计算文件切片向量并写入临时文件（float16 矩阵），不影响正在使用的向量文件
+
+    Args:
+        user_file_id: 文件ID
+        chunks: 按 chunk_index 排列的切片正文，可为生成器，按 KNOWLEDGE_EMBED_BATCH_SIZE 分批消费
+        overwrite: 为 False 时向量文件已存在则跳过（正文未变化的重复入库）
+
+    Returns:
+        临时文件路径，切片写入数据库后由 install_file_vectors 启用；未计算时返回 None
+    """
+    if not is_vector_search_enabled():
+        return None
+
+    import numpy as np
+
+    path = _vector_path(user_file_id)
+    if not overwrite and os.path.exists(path):
+        return None
+
+    batch_size = get_embed_batch_size()
+    parts = []
+    batch: List[str] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            parts.append(np.asarray(_encode(batch), dtype=np.float16))
+            batch = []
+    if batch:
+        parts.append(np.asarray(_encode(batch), dtype=np.float16))
+    if not parts:
+        return None
+
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as file_obj:
+        np.save(file_obj, np.concatenate(parts))
+    return temp_path
+
+
+def install_file_vectors(user_file_id: int, temp_path: str) -> None:
+    os.replace(temp_path, _vector_path(user_file_id))
+    _touch_vectors_version()
+
+
+def discard_file_vectors(temp_path: str | None) -> None:
+    if not temp_path:
+        return
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+
+
+def write_file_vectors(user_file_id: int, chunks: Iterable[str], overwrite: bool = True) -> bool:
+    """计算并直接启用文件切片向量（迁移脚本使用），返回是否写入了向量文件。"""
+    temp_path = encode_file_vectors(user_file_id, chunks, overwrite=overwrite)
+    if temp_path is None:
+        return False
+    install_file_vectors(user_file_id, temp_path)
+    return True
+
+
+def remove_file_vectors(user_file_id: int) -> None:
+    if not get_embedding_model_path():
+        return
+    try:
+        os.remove(_vector_path(user_file_id))
+    except OSError:
+        return
+    _touch_vectors_version()
+
+
+def _get_partition_signature(partition_filter) -> tuple:
+    """分区签名：切片记录数、最大切片ID与向量文件版本，任一变化即说明分区内容有更新。"""
+    row_count, max_chunk_id = db.session.query(
+        func.count(KnowledgeChunk.id),
+        func.max(KnowledgeChunk.id)
+    ).filter(partition_filter).one()
+    return row_count, max_chunk_id, _get_vectors_version()
+
+
+def _partition_name(partition_key) -> str:
+    if isinstance(partition_key, tuple):
+        return '-'.join(str(part) for part in partition_key)
+    return str(partition_key)
+
+
+def _partition_base_path(partition_key) -> str:
+    partition_dir = os.path.join(get_vector_dir(), PARTITION_DIRNAME)
+    os.makedirs(partition_dir, exist_ok=True)
+    return os.path.join(partition_dir, _partition_name(partition_key))
+
+
+def _read_partition_meta(base_path: str) -> dict | None:
+    try:
+        with open(f'{base_path}.json', 'r', encoding='utf-8') as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _build_partition_files(partition_key, partition_filter, signature: tuple) -> str | None:
+    """
+    把分区内所有文件的切片向量写入一个 float16 矩阵文件与正文ID数组文件
+
+    Returns:
+        分区文件版本号；分区内没有向量时返回 None
+    """
+    import numpy as np
+
+    # 同一分区内一个文件只有一种知识库类型，(文件, 切片序号) 不会重复
+    rows = db.session.query(
+        KnowledgeChunk.user_file_id,
+        KnowledgeChunk.chunk_index,
+        KnowledgeChunk.content_id
+    ).filter(partition_filter).order_by(KnowledgeChunk.user_file_id).all()
+
+    content_ids_by_file: Dict[int, Dict[int, int]] = {}
+    for row in rows:
+        content_ids_by_file.setdefault(row.user_file_id, {})[row.chunk_index] = row.content_id
+
+    # 先确定每个文件可用的行，再按总行数一次性分配输出文件，写入时逐文件复制
+    selections = []
+    total_rows, dimension = 0, None
+    for user_file_id, content_ids in content_ids_by_file.items():
+        try:
+            file_matrix = np.load(_vector_path(user_file_id), mmap_mode='r')
+        except (OSError, ValueError):
+            continue
+        chunk_indexes = [chunk_index for chunk_index in sorted(content_ids) if chunk_index < file_matrix.shape[0]]
+        if not chunk_indexes or (dimension is not None and file_matrix.shape[1] != dimension):
+            continue
+        dimension = file_matrix.shape[1]
+        selections.append((file_matrix, chunk_indexes, [content_ids[chunk_index] for chunk_index in chunk_indexes]))
+        total_rows += len(chunk_indexes)
+
+    base_path = _partition_base_path(partition_key)
+    token = uuid.uuid4().hex if selections else None
+    if token:
+        matrix_temp = f'{base_path}.{token}.npy.tmp'
+        matrix = np.lib.format.open_memmap(matrix_temp, mode='w+', dtype=np.float16, shape=(total_rows, dimension))
+        content_id_array = np.empty(total_rows, dtype=np.int64)
+        offset = 0
+        for file_matrix, chunk_indexes, content_ids in selections:
+            matrix[offset:offset + len(chunk_indexes)] = file_matrix[chunk_indexes]
+            content_id_array[offset:offset + len(chunk_indexes)] = content_ids
+            offset += len(chunk_indexes)
+        matrix.flush()
+        del matrix
+        np.save(f'{base_path}.{token}.ids.npy', content_id_array)
+        os.replace(matrix_temp, f'{base_path}.{token}.npy')
+
+    # 元数据最后写入，其他进程读到新版本号时分区文件已完整
+    meta_temp = f'{base_path}.json.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(meta_temp, 'w', encoding='utf-8') as meta_file:
+        json.dump({'signature': list(signature), 'token': token}, meta_file)
+    os.replace(meta_temp, f'{base_path}.json')
+
+    # 删除旧版本的分区文件；其他进程已打开的内存映射在关闭前仍然有效
+    for path in glob.glob(f'{glob.escape(base_path)}.*.npy'):
+        if not token or not os.path.basename(path).startswith(f'{os.path.basename(base_path)}.{token}.'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return token
+
+
+def _open_partition_files(partition_key, base_path: str, token: str):
+    import numpy as np
+
+    with _partition_cache_lock:
+        cached = _partition_cache.get(partition_key)
+        if cached is not None and cached[0] == token:
+            _partition_cache.move_to_end(partition_key)
+            return cached[1], cached[2]
+
+    matrix = np.load(f'{base_path}.{token}.npy', mmap_mode='r')
+    content_ids = np.load(f'{base_path}.{token}.ids.npy', mmap_mode='r')
+    with _partition_cache_lock:
+        _partition_cache[partition_key] = (token, matrix, content_ids)
+        _partition_cache.move_to_end(partition_key)
+        while len(_partition_cache) > PARTITION_CACHE_SIZE:
+            _partition_cache.popitem(last=False)
+    return matrix, content_ids
+
+
+def _get_partition_matrix(partition_key, partition_filter):
+    """返回分区的 (内存映射 float16 矩阵, 正文ID数组)，分区文件过期或缺失时重建；分区内没有向量时返回 (None, None)。"""
+    signature = _get_partition_signature(partition_filter)
+    base_path = _partition_base_path(partition_key)
+    meta = _read_partition_meta(base_path)
+    if meta is not None and meta.get('signature') == list(signature):
+        if not meta.get('token'):
+            return None, None
+        try:
+            return _open_partition_files(partition_key, base_path, meta['token'])
+        except (OSError, ValueError):
+            # 分区文件被并发重建的进程替换，按当前签名重建
+            pass
+
+    token = _build_partition_files(partition_key, partition_filter, signature)
+    if token is None:
+        return None, None
+    return _open_partition_files(partition_key, base_path, token)
+
+
+def _score_matrix(matrix, query_vector):
+    import numpy as np
+
+    scores = np.empty(matrix.shape[0], dtype=np.float32)
+    for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+        scores[start:start + block.shape[0]] = block @ query_vector
+    return scores
+
+
+def search_vector_scores(question: str, partitions: Sequence[Tuple[object, object]], top_k: int | None = None) -> Dict[int, float]:
+    """
+    向量检索可见切片正文
+
+    Args:
+        question: 用户问题
+        partitions: 可见性分区列表 [(分区键, 分区过滤条件), ...]，如公有知识库、当前用户的私有知识库
+        top_k: 返回的正文数，默认 KNOWLEDGE_VECTOR_TOP_K
+
+    Returns:
+        {正文ID: 余弦相似度}，按相似度取前 top_k 个；未启用向量检索时返回空字典
+    """
+    if not question or not partitions or not is_vector_search_enabled():
+        return {}
+
+    import numpy as np
+
+    query_vector = np.asarray(_encode([question])[0], dtype=np.float32)
+    limit = top_k or get_vector_top_k()
+    vector_scores: Dict[int, float] = {}
+    for partition_key, partition_filter in partitions:
+        matrix, content_ids = _get_partition_matrix(partition_key, partition_filter)
+        if matrix is None:
+            continue
+        scores = _score_matrix(matrix, query_vector)
+        partition_limit = min(limit, scores.size)
+        top_positions = np.argpartition(-scores, partition_limit - 1)[:partition_limit]
+        # 公有/私有切片共享正文，同一正文在多个分区命中时得分相同
+        for position in top_positions:
+            vector_scores[int(content_ids[position])] = float(scores[position])
+
+    if len(vector_scores) <= limit:
+        return vector_scores
+    return dict(sorted(vector_scores.items(), key=lambda item: item[1], reverse=True)[:limit])
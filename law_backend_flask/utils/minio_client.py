@@ -10,13 +10,17 @@ from minio.error import S3Error
 from flask import current_app
 import uuid
 import os
+import shutil
 import io
-from datetime import timedelta
+from datetime import datetime, timedelta
 import logging
 
 # 全局MinIO客户端
 minio_client = None
 
+# 流式下载时每次读取的块大小
+STREAM_CHUNK_SIZE = 256 * 1024
+
 
 def is_minio_disabled() -> bool:
     """Return True when MinIO integration should be skipped (local/dev without MinIO)."""
@@ -180,6 +184,109 @@ def download_file(bucket_name, object_name):
         current_app.logger.error(f"文件下载异常: {str(e)}")
         raise Exception(f"文件下载异常: {str(e)}")
 
+def download_file_to_path(bucket_name, object_name, file_path):
+    """将MinIO对象流式写入本地文件，不在内存中保留完整内容
+
+    Args:
+        bucket_name: bucket名称
+        object_name: 对象名称
+        file_path: 本地目标路径
+
+    Returns:
+        str: 本地文件路径
+    """
+    try:
+        if use_local_storage():
+            local_path = get_local_object_path(bucket_name, object_name)
+            if not os.path.exists(local_path):
+                raise FileNotFoundError(f'文件不存在: {object_name}')
+            shutil.copyfile(local_path, file_path)
+            return file_path
+
+        minio_client.fget_object(bucket_name, object_name, file_path)
+        return file_path
+    except S3Error as e:
+        current_app.logger.error(f"MinIO下载错误: {str(e)}")
+        raise Exception(f"文件下载失败: {str(e)}")
+    except Exception as e:
+        current_app.logger.error(f"文件下载异常: {str(e)}")
+        raise Exception(f"文件下载异常: {str(e)}")
+
+def stat_file(bucket_name, object_name):
+    """获取对象元数据，不读取文件内容
+
+    Args:
+        bucket_name: bucket名称
+        object_name: 对象名称
+
+    Returns:
+        dict: size / etag / last_modified / content_type，对象不存在时返回 None
+    """
+    try:
+        if use_local_storage():
+            local_path = get_local_object_path(bucket_name, object_name)
+            if not os.path.isfile(local_path):
+                return None
+            file_stat = os.stat(local_path)
+            return {
+                'size': file_stat.st_size,
+                'etag': f"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}",
+                'last_modified': datetime.utcfromtimestamp(file_stat.st_mtime),
+                'content_type': get_content_type(object_name)
+            }
+
+        stat = minio_client.stat_object(bucket_name, object_name)
+        return {
+            'size': stat.size,
+            'etag': stat.etag,
+            'last_modified': stat.last_modified,
+            'content_type': stat.content_type or get_content_type(object_name)
+        }
+    except S3Error as e:
+        if e.code in ('NoSuchKey', 'NoSuchBucket', 'NoSuchObject'):
+            return None
+        current_app.logger.error(f"MinIO获取元数据错误: {str(e)}")
+        raise Exception(f"获取文件信息失败: {str(e)}")
+
+def iter_file_range(bucket_name, object_name, offset=0, length=None):
+    """按块流式读取对象的指定区间，读取完毕或中断时释放连接
+
+    Args:
+        bucket_name: bucket名称
+        object_name: 对象名称
+        offset: 起始字节
+        length: 读取长度，None 表示读到末尾
+
+    Returns:
+        generator: 字节块生成器
+    """
+    if use_local_storage():
+        local_path = get_local_object_path(bucket_name, object_name)
+        return _iter_local_file_range(local_path, offset, length)
+
+    response = minio_client.get_object(bucket_name, object_name, offset=offset, length=length or 0)
+    return _iter_minio_response(response)
+
+def _iter_local_file_range(local_path, offset, length):
+    with open(local_path, 'rb') as local_file:
+        local_file.seek(offset)
+        remaining = length
+        while remaining is None or remaining > 0:
+            block = local_file.read(STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            yield block
+
+def _iter_minio_response(response):
+    try:
+        for block in response.stream(STREAM_CHUNK_SIZE):
+            yield block
+    finally:
+        response.close()
+        response.release_conn()
+
 def delete_file(bucket_name, object_name):
     """从MinIO删除文件
     
@@ -311,6 +418,22 @@ def get_content_type(filename):
     
     return content_types.get(extension, 'application/octet-stream')
 
+def resolve_minio_path(minio_path):
+    """解析MinIO路径
+
+    Args:
+        minio_path: MinIO文件路径 (格式: bucket_name/object_name 或 object_name)
+
+    Returns:
+        tuple: (bucket_name, object_name)
+    """
+    if '/' in minio_path and not minio_path.startswith('generals/') and not minio_path.startswith('cases/'):
+        # 完整路径格式: bucket_name/object_name
+        bucket_name, object_name = minio_path.split('/', 1)
+        return bucket_name, object_name
+    # 使用默认bucket
+    return current_app.config['MINIO_BUCKET_NAME'], minio_path
+
 def download_file_by_path(minio_path):
     """根据MinIO路径下载文件并返回给远程服务器
     
@@ -321,16 +444,7 @@ def download_file_by_path(minio_path):
         tuple: (file_data, filename, content_type) 或 None
     """
     try:
-        # 解析路径
-        if '/' in minio_path and not minio_path.startswith('generals/') and not minio_path.startswith('cases/'):
-            # 完整路径格式: bucket_name/object_name
-            parts = minio_path.split('/', 1)
-            bucket_name = parts[0]
-            object_name = parts[1]
-        else:
-            # 使用默认bucket
-            bucket_name = current_app.config['MINIO_BUCKET_NAME']
-            object_name = minio_path
+        bucket_name, object_name = resolve_minio_path(minio_path)
         
         if use_local_storage():
             local_path = get_local_object_path(bucket_name, object_name)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件文本抽取工具。
+
+PDF / DOCX 按页、按段落流式读取（实现见 utils.extract_worker），文件在常驻的抽取子进程中解析
+（并发数受限）并带单文件超时，抽取结果按文件内容哈希缓存到磁盘，重复导入同一文件时直接命中缓存。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from flask import current_app
+
+from utils.extract_worker import extract_text_from_path
+
+
+DEFAULT_EXTRACT_TIMEOUT = 120
+DEFAULT_EXTRACT_WORKERS = 2
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_extract_slots: Optional[threading.BoundedSemaphore] = None
+_extract_slots_lock = threading.Lock()
+# 常驻的单进程抽取执行器，按并发名额复用，避免每个文件重复启动解释器与导入解析库
+_idle_executors: List[ProcessPoolExecutor] = []
+_idle_executors_lock = threading.Lock()
+
+
+def get_extract_timeout() -> int:
+    try:
+        return max(5, int(os.environ.get('KNOWLEDGE_EXTRACT_TIMEOUT_SECONDS', str(DEFAULT_EXTRACT_TIMEOUT))))
+    except ValueError:
+        return DEFAULT_EXTRACT_TIMEOUT
+
+
+def get_extract_workers() -> int:
+    """抽取进程数；设置为 0 时在当前进程内同步抽取。"""
+    try:
+        return max(0, int(os.environ.get('KNOWLEDGE_EXTRACT_WORKERS', str(DEFAULT_EXTRACT_WORKERS))))
+    except ValueError:
+        return DEFAULT_EXTRACT_WORKERS
+
+
+def get_extract_cache_dir() -> str:
+    cache_dir = os.environ.get('KNOWLEDGE_EXTRACT_CACHE_DIR')
+    if not cache_dir:
+        base_dir = current_app.config.get('DATA_FOLDER') or os.getcwd()
+        cache_dir = os.path.join(base_dir, 'extract_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def compute_file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file_obj:
+        for block in iter(lambda: file_obj.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _get_extract_slots() -> threading.BoundedSemaphore:
+    global _extract_slots
+    with _extract_slots_lock:
+        if _extract_slots is None:
+            _extract_slots = threading.BoundedSemaphore(get_extract_workers())
+        return _extract_slots
+
+
+def _checkout_executor() -> ProcessPoolExecutor:
+    """取出一个空闲的抽取进程；调用方已持有并发名额，空闲列表为空时才新建。"""
+    with _idle_executors_lock:
+        if _idle_executors:
+            return _idle_executors.pop()
+    # 单进程执行器，超时时可以只终止该文件所在的进程；使用 spawn，避免在 gevent 打过补丁的 worker 中 fork
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _release_executor(executor: ProcessPoolExecutor) -> None:
+    with _idle_executors_lock:
+        _idle_executors.append(executor)
+
+
+def _terminate_executor(executor: ProcessPoolExecutor) -> None:
+    """终止执行器的工作进程并丢弃该执行器，下次使用时重新创建。"""
+    for process in list((getattr(executor, '_processes', None) or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_extract_process(file_path: str, filename: str, timeout: int) -> str:
+    """在常驻抽取进程中抽取文件，超时只终止该文件所在的进程，不影响其他正在抽取的文件。"""
+    with _get_extract_slots():
+        executor = _checkout_executor()
+        try:
+            future = executor.submit(extract_text_from_path, file_path, filename)
+            text = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            _terminate_executor(executor)
+            raise ValueError(f'文件解析超时（超过 {timeout} 秒），请拆分文件后重试')
+        except BrokenProcessPool:
+            _terminate_executor(executor)
+            raise RuntimeError('文件解析进程异常退出，请重试')
+        except BaseException:
+            # 抽取函数自身抛出的异常（如不支持的文件类型）不影响进程复用
+            _release_executor(executor)
+            raise
+        _release_executor(executor)
+        return text
+
+
+def _load_cached_text(content_hash: str) -> Optional[str]:
+    cache_path = os.path.join(get_extract_cache_dir(), f'{content_hash}.txt')
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as cache_file:
+            return cache_file.read()
+    except OSError:
+        return None
+
+
+def _store_cached_text(content_hash: str, text: str) -> None:
+    cache_dir = get_extract_cache_dir()
+    try:
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=cache_dir, delete=False) as temp_file:
+            temp_file.write(text)
+            temp_path = temp_file.name
+        os.replace(temp_path, os.path.join(cache_dir, f'{content_hash}.txt'))
+    except OSError as exc:
+        current_app.logger.warning("文本抽取缓存写入失败: hash=%s error=%s", content_hash, str(exc))
+
+
+def extract_text_cached(file_path: str, filename: str, timeout: int | None = None) -> str:
+    """抽取磁盘文件文本：优先读取内容哈希缓存，未命中时在抽取子进程中解析并限制单文件耗时。"""
+    content_hash = compute_file_hash(file_path)
+    cached_text = _load_cached_text(content_hash)
+    if cached_text is not None:
+        current_app.logger.info("文本抽取命中缓存: filename=%s hash=%s", filename, content_hash[:12])
+        return cached_text
+
+    if get_extract_workers() == 0:
+        text = extract_text_from_path(file_path, filename)
+    else:
+        text = _run_extract_process(file_path, filename, timeout or get_extract_timeout())
+
+    _store_cached_text(content_hash, text)
+    return text
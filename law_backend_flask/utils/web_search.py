@@ -2,23 +2,35 @@
 # -*- coding: utf-8 -*-
 """
 零密钥联网搜索工具。
+
+多个搜索源按顺序对冲请求：首选源在 WEB_SEARCH_HEDGE_DELAY_SECONDS 内未返回（或失败）时
+并行发起下一个源，取最先返回的非空结果；结果按规范化查询缓存 WEB_SEARCH_CACHE_TTL_SECONDS 秒。
 """
 
 from __future__ import annotations
 
 import os
 import re
+import threading
+import time
 import xml.etree.ElementTree as ET
-from typing import Dict, List
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
-import requests
 from bs4 import BeautifulSoup
 
+from utils.http_client import get_http_session
+
 
 DEFAULT_WEB_SEARCH_TIMEOUT = 15
 DEFAULT_WEB_RESULT_LIMIT = 3
 DEFAULT_WEB_SEARCH_PROVIDERS = ("sogou", "bing_rss")
+DEFAULT_HEDGE_DELAY = 1.5
+DEFAULT_CACHE_TTL = 600
+CACHE_MAX_ENTRIES = 512
+SEARCH_WORKERS = 8
 DEFAULT_USER_AGENT = (
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
     "(KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
@@ -55,6 +67,64 @@ def get_web_search_providers() -> List[str]:
     return providers or list(DEFAULT_WEB_SEARCH_PROVIDERS)
 
 
+def get_hedge_delay() -> float:
+    try:
+        return max(0.0, float(os.environ.get("WEB_SEARCH_HEDGE_DELAY_SECONDS", str(DEFAULT_HEDGE_DELAY))))
+    except ValueError:
+        return DEFAULT_HEDGE_DELAY
+
+
+def get_cache_ttl() -> int:
+    """搜索结果缓存秒数，0 表示不缓存。"""
+    try:
+        return max(0, int(os.environ.get("WEB_SEARCH_CACHE_TTL_SECONDS", str(DEFAULT_CACHE_TTL))))
+    except ValueError:
+        return DEFAULT_CACHE_TTL
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 规范化查询 -> (过期时间, 结果)
+_result_cache: "OrderedDict[Tuple[str, int, Tuple[str, ...]], Tuple[float, List[Dict[str, str]]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="web-search")
+        return _executor
+
+
+def normalize_query(query: str) -> str:
+    return _clean_text(query).lower()
+
+
+def _cache_get(key) -> Optional[List[Dict[str, str]]]:
+    with _cache_lock:
+        entry = _result_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _result_cache[key]
+            return None
+        _result_cache.move_to_end(key)
+        return [dict(item) for item in entry[1]]
+
+
+def _cache_put(key, results: List[Dict[str, str]]) -> None:
+    ttl = get_cache_ttl()
+    if not ttl or not results:
+        return
+    with _cache_lock:
+        _result_cache[key] = (time.monotonic() + ttl, [dict(item) for item in results])
+        _result_cache.move_to_end(key)
+        while len(_result_cache) > CACHE_MAX_ENTRIES:
+            _result_cache.popitem(last=False)
+
+
 def _clean_text(text: str) -> str:
     return re.sub(r"\s+", " ", (text or "")).strip()
 
@@ -77,7 +147,7 @@ def _build_result(title: str, link: str, snippet: str, provider: str) -> Dict[st
 
 
 def _search_sogou(query: str, top_k: int) -> List[Dict[str, str]]:
-    response = requests.get(
+    response = get_http_session().get(
         os.environ.get("WEB_SEARCH_SOGOU_URL", "https://www.sogou.com/web"),
         params={"query": query},
         headers={"User-Agent": DEFAULT_USER_AGENT},
@@ -114,7 +184,7 @@ def _search_sogou(query: str, top_k: int) -> List[Dict[str, str]]:
 
 
 def _search_bing_rss(query: str, top_k: int) -> List[Dict[str, str]]:
-    response = requests.get(
+    response = get_http_session().get(
         os.environ.get("WEB_SEARCH_BING_URL", "https://cn.bing.com/search"),
         params={
             "q": query,
@@ -146,28 +216,71 @@ def _search_bing_rss(query: str, top_k: int) -> List[Dict[str, str]]:
     return results
 
 
+PROVIDER_SEARCHERS = {
+    "sogou": _search_sogou,
+    "bing": _search_bing_rss,
+    "bing_rss": _search_bing_rss
+}
+
+
 def search_web(query: str, top_k: int | None = None) -> List[Dict[str, str]]:
     normalized_query = _clean_text(query)
     if not normalized_query:
         return []
 
     limit = max(1, min(int(top_k or get_web_result_limit()), 8))
-
+    searchers = []
     for provider in get_web_search_providers():
-        try:
-            if provider == "sogou":
-                results = _search_sogou(normalized_query, limit)
-            elif provider in {"bing", "bing_rss"}:
-                results = _search_bing_rss(normalized_query, limit)
-            else:
-                continue
+        searcher = PROVIDER_SEARCHERS.get(provider)
+        if searcher is not None and searcher not in searchers:
+            searchers.append(searcher)
+    if not searchers:
+        return []
+
+    cache_key = (normalize_query(query), limit, tuple(searcher.__name__ for searcher in searchers))
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    results = _search_hedged(searchers, normalized_query, limit)
+    _cache_put(cache_key, results)
+    return results
 
+
+def _search_hedged(searchers, query: str, limit: int) -> List[Dict[str, str]]:
+    """
+    对冲请求多个搜索源，返回最先得到的非空结果
+
+    首选源超过对冲延迟仍未返回，或返回空结果/失败时，立即发起下一个源；
+    所有源共用 WEB_SEARCH_TIMEOUT_SECONDS 的总时限。
+    """
+    executor = _get_executor()
+    deadline = time.monotonic() + get_web_search_timeout()
+    hedge_delay = get_hedge_delay()
+    pending = set()
+    next_index = 0
+
+    while True:
+        if next_index < len(searchers):
+            pending.add(executor.submit(searchers[next_index], query, limit))
+            next_index += 1
+        if not pending:
+            return []
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return []
+        timeout = min(hedge_delay, remaining) if next_index < len(searchers) else remaining
+
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                results = future.result()
+            except Exception:
+                continue
             if results:
+                # 未完成的请求在后台结束，结果丢弃
                 return results
-        except Exception:
-            continue
-
-    return []
 
 
 def format_web_search_context(results: List[Dict[str, str]], max_length: int = 320) -> str:
@@ -260,18 +260,49 @@ def download_file(session: requests.Session, token: str, file_id: int) -> bytes:
     return response.content
 
 
+def wait_for_knowledge_jobs(session: requests.Session, token: str, batch_id: str) -> dict:
+    """Poll the background indexing batch until every job has finished."""
+    deadline = time.time() + TIMEOUT
+    while True:
+        response = request(
+            session,
+            "GET",
+            f"/api/files/knowledge-jobs/{batch_id}",
+            expected_status=200,
+            headers=auth_headers(token),
+        )
+        data = response.json()
+        ensure(data.get("success") is True, f"knowledge job query failed: {data}")
+        summary = data["data"]["summary"]
+        if summary["finished"] == summary["total"]:
+            return data["data"]
+        ensure(time.time() < deadline, f"knowledge jobs did not finish in {TIMEOUT}s: {summary}")
+        time.sleep(0.5)
+
+
+def get_file(session: requests.Session, token: str, file_id: int) -> dict:
+    for file_info in list_files(session, token):
+        if file_info["id"] == file_id:
+            return file_info
+    raise AssertionError(f"file {file_id} not found in file list")
+
+
 def upload_knowledge(session: requests.Session, token: str, file_id: int, knowledge_types: list[str]) -> dict:
     response = request(
         session,
         "POST",
         f"/api/files/{file_id}/upload-knowledge",
-        expected_status=200,
+        expected_status=202,
         headers={**auth_headers(token), "Content-Type": "application/json"},
         json={"knowledge_types": knowledge_types},
     )
     data = response.json()
     ensure(data.get("success") is True, f"upload knowledge failed: {data}")
-    return data["data"]
+
+    batch = wait_for_knowledge_jobs(session, token, data["data"]["batch_id"])
+    ensure(batch["summary"]["failed"] == 0, f"knowledge job failed: {batch['jobs']}")
+    # upload flags are set by the background job, so re-read the file state
+    return get_file(session, token, file_id)
 
 
 def cancel_knowledge(session: requests.Session, token: str, file_id: int, knowledge_types: list[str]) -> dict:
@@ -293,13 +324,18 @@ def batch_upload_knowledge(session: requests.Session, token: str, file_ids: list
         session,
         "POST",
         "/api/files/batch-upload-knowledge",
-        expected_status=200,
+        expected_status=202,
         headers={**auth_headers(token), "Content-Type": "application/json"},
         json={"file_ids": file_ids, "knowledge_types": knowledge_types},
     )
     data = response.json()
     ensure(data.get("success") is True, f"batch upload knowledge failed: {data}")
-    return data["data"]
+
+    result = data["data"]
+    batch = wait_for_knowledge_jobs(session, token, result["batch_id"])
+    result["success_count"] = batch["summary"]["success"]
+    result["jobs"] = batch["jobs"]
+    return result
 
 
 def batch_upload_knowledge_progress(
@@ -91,7 +91,25 @@ def upload_knowledge(session: requests.Session, headers: dict, file_id: int, kno
         headers={**headers, "Content-Type": "application/json"},
     )
     response.raise_for_status()
-    return response.json()
+    data = response.json()
+
+    # indexing runs as a background job; wait for it before asking questions
+    batch_id = data["data"]["batch_id"]
+    deadline = time.time() + TIMEOUT
+    while True:
+        job_response = session.get(
+            f"{BASE_URL}/api/files/knowledge-jobs/{batch_id}",
+            headers=headers,
+            timeout=TIMEOUT,
+        )
+        job_response.raise_for_status()
+        summary = job_response.json()["data"]["summary"]
+        if summary["finished"] == summary["total"]:
+            break
+        assert_true(time.time() < deadline, f"knowledge jobs did not finish in {TIMEOUT}s: {summary}")
+        time.sleep(0.5)
+    assert_true(summary["failed"] == 0, f"knowledge job failed: {summary}")
+    return data
 
 
 def download_uploaded_file(session: requests.Session, headers: dict, file_id: int) -> bytes: